@@ -0,0 +1,306 @@
+// An index of the rank of every hand on a board
+//
+// Ranking every possible villian hand on a board is the expensive part of
+// make_nut_result, and it is the same for every hero hand on that board.  A
+// BoardIndex ranks each hand once and sorts the ranks, so the number of hands
+// that are better than, tied with, or worse than a hero's hand is a few binary
+// searches.  Hands that share a card with the hero are removed by also keeping
+// the sorted ranks of the hands that hold each card.
+
+use crate::evaluator;
+use crate::globals::ALL_HANDS;
+use crate::hand::{card_index, hole_cards_from_index, Board, Hand, HandIndex, HoleCards};
+use crate::hand_set::HandSet;
+use crate::nut_result::NutResult;
+use lazy_static::lazy_static;
+use std::collections::VecDeque;
+use std::sync::{Arc, Mutex};
+
+const NUM_CARDS: usize = 52;
+
+/// The number of boards whose index is kept by default
+const DEFAULT_CACHE_SIZE: usize = 64;
+
+/// The number of possible hands that are better than, tied with and worse than
+/// a hand
+#[derive(Debug, Clone, Copy, PartialEq)]
+pub struct NutCounts {
+    pub num_better: usize,
+    pub num_tied: usize,
+    pub num_worse: usize,
+}
+
+#[derive(Debug)]
+pub struct BoardIndex {
+    /// The rank value of each hand (by HoleCards::index), or None if the hand
+    /// shares a card with the board
+    ranks: Vec<Option<u32>>,
+    /// The indices of the hands that don't share a card with the board, sorted
+    /// by rank value
+    sorted_hands: Vec<HandIndex>,
+    /// The rank values of those hands, in the same order
+    sorted_ranks: Vec<u32>,
+    /// For each card (by card_index), the sorted rank values of the hands in
+    /// sorted_hands that hold it
+    sorted_ranks_by_card: Vec<Vec<u32>>,
+}
+
+/// The number of values in a sorted slice that are less than, and equal to, a
+/// value
+fn count_less_and_equal(sorted: &[u32], value: u32) -> (usize, usize) {
+    let lower = sorted.binary_search_by(|x| x.cmp(&value).then(std::cmp::Ordering::Greater));
+    let upper = sorted.binary_search_by(|x| x.cmp(&value).then(std::cmp::Ordering::Less));
+    let (lower, upper) = (lower.unwrap_err(), upper.unwrap_err());
+    (lower, upper - lower)
+}
+
+impl BoardIndex {
+    pub fn new(board: &Board) -> BoardIndex {
+        let evaluator = evaluator::current();
+
+        let board_cards: Vec<usize> = board.cards().iter().map(card_index).collect();
+
+        let ranks: Vec<Option<u32>> = ALL_HANDS
+            .iter()
+            .map(|hole_cards| {
+                if hole_cards
+                    .cards
+                    .iter()
+                    .any(|c| board_cards.contains(&card_index(c)))
+                {
+                    None
+                } else {
+                    Some(evaluator.rank_value(&Hand::from_hole_cards_and_board(hole_cards, board)))
+                }
+            })
+            .collect();
+
+        let mut sorted_hands: Vec<HandIndex> = (0..ranks.len())
+            .filter(|i| ranks[*i].is_some())
+            .map(|i| i as HandIndex)
+            .collect();
+        sorted_hands.sort_by_key(|i| ranks[*i as usize]);
+
+        let sorted_ranks: Vec<u32> = sorted_hands
+            .iter()
+            .map(|i| ranks[*i as usize].unwrap())
+            .collect();
+
+        let mut sorted_ranks_by_card: Vec<Vec<u32>> = vec![vec![]; NUM_CARDS];
+        for (i, rank) in sorted_hands.iter().zip(sorted_ranks.iter()) {
+            for card in hole_cards_from_index(*i).cards.iter() {
+                sorted_ranks_by_card[card_index(card)].push(*rank);
+            }
+        }
+
+        BoardIndex {
+            ranks,
+            sorted_hands,
+            sorted_ranks,
+            sorted_ranks_by_card,
+        }
+    }
+
+    /// The rank value of a hand on this board, or None if it shares a card
+    /// with the board
+    pub fn rank_value(&self, hole_cards: &HoleCards) -> Option<u32> {
+        self.ranks[hole_cards.index()]
+    }
+
+    /// Count the possible villian hands (those that share no cards with the
+    /// board or the hero) that beat, tie and lose to the hero
+    pub fn nut_counts(&self, hole_cards: &HoleCards) -> Result<NutCounts, String> {
+        let rank = self
+            .rank_value(hole_cards)
+            .ok_or("Hole cards share a card with the board")?;
+
+        let (mut num_worse, mut num_tied) = count_less_and_equal(&self.sorted_ranks, rank);
+        let mut num_hands = self.sorted_ranks.len();
+
+        // Remove the hands that hold either of the hero's cards.  The hero's
+        // own hand holds both, so is added back first to only remove it once.
+        num_tied += 1;
+        num_hands += 1;
+
+        for card in hole_cards.cards.iter() {
+            let card_ranks = &self.sorted_ranks_by_card[card_index(card)];
+            let (card_worse, card_tied) = count_less_and_equal(card_ranks, rank);
+            num_worse -= card_worse;
+            num_tied -= card_tied;
+            num_hands -= card_ranks.len();
+        }
+
+        Ok(NutCounts {
+            num_better: num_hands - num_worse - num_tied,
+            num_tied,
+            num_worse,
+        })
+    }
+
+    /// Split the possible villian hands by whether they beat, tie or lose to
+    /// the hero
+    pub fn nut_result(&self, hole_cards: &HoleCards) -> Result<NutResult, String> {
+        let rank = self
+            .rank_value(hole_cards)
+            .ok_or("Hole cards share a card with the board")?;
+
+        let mut nut_result = NutResult {
+            better_hands: HandSet::new(),
+            tied_hands: HandSet::new(),
+            worse_hands: HandSet::new(),
+        };
+
+        for (i, villian_rank) in self.sorted_hands.iter().zip(self.sorted_ranks.iter()) {
+            let villian_hole_cards = hole_cards_from_index(*i);
+            if villian_hole_cards
+                .cards
+                .iter()
+                .any(|c| hole_cards.cards.contains(c))
+            {
+                continue;
+            }
+
+            if *villian_rank < rank {
+                nut_result.worse_hands.insert(*i);
+            } else if *villian_rank != rank {
+                nut_result.better_hands.insert(*i);
+            } else {
+                nut_result.tied_hands.insert(*i);
+            }
+        }
+
+        Ok(nut_result)
+    }
+}
+
+/// The most recently used board indices, most recent first
+struct BoardIndexCache {
+    capacity: usize,
+    entries: VecDeque<(u64, Arc<BoardIndex>)>,
+}
+
+/// The cards in a board as a bitmask, which doesn't depend on their order
+fn board_key(board: &Board) -> u64 {
+    board
+        .cards()
+        .iter()
+        .fold(0, |key, card| key | (1 << card_index(card)))
+}
+
+lazy_static! {
+    static ref CACHE: Mutex<BoardIndexCache> = Mutex::new(BoardIndexCache {
+        capacity: DEFAULT_CACHE_SIZE,
+        entries: VecDeque::new(),
+    });
+}
+
+/// The index of a board, which is built if it isn't one of the most recently
+/// used boards
+pub fn get(board: &Board) -> Arc<BoardIndex> {
+    let key = board_key(board);
+
+    {
+        let mut cache = CACHE.lock().unwrap();
+        if let Some(position) = cache.entries.iter().position(|(k, _)| *k == key) {
+            let entry = cache.entries.remove(position).unwrap();
+            let index = entry.1.clone();
+            cache.entries.push_front(entry);
+            return index;
+        }
+    }
+
+    // Build the index without holding the lock, so other boards can be looked
+    // up in the meantime
+    let index = Arc::new(BoardIndex::new(board));
+
+    let mut cache = CACHE.lock().unwrap();
+    if cache.capacity > 0 && !cache.entries.iter().any(|(k, _)| *k == key) {
+        cache.entries.push_front((key, index.clone()));
+        let capacity = cache.capacity;
+        cache.entries.truncate(capacity);
+    }
+    index
+}
+
+/// Set the number of boards whose index is kept (0 disables the cache)
+pub fn set_cache_size(capacity: usize) {
+    let mut cache = CACHE.lock().unwrap();
+    cache.capacity = capacity;
+    cache.entries.truncate(capacity);
+}
+
+/// The number of boards whose index is currently kept
+pub fn cache_len() -> usize {
+    CACHE.lock().unwrap().entries.len()
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::cardset::CardSet;
+
+    /// Count by ranking every villian hand
+    fn nut_counts_without_index(hole_cards: &HoleCards, board: &Board) -> NutCounts {
+        let evaluator = evaluator::current();
+        let rank = evaluator.rank_value(&Hand::from_hole_cards_and_board(hole_cards, board));
+        let used_cards = CardSet::from_hole_cards_and_board(hole_cards, &Some(board.clone()));
+
+        let mut counts = NutCounts {
+            num_better: 0,
+            num_tied: 0,
+            num_worse: 0,
+        };
+        for villian_hole_cards in ALL_HANDS.iter() {
+            if used_cards.intersects(villian_hole_cards) {
+                continue;
+            }
+            let villian_rank =
+                evaluator.rank_value(&Hand::from_hole_cards_and_board(villian_hole_cards, board));
+            if villian_rank < rank {
+                counts.num_worse += 1;
+            } else if villian_rank > rank {
+                counts.num_better += 1;
+            } else {
+                counts.num_tied += 1;
+            }
+        }
+        counts
+    }
+
+    #[test]
+    fn test_nut_counts_match_ranking_every_hand() {
+        for board_str in ["2c7d9h", "AsKsQsJs", "5h5d5c5sKh"].iter() {
+            let board = Board::new_from_string(board_str).unwrap().unwrap();
+            let index = BoardIndex::new(&board);
+
+            for hole_cards in ALL_HANDS.iter().step_by(7) {
+                if index.rank_value(hole_cards).is_none() {
+                    assert!(index.nut_counts(hole_cards).is_err());
+                    continue;
+                }
+
+                let counts = index.nut_counts(hole_cards).unwrap();
+                assert_eq!(counts, nut_counts_without_index(hole_cards, &board));
+
+                let nut_result = index.nut_result(hole_cards).unwrap();
+                assert_eq!(nut_result.better_hands.len(), counts.num_better);
+                assert_eq!(nut_result.tied_hands.len(), counts.num_tied);
+                assert_eq!(nut_result.worse_hands.len(), counts.num_worse);
+            }
+        }
+    }
+
+    #[test]
+    fn test_board_key_ignores_order() {
+        let flop = Board::new_from_string("2c7d9h").unwrap().unwrap();
+        let reordered = Board::new_from_string("9h2c7d").unwrap().unwrap();
+        assert_eq!(board_key(&flop), board_key(&reordered));
+    }
+
+    #[test]
+    fn test_get_reuses_index() {
+        let board = Board::new_from_string("3c8dJh").unwrap().unwrap();
+        let index = get(&board);
+        assert!(Arc::ptr_eq(&index, &get(&board)));
+    }
+}
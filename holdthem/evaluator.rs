@@ -0,0 +1,50 @@
+// Selects how hands are ranked at runtime: either with rs_poker directly or
+// with a precomputed lookup table (see lookup_table.rs).
+
+use crate::hand::{rank_to_value, Hand};
+use crate::lookup_table::LookupTable;
+use lazy_static::lazy_static;
+use rs_poker::core::Rankable;
+use std::path::Path;
+use std::sync::{Arc, RwLock};
+
+#[derive(Clone)]
+pub enum Evaluator {
+    RsPoker,
+    LookupTable(Arc<LookupTable>),
+}
+
+impl Evaluator {
+    /// The rank of the hand, encoded as in hand::rank_to_value
+    pub fn rank_value(&self, hand: &Hand) -> u32 {
+        match self {
+            Evaluator::RsPoker => rank_to_value(&hand.rank()),
+            Evaluator::LookupTable(table) => table.rank_value(hand.cards()),
+        }
+    }
+}
+
+lazy_static! {
+    static ref EVALUATOR: RwLock<Evaluator> = RwLock::new(Evaluator::RsPoker);
+}
+
+/// The currently selected evaluator.  Callers ranking many hands should fetch
+/// this once and reuse it.
+pub fn current() -> Evaluator {
+    EVALUATOR.read().unwrap().clone()
+}
+
+pub fn set_evaluator(evaluator: Evaluator) {
+    *EVALUATOR.write().unwrap() = evaluator;
+}
+
+/// Memory-map the lookup table at the given path and rank all hands with it
+pub fn use_lookup_table(path: &Path) -> Result<(), String> {
+    set_evaluator(Evaluator::LookupTable(Arc::new(LookupTable::load(path)?)));
+    Ok(())
+}
+
+/// Rank all hands with rs_poker
+pub fn use_rs_poker() {
+    set_evaluator(Evaluator::RsPoker);
+}
@@ -1,11 +1,41 @@
+use crate::flop_table;
 use crate::globals::PREFLOP_HAND_FEATURES;
-use crate::hand::{Board, HoleCards};
+use crate::hand::{Board, HandIndex, HoleCards};
+use crate::isomorphism::CanonicalForm;
 use crate::nut_result::{make_nut_result, NutResult};
-use crate::simulate::simulate;
+use crate::simulate::simulate_ranges_with_seed;
 use crate::simulate::SimulationResult;
+use crate::simulate::{Budget, SamplingMode};
+use lazy_static::lazy_static;
+use rand::{thread_rng, Rng};
+use rayon::prelude::*;
+use std::collections::{HashMap, VecDeque};
+use std::sync::Mutex;
+
+/// The number of feature columns (see Features::values)
+pub const NUM_FEATURES: usize = 15;
+
+/// The names of the feature columns, in the order of Features::values
+pub const FEATURE_NAMES: [&str; NUM_FEATURES] = [
+    "frac_better_hands",
+    "frac_tied_hands",
+    "frac_worse_hands",
+    "win_odds",
+    "tie_odds",
+    "lose_odds",
+    "win_odds_vs_better",
+    "tie_odds_vs_better",
+    "lose_odds_vs_better",
+    "win_odds_vs_tied",
+    "tie_odds_vs_tied",
+    "lose_odds_vs_tied",
+    "win_odds_vs_worse",
+    "tie_odds_vs_worse",
+    "lose_odds_vs_worse",
+];
 
 /// The input of a simulation
-#[derive(Debug)]
+#[derive(Debug, Clone)]
 pub struct Features {
     pub frac_better_hands: f32,
     pub frac_tied_hands: f32,
@@ -26,6 +56,14 @@ pub struct Features {
     pub win_odds_vs_worse: f32,
     pub tie_odds_vs_worse: f32,
     pub lose_odds_vs_worse: f32,
+
+    /// The standard errors of win_odds, tie_odds and lose_odds
+    pub win_std_error: f32,
+    pub tie_std_error: f32,
+    pub lose_std_error: f32,
+
+    /// The total number of hands simulated
+    pub num_simulations: i64,
 }
 
 impl Features {
@@ -59,6 +97,26 @@ impl Features {
             + nut_result.frac_tied() * lose_odds_vs_tied
             + nut_result.frac_worse() * lose_odds_vs_worse;
 
+        // The odds are a weighted sum of the estimates against each bucket.  These
+        // share runouts, so aren't quite independent, but are treated as if they
+        // were.
+        let std_error = |f: fn(&SimulationResult) -> f32| {
+            [
+                (nut_result.frac_better(), odds_vs_better),
+                (nut_result.frac_tied(), odds_vs_tied),
+                (nut_result.frac_worse(), odds_vs_worse),
+            ]
+            .iter()
+            .filter_map(|(frac, odds)| odds.as_ref().map(|x| (frac * f(x)).powi(2)))
+            .sum::<f32>()
+            .sqrt()
+        };
+
+        let num_simulations = [odds_vs_better, odds_vs_tied, odds_vs_worse]
+            .iter()
+            .filter_map(|odds| odds.as_ref().map(|x| x.num_simulations()))
+            .sum();
+
         Features {
             frac_better_hands: nut_result.frac_better(),
             frac_tied_hands: nut_result.frac_tied(),
@@ -78,57 +136,176 @@ impl Features {
             win_odds_vs_worse,
             tie_odds_vs_worse,
             lose_odds_vs_worse,
+
+            win_std_error: std_error(SimulationResult::win_std_error),
+            tie_std_error: std_error(SimulationResult::tie_std_error),
+            lose_std_error: std_error(SimulationResult::lose_std_error),
+
+            num_simulations,
         }
     }
+
+    /// The feature columns, named by FEATURE_NAMES
+    pub fn values(&self) -> [f32; NUM_FEATURES] {
+        [
+            self.frac_better_hands,
+            self.frac_tied_hands,
+            self.frac_worse_hands,
+            self.win_odds,
+            self.tie_odds,
+            self.lose_odds,
+            self.win_odds_vs_better,
+            self.tie_odds_vs_better,
+            self.lose_odds_vs_better,
+            self.win_odds_vs_tied,
+            self.tie_odds_vs_tied,
+            self.lose_odds_vs_tied,
+            self.win_odds_vs_worse,
+            self.tie_odds_vs_worse,
+            self.lose_odds_vs_worse,
+        ]
+    }
 }
 
 pub fn make_hand_features(
     hand: &HoleCards,
     board: &Option<Board>,
-    num_to_simulate: i64,
+    budget: Budget,
 ) -> Result<Features, String> {
     match board {
-        Some(b) => make_post_flop_hand_features(hand, b, num_to_simulate),
+        Some(b) => make_post_flop_hand_features(hand, b, budget),
         None => Ok(make_pre_flop_hand_features(hand)),
     }
 }
 
+/// The number of post-flop spots whose features are kept by default
+const DEFAULT_CACHE_SIZE: usize = 100_000;
+
+/// A spot, identified up to suit permutations, and the simulation budget
+type CacheKey = (CanonicalForm, Budget);
+
+/// Recently computed features.  When full, the oldest spot is evicted.
+struct FeatureCache {
+    capacity: usize,
+    features: HashMap<CacheKey, Features>,
+    order: VecDeque<CacheKey>,
+}
+
+lazy_static! {
+    static ref CACHE: Mutex<FeatureCache> = Mutex::new(FeatureCache {
+        capacity: DEFAULT_CACHE_SIZE,
+        features: HashMap::new(),
+        order: VecDeque::new(),
+    });
+}
+
+/// As make_hand_features, but the features of a post-flop spot are reused for
+/// any spot that is the same up to suit permutations and has the same budget
+/// (while it is one of the most recently computed spots).  If a flop table is
+/// in use (see flop_table::use_flop_table), flop features are read from it
+/// whatever the budget.
+pub fn make_hand_features_cached(
+    hand: &HoleCards,
+    board: &Option<Board>,
+    budget: Budget,
+) -> Result<Features, String> {
+    let board = match board {
+        Some(b) => b,
+        None => return Ok(make_pre_flop_hand_features(hand)),
+    };
+
+    if let Some(features) = flop_table::current().and_then(|t| t.features(hand, board)) {
+        return Ok(features);
+    }
+
+    let key = (CanonicalForm::new(hand, board), budget);
+
+    if let Some(features) = CACHE.lock().unwrap().features.get(&key) {
+        return Ok(features.clone());
+    }
+
+    let features = make_post_flop_hand_features(hand, board, budget)?;
+
+    let mut cache = CACHE.lock().unwrap();
+    if cache.capacity > 0 && !cache.features.contains_key(&key) {
+        while cache.order.len() >= cache.capacity {
+            let oldest = cache.order.pop_front().unwrap();
+            cache.features.remove(&oldest);
+        }
+        cache.order.push_back(key);
+        cache.features.insert(key, features.clone());
+    }
+
+    Ok(features)
+}
+
+/// The features of many spots (see make_hand_features_cached), computed in
+/// parallel
+pub fn make_hand_features_batch(
+    spots: &[(HoleCards, Option<Board>)],
+    budget: Budget,
+) -> Result<Vec<Features>, String> {
+    spots
+        .par_iter()
+        .map(|(hand, board)| make_hand_features_cached(hand, board, budget))
+        .collect()
+}
+
+/// Set the number of spots whose features are kept (0 disables the cache)
+pub fn set_cache_size(capacity: usize) {
+    let mut cache = CACHE.lock().unwrap();
+    cache.capacity = capacity;
+    while cache.order.len() > capacity {
+        let oldest = cache.order.pop_front().unwrap();
+        cache.features.remove(&oldest);
+    }
+}
+
 pub fn make_post_flop_hand_features(
     hand: &HoleCards,
     board: &Board,
-    num_to_simulate: i64,
+    budget: Budget,
 ) -> Result<Features, String> {
-    let nut_result = make_nut_result(hand, board);
-
-    let odds_vs_better = match nut_result.better_hands.len() {
-        0 => None,
-        _ => Some(simulate(
-            &hand,
-            &nut_result.better_hands,
-            &Some(board.clone()),
-            num_to_simulate,
-        )?),
-    };
+    make_post_flop_hand_features_with_seed(hand, board, budget, thread_rng().gen())
+}
 
-    let odds_vs_tied = match nut_result.tied_hands.len() {
-        0 => None,
-        _ => Some(simulate(
-            &hand,
-            &nut_result.tied_hands,
-            &Some(board.clone()),
-            num_to_simulate,
-        )?),
-    };
+/// As make_post_flop_hand_features, but with the random number streams of the
+/// simulation derived from a seed
+pub fn make_post_flop_hand_features_with_seed(
+    hand: &HoleCards,
+    board: &Board,
+    budget: Budget,
+    seed: u64,
+) -> Result<Features, String> {
+    let nut_result = make_nut_result(hand, board)?;
 
-    let odds_vs_worse = match nut_result.worse_hands.len() {
-        0 => None,
-        _ => Some(simulate(
-            &hand,
-            &nut_result.worse_hands,
-            &Some(board.clone()),
-            num_to_simulate,
-        )?),
-    };
+    // Simulate every non-empty bucket of hands in one pass, sharing runouts
+    let buckets = [
+        nut_result.better_hands.indices(),
+        nut_result.tied_hands.indices(),
+        nut_result.worse_hands.indices(),
+    ];
+    let ranges: Vec<&[HandIndex]> = buckets
+        .iter()
+        .filter(|b| !b.is_empty())
+        .map(|b| &b[..])
+        .collect();
+    let mut results = simulate_ranges_with_seed(
+        hand,
+        &ranges,
+        &Some(board.clone()),
+        budget,
+        SamplingMode::Stratified,
+        seed,
+    )?
+    .into_iter();
+
+    let mut odds = buckets
+        .iter()
+        .map(|b| if b.is_empty() { None } else { results.next() });
+    let odds_vs_better = odds.next().unwrap();
+    let odds_vs_tied = odds.next().unwrap();
+    let odds_vs_worse = odds.next().unwrap();
 
     Ok(Features::new(
         &nut_result,
@@ -157,6 +334,11 @@ pub fn make_pre_flop_hand_features(hand: &HoleCards) -> Features {
         win_odds_vs_worse: -1.0,
         tie_odds_vs_worse: -1.0,
         lose_odds_vs_worse: -1.0,
+        // The preflop odds are precomputed
+        win_std_error: 0.0,
+        tie_std_error: 0.0,
+        lose_std_error: 0.0,
+        num_simulations: 0,
     }
 }
 
@@ -168,8 +350,64 @@ mod test {
     fn test_three_aces() {
         let hole_cards = HoleCards::new_from_string("3d2h").unwrap();
         let board = Board::new_from_string("AsAdAc").unwrap();
-        let features = make_hand_features(&hole_cards, &board, 1000).unwrap();
+        let features = make_hand_features(&hole_cards, &board, Budget::Fixed(1000)).unwrap();
 
         println!("{:?}", features);
     }
+
+    #[test]
+    fn test_until_converged() {
+        let hole_cards = HoleCards::new_from_string("KdKh").unwrap();
+        let board = Board::new_from_string("Kc7s2d").unwrap();
+        let budget = Budget::UntilConverged {
+            max_ci_width: 0.05,
+            max_to_simulate: 100_000,
+        };
+        let features = make_hand_features(&hole_cards, &board, budget).unwrap();
+
+        // Top set is an easy spot, so stops well before the budget
+        assert!(features.num_simulations > 0);
+        assert!(features.num_simulations < 100_000);
+        assert!(2.0 * 1.96 * features.win_std_error <= 0.05);
+    }
+
+    #[test]
+    fn test_cached_features_ignore_suits() {
+        let budget = Budget::Fixed(500);
+        let hole_cards = HoleCards::new_from_string("QsJs").unwrap();
+        let board = Board::new_from_string("Ts9s2d").unwrap();
+        let features = make_hand_features_cached(&hole_cards, &board, budget).unwrap();
+
+        // The same spot with clubs and spades swapped is a cache hit, so has
+        // exactly the same simulated odds
+        let hole_cards = HoleCards::new_from_string("QcJc").unwrap();
+        let board = Board::new_from_string("Tc9c2d").unwrap();
+        let relabelled = make_hand_features_cached(&hole_cards, &board, budget).unwrap();
+        assert_eq!(features.win_odds, relabelled.win_odds);
+        assert_eq!(features.num_simulations, relabelled.num_simulations);
+    }
+
+    #[test]
+    fn test_batch() {
+        let budget = Budget::Fixed(2000);
+        let spots = vec![
+            (HoleCards::new_from_string("AhKh").unwrap(), None),
+            (
+                HoleCards::new_from_string("7c7d").unwrap(),
+                Board::new_from_string("7s8s9sTd2c").unwrap(),
+            ),
+            (
+                HoleCards::new_from_string("2c3d").unwrap(),
+                Board::new_from_string("AsKsQdJh9c").unwrap(),
+            ),
+        ];
+        let features = make_hand_features_batch(&spots, budget).unwrap();
+        assert_eq!(features.len(), spots.len());
+
+        // River odds are enumerated, so match the unbatched features exactly
+        for ((hand, board), batched) in spots.iter().zip(features.iter()) {
+            let features = make_hand_features(hand, board, budget).unwrap();
+            assert_eq!(features.values(), batched.values());
+        }
+    }
 }
@@ -0,0 +1,496 @@
+// A precomputed table of the features of every hand on every flop.
+//
+// Flop features are the same for hands and flops that differ only by a suit
+// permutation (see isomorphism.rs), so the table only holds the canonical
+// (hand, flop) pairs of the canonical flops.  The file is laid out as:
+//  - A header: MAGIC, VERSION, the number of flops and records, and the number
+//    of hands simulated against each part of the range when it was built
+//  - For each set of three cards (by colex index), the u16 number of its flop
+//    in the table, or NO_FLOP if it isn't a canonical flop
+//  - For each flop, the u32 record of each hand (by HoleCards::index), or
+//    NO_RECORD if the hand isn't canonical on the flop
+//  - The records: the NUM_VALUES features as u16s in [0, 1] and the u32 number
+//    of hands simulated
+//
+// A lookup is a canonicalization and three reads.  The table is written to disk
+// by build_to_file() and memory-mapped by load().
+
+use crate::features::{make_post_flop_hand_features_with_seed, Features};
+use crate::globals::{ALL_CARDS, ALL_HANDS};
+use crate::hand::{card_index, Board, HoleCards};
+use crate::isomorphism::{canonical_board_mask, CanonicalForm};
+use crate::simulate::Budget;
+use lazy_static::lazy_static;
+use memmap::Mmap;
+use rand::{thread_rng, Rng};
+use rayon::prelude::*;
+use std::convert::TryInto;
+use std::fs::File;
+use std::io::Write;
+use std::ops::Deref;
+use std::path::Path;
+use std::sync::{Arc, RwLock};
+
+const MAGIC: &[u8; 8] = b"HOLDFLOP";
+const VERSION: u32 = 1;
+const HEADER_SIZE: usize = 24;
+
+/// The number of sets of three cards
+const NUM_CARD_TRIPLES: usize = 52 * 51 * 50 / 6;
+const NUM_HANDS: usize = 52 * 51 / 2;
+
+const NO_FLOP: u16 = u16::MAX;
+const NO_RECORD: u32 = u32::MAX;
+
+/// The number of f32 features in a record
+const NUM_VALUES: usize = 18;
+const RECORD_SIZE: usize = 2 * NUM_VALUES + 4;
+
+/// Features are stored as u16s in [0, QUANTIZATION]
+const QUANTIZATION: f32 = u16::MAX as f32;
+
+/// The bytes of a table, either built in memory or mapped from a file
+enum TableData {
+    Owned(Vec<u8>),
+    Mapped(Mmap),
+}
+
+impl Deref for TableData {
+    type Target = [u8];
+    fn deref(&self) -> &[u8] {
+        match self {
+            TableData::Owned(x) => x,
+            TableData::Mapped(x) => x,
+        }
+    }
+}
+
+pub struct FlopTable {
+    data: TableData,
+    num_flops: usize,
+    num_to_simulate: i64,
+}
+
+fn read_u16(data: &[u8], offset: usize) -> u16 {
+    u16::from_le_bytes(data[offset..offset + 2].try_into().unwrap())
+}
+
+fn read_u32(data: &[u8], offset: usize) -> u32 {
+    u32::from_le_bytes(data[offset..offset + 4].try_into().unwrap())
+}
+
+/// The colex index of a set of three cards, given as a mask of card indices
+fn triple_index(mask: u64) -> usize {
+    let c0 = mask.trailing_zeros() as usize;
+    let mask = mask & (mask - 1);
+    let c1 = mask.trailing_zeros() as usize;
+    let mask = mask & (mask - 1);
+    let c2 = mask.trailing_zeros() as usize;
+    c0 + c1 * (c1 - 1) / 2 + c2 * (c2 - 1) * (c2 - 2) / 6
+}
+
+fn features_to_values(features: &Features) -> [f32; NUM_VALUES] {
+    [
+        features.frac_better_hands,
+        features.frac_tied_hands,
+        features.frac_worse_hands,
+        features.win_odds,
+        features.tie_odds,
+        features.lose_odds,
+        features.win_odds_vs_better,
+        features.tie_odds_vs_better,
+        features.lose_odds_vs_better,
+        features.win_odds_vs_tied,
+        features.tie_odds_vs_tied,
+        features.lose_odds_vs_tied,
+        features.win_odds_vs_worse,
+        features.tie_odds_vs_worse,
+        features.lose_odds_vs_worse,
+        features.win_std_error,
+        features.tie_std_error,
+        features.lose_std_error,
+    ]
+}
+
+fn values_to_features(values: &[f32; NUM_VALUES], num_simulations: i64) -> Features {
+    Features {
+        frac_better_hands: values[0],
+        frac_tied_hands: values[1],
+        frac_worse_hands: values[2],
+        win_odds: values[3],
+        tie_odds: values[4],
+        lose_odds: values[5],
+        win_odds_vs_better: values[6],
+        tie_odds_vs_better: values[7],
+        lose_odds_vs_better: values[8],
+        win_odds_vs_tied: values[9],
+        tie_odds_vs_tied: values[10],
+        lose_odds_vs_tied: values[11],
+        win_odds_vs_worse: values[12],
+        tie_odds_vs_worse: values[13],
+        lose_odds_vs_worse: values[14],
+        win_std_error: values[15],
+        tie_std_error: values[16],
+        lose_std_error: values[17],
+        num_simulations,
+    }
+}
+
+/// The masks of every canonical flop, in increasing order
+fn canonical_flops() -> Vec<u64> {
+    let mut flops = vec![];
+    for i in 0..ALL_CARDS.len() {
+        for j in i + 1..ALL_CARDS.len() {
+            for k in j + 1..ALL_CARDS.len() {
+                let board = Board::Flop([ALL_CARDS[i], ALL_CARDS[j], ALL_CARDS[k]]);
+                let mask = canonical_board_mask(&board);
+                if mask == (1 << i) | (1 << j) | (1 << k) {
+                    flops.push(mask);
+                }
+            }
+        }
+    }
+    flops.sort_unstable();
+    flops
+}
+
+fn board_from_mask(mask: u64) -> Board {
+    let indices: Vec<i32> = (0..64).filter(|i| mask & (1 << i) != 0).collect();
+    Board::new_from_indices(&indices).unwrap().unwrap()
+}
+
+/// The seed of the simulation of a hand on a flop, mixed (as in splitmix64) so
+/// that the streams of different records, which are seeded by chunk, don't overlap
+fn record_seed(seed: u64, flop: u64, hand_index: usize) -> u64 {
+    let mut z = seed ^ flop.wrapping_mul(0x9E37_79B9_7F4A_7C15) ^ hand_index as u64;
+    z = (z ^ (z >> 30)).wrapping_mul(0xBF58_476D_1CE4_E5B9);
+    z = (z ^ (z >> 27)).wrapping_mul(0x94D0_49BB_1331_11EB);
+    z ^ (z >> 31)
+}
+
+/// The features of every hand that is canonical on the flop, by hand index
+fn make_flop_features(
+    flop: u64,
+    num_to_simulate: i64,
+    seed: u64,
+) -> Result<Vec<(usize, Features)>, String> {
+    let board = board_from_mask(flop);
+    ALL_HANDS
+        .iter()
+        .filter(|hole_cards| {
+            hole_cards
+                .cards
+                .iter()
+                .all(|c| flop & (1 << card_index(c)) == 0)
+                && CanonicalForm::new(hole_cards, &board).hand_index == hole_cards.index()
+        })
+        .map(|hole_cards| {
+            let features = make_post_flop_hand_features_with_seed(
+                hole_cards,
+                &board,
+                Budget::Fixed(num_to_simulate),
+                record_seed(seed, flop, hole_cards.index()),
+            )?;
+            Ok((hole_cards.index(), features))
+        })
+        .collect()
+}
+
+impl FlopTable {
+    /// Compute the features of every canonical hand on every canonical flop,
+    /// with num_to_simulate hands simulated against each part of the range, and
+    /// return the serialized table.  Flops are computed in parallel.
+    pub fn build(num_to_simulate: i64) -> Result<Vec<u8>, String> {
+        FlopTable::build_with_seed(num_to_simulate, thread_rng().gen())
+    }
+
+    /// As build, but with the simulations derived from a seed, so that the same
+    /// seed always builds the same table
+    pub fn build_with_seed(num_to_simulate: i64, seed: u64) -> Result<Vec<u8>, String> {
+        FlopTable::build_flops(&canonical_flops(), num_to_simulate, seed)
+    }
+
+    /// Build a table holding only the given canonical flops
+    fn build_flops(flops: &[u64], num_to_simulate: i64, seed: u64) -> Result<Vec<u8>, String> {
+        let flop_features = flops
+            .to_vec()
+            .into_par_iter()
+            .map(|flop| make_flop_features(flop, num_to_simulate, seed))
+            .collect::<Result<Vec<Vec<(usize, Features)>>, String>>()?;
+
+        let num_records: usize = flop_features.iter().map(|f| f.len()).sum();
+
+        let mut flop_numbers = vec![NO_FLOP; NUM_CARD_TRIPLES];
+        for (number, flop) in flops.iter().enumerate() {
+            flop_numbers[triple_index(*flop)] = number as u16;
+        }
+
+        let mut record_numbers = vec![NO_RECORD; flops.len() * NUM_HANDS];
+        let mut records: Vec<u8> = Vec::with_capacity(num_records * RECORD_SIZE);
+        let mut num_written = 0;
+        for (number, hand_features) in flop_features.iter().enumerate() {
+            for (hand_index, features) in hand_features.iter() {
+                record_numbers[number * NUM_HANDS + hand_index] = num_written;
+                num_written += 1;
+                for value in features_to_values(features).iter() {
+                    let value = (value.max(0.0).min(1.0) * QUANTIZATION).round() as u16;
+                    records.extend_from_slice(&value.to_le_bytes());
+                }
+                records.extend_from_slice(&(features.num_simulations as u32).to_le_bytes());
+            }
+        }
+
+        let mut data: Vec<u8> = Vec::with_capacity(
+            HEADER_SIZE + 2 * NUM_CARD_TRIPLES + 4 * record_numbers.len() + records.len(),
+        );
+        data.extend_from_slice(MAGIC);
+        data.extend_from_slice(&VERSION.to_le_bytes());
+        data.extend_from_slice(&(flops.len() as u32).to_le_bytes());
+        data.extend_from_slice(&(num_records as u32).to_le_bytes());
+        data.extend_from_slice(&(num_to_simulate as u32).to_le_bytes());
+        for number in flop_numbers.iter() {
+            data.extend_from_slice(&number.to_le_bytes());
+        }
+        for number in record_numbers.iter() {
+            data.extend_from_slice(&number.to_le_bytes());
+        }
+        data.extend_from_slice(&records);
+        Ok(data)
+    }
+
+    /// Build the table and write it to the given path
+    pub fn build_to_file(path: &Path, num_to_simulate: i64) -> Result<(), String> {
+        let data = FlopTable::build(num_to_simulate)?;
+        let mut file = File::create(path).map_err(|e| e.to_string())?;
+        file.write_all(&data).map_err(|e| e.to_string())?;
+        Ok(())
+    }
+
+    /// Memory-map a table written by build_to_file
+    pub fn load(path: &Path) -> Result<FlopTable, String> {
+        let file = File::open(path).map_err(|e| format!("{}: {}", path.display(), e))?;
+        let data = unsafe { Mmap::map(&file) }.map_err(|e| e.to_string())?;
+        FlopTable::from_data(TableData::Mapped(data))
+    }
+
+    fn from_data(data: TableData) -> Result<FlopTable, String> {
+        if data.len() < HEADER_SIZE || &data[0..8] != MAGIC || read_u32(&data, 8) != VERSION {
+            return Err(String::from("Invalid flop table header"));
+        }
+
+        let num_flops = read_u32(&data, 12) as usize;
+        let num_records = read_u32(&data, 16) as usize;
+        let num_to_simulate = read_u32(&data, 20) as i64;
+
+        let expected_size = HEADER_SIZE
+            + 2 * NUM_CARD_TRIPLES
+            + 4 * num_flops * NUM_HANDS
+            + RECORD_SIZE * num_records;
+        if data.len() != expected_size {
+            return Err(String::from("Invalid flop table size"));
+        }
+
+        Ok(FlopTable {
+            data,
+            num_flops,
+            num_to_simulate,
+        })
+    }
+
+    /// The number of hands simulated against each part of the range when the
+    /// table was built
+    pub fn num_to_simulate(&self) -> i64 {
+        self.num_to_simulate
+    }
+
+    /// The features of a hand on a flop, or None if the board isn't a flop (or
+    /// the table doesn't hold it)
+    pub fn features(&self, hole_cards: &HoleCards, board: &Board) -> Option<Features> {
+        if board.len() != 3 {
+            return None;
+        }
+
+        let form = CanonicalForm::new(hole_cards, board);
+
+        let flop_number = read_u16(&self.data, HEADER_SIZE + 2 * triple_index(form.board_mask));
+        if flop_number == NO_FLOP {
+            return None;
+        }
+
+        let record_numbers_offset = HEADER_SIZE + 2 * NUM_CARD_TRIPLES;
+        let record_number = read_u32(
+            &self.data,
+            record_numbers_offset + 4 * (flop_number as usize * NUM_HANDS + form.hand_index),
+        );
+        if record_number == NO_RECORD {
+            return None;
+        }
+
+        let offset = record_numbers_offset
+            + 4 * self.num_flops * NUM_HANDS
+            + RECORD_SIZE * record_number as usize;
+        let mut values = [0.0; NUM_VALUES];
+        for (i, value) in values.iter_mut().enumerate() {
+            *value = read_u16(&self.data, offset + 2 * i) as f32 / QUANTIZATION;
+        }
+        let num_simulations = read_u32(&self.data, offset + 2 * NUM_VALUES) as i64;
+
+        Some(values_to_features(&values, num_simulations))
+    }
+}
+
+lazy_static! {
+    static ref FLOP_TABLE: RwLock<Option<Arc<FlopTable>>> = RwLock::new(None);
+}
+
+/// The flop table in use, if any
+pub fn current() -> Option<Arc<FlopTable>> {
+    FLOP_TABLE.read().unwrap().clone()
+}
+
+/// Memory-map the flop table at the given path and serve flop features from it
+pub fn use_flop_table(path: &Path) -> Result<(), String> {
+    *FLOP_TABLE.write().unwrap() = Some(Arc::new(FlopTable::load(path)?));
+    Ok(())
+}
+
+/// Compute flop features live
+pub fn clear_flop_table() {
+    *FLOP_TABLE.write().unwrap() = None;
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::features::make_hand_features_cached;
+
+    #[test]
+    fn test_num_canonical_flops() {
+        assert_eq!(canonical_flops().len(), 1755);
+    }
+
+    #[test]
+    fn test_triple_index() {
+        let mut seen = vec![false; NUM_CARD_TRIPLES];
+        for i in 0..52 {
+            for j in i + 1..52 {
+                for k in j + 1..52 {
+                    let index = triple_index((1 << i) | (1 << j) | (1 << k));
+                    assert!(!seen[index]);
+                    seen[index] = true;
+                }
+            }
+        }
+        assert!(seen.iter().all(|x| *x));
+    }
+
+    #[test]
+    fn test_build_and_load() {
+        let board = Board::new_from_string("Kh8c2c").unwrap().unwrap();
+        let flop = canonical_board_mask(&board);
+
+        let path = std::env::temp_dir().join("holdthem_flop_table_test.bin");
+        let data = FlopTable::build_flops(&[flop], 200, 1).unwrap();
+        std::fs::write(&path, &data).unwrap();
+        let table = FlopTable::load(&path).unwrap();
+        std::fs::remove_file(&path).unwrap();
+
+        assert_eq!(table.num_to_simulate(), 200);
+
+        // Every hand on a suit permutation of the flop is in the table
+        let relabelled = Board::new_from_string("Ks8d2d").unwrap().unwrap();
+        for hole_cards in ALL_HANDS.iter() {
+            let conflicts = relabelled
+                .cards()
+                .iter()
+                .any(|c| hole_cards.cards.contains(c));
+            assert_eq!(
+                table.features(hole_cards, &relabelled).is_some(),
+                !conflicts
+            );
+        }
+
+        // The hand counts aren't simulated, so match the live features
+        let hole_cards = HoleCards::new_from_string("AhQh").unwrap();
+        let features = table.features(&hole_cards, &relabelled).unwrap();
+        let live = crate::features::make_post_flop_hand_features(
+            &hole_cards,
+            &relabelled,
+            Budget::Fixed(200),
+        )
+        .unwrap();
+        assert!((features.frac_better_hands - live.frac_better_hands).abs() < 1e-4);
+        assert!((features.frac_worse_hands - live.frac_worse_hands).abs() < 1e-4);
+
+        // Other flops and streets aren't
+        let other = Board::new_from_string("Qh8c2c").unwrap().unwrap();
+        assert!(table.features(&hole_cards, &other).is_none());
+        let turn = Board::new_from_string("Kh8c2c3d").unwrap().unwrap();
+        assert!(table.features(&hole_cards, &turn).is_none());
+    }
+
+    #[test]
+    fn test_lookups_match_live_features() {
+        let seed = 7;
+        let num_to_simulate = 100;
+        let budget = Budget::Fixed(num_to_simulate);
+
+        // A two-tone flop and a monotone one
+        let flops: Vec<u64> = ["Kh8c2c", "Js9s4s"]
+            .iter()
+            .map(|s| canonical_board_mask(&Board::new_from_string(s).unwrap().unwrap()))
+            .collect();
+        let data = FlopTable::build_flops(&flops, num_to_simulate, seed).unwrap();
+        let table = FlopTable::from_data(TableData::Owned(data)).unwrap();
+
+        let assert_close = |table_value: f32, live_value: f32| {
+            assert!((table_value - live_value).abs() <= 1.0 / QUANTIZATION);
+        };
+
+        // Suit permutations of the flops
+        for flop in ["Ks8d2d", "Jd9d4d"].iter() {
+            let board = Board::new_from_string(flop).unwrap().unwrap();
+            for hole_cards in ALL_HANDS.iter() {
+                if board.cards().iter().any(|c| hole_cards.cards.contains(c)) {
+                    continue;
+                }
+                let features = table.features(hole_cards, &board).unwrap();
+
+                // Every value is the live features of the canonical hand, as
+                // simulated when building, up to quantization
+                let form = CanonicalForm::new(hole_cards, &board);
+                let live = make_post_flop_hand_features_with_seed(
+                    &ALL_HANDS[form.hand_index],
+                    &board_from_mask(form.board_mask),
+                    budget,
+                    record_seed(seed, form.board_mask, form.hand_index),
+                )
+                .unwrap();
+                for (table_value, live_value) in features_to_values(&features)
+                    .iter()
+                    .zip(features_to_values(&live).iter())
+                {
+                    assert_close(*table_value, *live_value);
+                }
+                assert_eq!(features.num_simulations, live.num_simulations);
+
+                // And the hand counts, which aren't simulated, are those of the
+                // hand itself
+                let cached =
+                    make_hand_features_cached(hole_cards, &Some(board.clone()), budget).unwrap();
+                assert_close(features.frac_better_hands, cached.frac_better_hands);
+                assert_close(features.frac_tied_hands, cached.frac_tied_hands);
+                assert_close(features.frac_worse_hands, cached.frac_worse_hands);
+                assert_eq!(features.num_simulations, cached.num_simulations);
+            }
+        }
+    }
+
+    #[test]
+    fn test_invalid_file() {
+        let path = std::env::temp_dir().join("holdthem_flop_table_invalid.bin");
+        std::fs::write(&path, b"not a flop table").unwrap();
+        assert!(FlopTable::load(&path).is_err());
+        std::fs::remove_file(&path).unwrap();
+    }
+}
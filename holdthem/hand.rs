@@ -1,5 +1,6 @@
+use crate::evaluator;
 use crate::globals;
-use rs_poker::core::{Card, Rankable, Suit, Value};
+use rs_poker::core::{Card, Rank, Rankable, Suit, Value};
 use std::collections::HashSet;
 use std::ops::Index;
 use std::ops::{RangeFrom, RangeFull, RangeTo};
@@ -23,7 +24,15 @@ pub fn card_index(card: &Card) -> usize {
     card.value as usize * 4 + card.suit as usize
 }
 
-#[derive(Debug, PartialEq, Clone)]
+/// The index of hole cards in globals::ALL_HANDS (see HoleCards::index)
+pub type HandIndex = u16;
+
+/// The hole cards with the given index, without copying them
+pub fn hole_cards_from_index(index: HandIndex) -> &'static HoleCards {
+    &globals::ALL_HANDS[index as usize]
+}
+
+#[derive(Debug, PartialEq, Clone, Copy)]
 pub struct HoleCards {
     pub cards: [Card; 2],
 }
@@ -45,7 +54,7 @@ impl HoleCards {
     }
 
     pub fn new_from_index(i: usize) -> HoleCards {
-        globals::ALL_HANDS[i].clone()
+        globals::ALL_HANDS[i]
     }
 
     pub fn slice(&self) -> &[Card] {
@@ -80,6 +89,10 @@ impl HoleCards {
         let offset = 52 * c1 - c1 * (c1 + 1) / 2;
         offset + (c2 - c1 - 1)
     }
+
+    pub fn hand_index(&self) -> HandIndex {
+        self.index() as HandIndex
+    }
 }
 
 #[derive(Debug, PartialEq, Clone)]
@@ -235,6 +248,95 @@ impl Index<RangeFrom<usize>> for Hand {
     }
 }
 
+/// The (hand_type, kicker) encoding of a rank that is shared with
+/// pokermon.poker.hands.HandType on the python side.
+pub fn rank_to_tuple(rank: &Rank) -> (i32, i32) {
+    match *rank {
+        Rank::HighCard(x) => (1, x as i32),
+        Rank::OnePair(x) => (2, x as i32),
+        Rank::TwoPair(x) => (3, x as i32),
+        Rank::ThreeOfAKind(x) => (4, x as i32),
+        Rank::Straight(x) => (5, x as i32),
+        Rank::Flush(x) => (6, x as i32),
+        Rank::FullHouse(x) => (7, x as i32),
+        Rank::FourOfAKind(x) => (8, x as i32),
+        Rank::StraightFlush(x) => (9, x as i32),
+    }
+}
+
+/// A u32 encoding of a rank whose ordering matches the ordering of ranks:
+/// the hand type (as in rank_to_tuple) in the top bits and the kicker below.
+pub fn rank_to_value(rank: &Rank) -> u32 {
+    let (hand_type, kicker) = rank_to_tuple(rank);
+    (hand_type as u32) << RANK_VALUE_SHIFT | kicker as u32
+}
+
+pub fn value_to_tuple(value: u32) -> (i32, i32) {
+    (
+        (value >> RANK_VALUE_SHIFT) as i32,
+        (value & ((1 << RANK_VALUE_SHIFT) - 1)) as i32,
+    )
+}
+
+/// Kickers use at most 26 bits (13 bits for the primary values and 13 for the
+/// secondary values)
+const RANK_VALUE_SHIFT: u32 = 26;
+
+/// Evaluate a batch of hands given as flat index buffers.
+///
+/// hole_indices holds one hole card index per hand and board_indices holds
+/// board_size card indices per hand (row-major).  The (hand_type, kicker)
+/// of each hand is written into the output slices.
+pub fn evaluate_hands_batch(
+    hole_indices: &[i32],
+    board_indices: &[i32],
+    board_size: usize,
+    hand_types: &mut [i32],
+    kickers: &mut [i32],
+) -> Result<(), String> {
+    if board_size < 3 || board_size > 5 {
+        return Err(format!("Invalid board size: {}", board_size));
+    }
+    if board_indices.len() != hole_indices.len() * board_size {
+        return Err(String::from(
+            "Number of boards does not match the number of hands",
+        ));
+    }
+    if hand_types.len() != hole_indices.len() || kickers.len() != hole_indices.len() {
+        return Err(String::from(
+            "Output size does not match the number of hands",
+        ));
+    }
+
+    let evaluator = evaluator::current();
+
+    for (i, (&hole_index, board)) in hole_indices
+        .iter()
+        .zip(board_indices.chunks_exact(board_size))
+        .enumerate()
+    {
+        if hole_index < 0 || hole_index as usize >= globals::ALL_HANDS.len() {
+            return Err(format!("Invalid hole cards index: {}", hole_index));
+        }
+        if let Some(&card) = board
+            .iter()
+            .find(|&&c| c < 0 || c as usize >= globals::ALL_CARDS.len())
+        {
+            return Err(format!("Invalid card index: {}", card));
+        }
+
+        let hole_cards = &globals::ALL_HANDS[hole_index as usize];
+        let board = Board::new_from_indices(board)?.ok_or("Board must not be empty")?;
+        let (hand_type, kicker) = value_to_tuple(
+            evaluator.rank_value(&Hand::from_hole_cards_and_board(hole_cards, &board)),
+        );
+        hand_types[i] = hand_type;
+        kickers[i] = kicker;
+    }
+
+    Ok(())
+}
+
 fn card_vec_from_string(hand_string: &str) -> Result<Vec<Card>, String> {
     // Get the chars iterator.
     let mut chars = hand_string.chars();
@@ -494,4 +596,50 @@ mod tests {
             assert_eq!(*h, ALL_HANDS[h.index()]);
         }
     }
+
+    #[test]
+    fn test_evaluate_hands_batch() {
+        let hands = [
+            HoleCards::new_from_string("AcAh").unwrap(),
+            HoleCards::new_from_string("7s8s").unwrap(),
+        ];
+        let boards = [
+            Board::new_from_string("AdKs2c").unwrap().unwrap(),
+            Board::new_from_string("5s6s9s").unwrap().unwrap(),
+        ];
+
+        let hole_indices: Vec<i32> = hands.iter().map(|h| h.index() as i32).collect();
+        let board_indices: Vec<i32> = boards
+            .iter()
+            .flat_map(|b| b.cards().iter().map(|c| card_index(c) as i32))
+            .collect();
+
+        let mut hand_types = vec![0; 2];
+        let mut kickers = vec![0; 2];
+        evaluate_hands_batch(
+            &hole_indices,
+            &board_indices,
+            3,
+            &mut hand_types,
+            &mut kickers,
+        )
+        .unwrap();
+
+        for i in 0..2 {
+            let expected =
+                rank_to_tuple(&Hand::from_hole_cards_and_board(&hands[i], &boards[i]).rank());
+            assert_eq!((hand_types[i], kickers[i]), expected);
+        }
+        assert_eq!(hand_types, vec![4, 9]);
+
+        assert!(evaluate_hands_batch(
+            &hole_indices,
+            &board_indices,
+            4,
+            &mut hand_types,
+            &mut kickers
+        )
+        .is_err());
+        assert!(evaluate_hands_batch(&[1326], &[0, 1, 2], 3, &mut [0], &mut [0]).is_err());
+    }
 }
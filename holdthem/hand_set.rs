@@ -0,0 +1,83 @@
+// A set holding hole cards
+//
+
+use crate::hand::HandIndex;
+
+/// The number of possible hole cards
+pub const NUM_HANDS: usize = 52 * 51 / 2;
+
+const NUM_WORDS: usize = (NUM_HANDS + 63) / 64;
+
+/// A set of hole cards, stored as one bit per hand index
+#[derive(Debug, Clone, PartialEq)]
+pub struct HandSet {
+    bitmap: [u64; NUM_WORDS],
+}
+
+impl HandSet {
+    pub fn new() -> HandSet {
+        HandSet {
+            bitmap: [0; NUM_WORDS],
+        }
+    }
+
+    pub fn from_indices(indices: &[HandIndex]) -> HandSet {
+        let mut set = HandSet::new();
+        for index in indices {
+            set.insert(*index)
+        }
+        set
+    }
+
+    pub fn contains(&self, index: HandIndex) -> bool {
+        self.bitmap[index as usize / 64] & (1 << (index % 64)) != 0
+    }
+
+    pub fn insert(&mut self, index: HandIndex) {
+        self.bitmap[index as usize / 64] |= 1 << (index % 64)
+    }
+
+    pub fn len(&self) -> usize {
+        self.bitmap.iter().map(|w| w.count_ones() as usize).sum()
+    }
+
+    pub fn is_empty(&self) -> bool {
+        self.bitmap.iter().all(|w| *w == 0)
+    }
+
+    /// The indices of the hands in the set, in increasing order
+    pub fn indices(&self) -> Vec<HandIndex> {
+        let mut indices = Vec::with_capacity(self.len());
+        for (i, word) in self.bitmap.iter().enumerate() {
+            let mut word = *word;
+            while word != 0 {
+                indices.push((i * 64) as HandIndex + word.trailing_zeros() as HandIndex);
+                word &= word - 1;
+            }
+        }
+        indices
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_set() {
+        let mut set = HandSet::new();
+        assert!(set.is_empty());
+
+        set.insert(0);
+        set.insert(63);
+        set.insert(64);
+        set.insert(NUM_HANDS as HandIndex - 1);
+        set.insert(64);
+
+        assert_eq!(set.len(), 4);
+        assert!(set.contains(63));
+        assert!(!set.contains(62));
+        assert_eq!(set.indices(), vec![0, 63, 64, NUM_HANDS as HandIndex - 1]);
+        assert_eq!(HandSet::from_indices(&set.indices()), set);
+    }
+}
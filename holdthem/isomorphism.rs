@@ -0,0 +1,164 @@
+// Canonical forms of hands under suit permutations
+//
+// Suits have no order in hold'em, so a hand and board whose suits are
+// relabelled (for example, swapping every spade with every heart) have the same
+// features.  A situation's canonical form is the relabelling with the smallest
+// (board mask, hand index), which is the same for every relabelling of it.
+
+use crate::globals::ALL_HANDS;
+use crate::hand::{card_index, Board, HoleCards};
+
+const NUM_SUITS: usize = 4;
+
+/// The 24 permutations of the suits
+const SUIT_PERMUTATIONS: [[usize; NUM_SUITS]; 24] = [
+    [0, 1, 2, 3],
+    [0, 1, 3, 2],
+    [0, 2, 1, 3],
+    [0, 2, 3, 1],
+    [0, 3, 1, 2],
+    [0, 3, 2, 1],
+    [1, 0, 2, 3],
+    [1, 0, 3, 2],
+    [1, 2, 0, 3],
+    [1, 2, 3, 0],
+    [1, 3, 0, 2],
+    [1, 3, 2, 0],
+    [2, 0, 1, 3],
+    [2, 0, 3, 1],
+    [2, 1, 0, 3],
+    [2, 1, 3, 0],
+    [2, 3, 0, 1],
+    [2, 3, 1, 0],
+    [3, 0, 1, 2],
+    [3, 0, 2, 1],
+    [3, 1, 0, 2],
+    [3, 1, 2, 0],
+    [3, 2, 0, 1],
+    [3, 2, 1, 0],
+];
+
+fn permute_card(index: usize, permutation: &[usize; NUM_SUITS]) -> usize {
+    index - index % NUM_SUITS + permutation[index % NUM_SUITS]
+}
+
+/// The index of the hand holding two (distinct) cards
+fn hand_index(c1: usize, c2: usize) -> usize {
+    let (lo, hi) = if c1 < c2 { (c1, c2) } else { (c2, c1) };
+    // Matches HoleCards::index
+    52 * lo - lo * (lo + 1) / 2 + (hi - lo - 1)
+}
+
+/// The smallest mask of the board's cards under any suit permutation, which
+/// identifies the board up to suit permutations
+pub fn canonical_board_mask(board: &Board) -> u64 {
+    let board: Vec<usize> = board.cards().iter().map(card_index).collect();
+    SUIT_PERMUTATIONS
+        .iter()
+        .map(|permutation| board_mask(&board, permutation))
+        .min()
+        .unwrap()
+}
+
+fn board_mask(board: &[usize], permutation: &[usize; NUM_SUITS]) -> u64 {
+    board
+        .iter()
+        .fold(0, |mask, c| mask | 1 << permute_card(*c, permutation))
+}
+
+/// A hand and board, identified up to suit permutations.  Only the set of board
+/// cards is kept, as features don't depend on their order.
+#[derive(Debug, Clone, Copy, PartialEq, Eq, Hash)]
+pub struct CanonicalForm {
+    /// The board's cards, as a mask of card indices
+    pub board_mask: u64,
+    /// The index of the hole cards (see HoleCards::index)
+    pub hand_index: usize,
+}
+
+impl CanonicalForm {
+    pub fn new(hole_cards: &HoleCards, board: &Board) -> CanonicalForm {
+        let hole: Vec<usize> = hole_cards.cards.iter().map(card_index).collect();
+        let board: Vec<usize> = board.cards().iter().map(card_index).collect();
+
+        SUIT_PERMUTATIONS
+            .iter()
+            .map(|permutation| CanonicalForm {
+                board_mask: board_mask(&board, permutation),
+                hand_index: hand_index(
+                    permute_card(hole[0], permutation),
+                    permute_card(hole[1], permutation),
+                ),
+            })
+            .min_by_key(|form| (form.board_mask, form.hand_index))
+            .unwrap()
+    }
+
+    pub fn hole_cards(&self) -> HoleCards {
+        ALL_HANDS[self.hand_index].clone()
+    }
+
+    /// The board, with its cards in increasing order
+    pub fn board(&self) -> Board {
+        let indices: Vec<i32> = (0..64)
+            .filter(|i| self.board_mask & (1 << i) != 0)
+            .map(|i| i as i32)
+            .collect();
+        Board::new_from_indices(&indices).unwrap().unwrap()
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::globals::ALL_CARDS;
+    use std::collections::HashSet;
+
+    #[test]
+    fn test_suit_permutations_are_equivalent() {
+        let hole_cards = HoleCards::new_from_string("AsKd").unwrap();
+        let board = Board::new_from_string("2s7h9s").unwrap().unwrap();
+
+        let relabelled_hole_cards = HoleCards::new_from_string("AcKh").unwrap();
+        let relabelled_board = Board::new_from_string("9c2c7s").unwrap().unwrap();
+
+        let form = CanonicalForm::new(&hole_cards, &board);
+        assert_eq!(
+            form,
+            CanonicalForm::new(&relabelled_hole_cards, &relabelled_board)
+        );
+
+        // The canonical form is a relabelling of the original
+        assert_eq!(form, CanonicalForm::new(&form.hole_cards(), &form.board()));
+
+        // But swapping the suits of only some cards isn't
+        let different_hole_cards = HoleCards::new_from_string("AdKs").unwrap();
+        assert_ne!(form, CanonicalForm::new(&different_hole_cards, &board));
+    }
+
+    #[test]
+    fn test_num_canonical_flops() {
+        let mut forms = HashSet::new();
+        let mut num_flops = 0;
+        let hole_cards = HoleCards::new_from_string("2c2d").unwrap();
+        for i in 0..ALL_CARDS.len() {
+            for j in i + 1..ALL_CARDS.len() {
+                for k in j + 1..ALL_CARDS.len() {
+                    let board = Board::Flop([ALL_CARDS[i], ALL_CARDS[j], ALL_CARDS[k]]);
+                    let mask = canonical_board_mask(&board);
+                    let form = CanonicalForm::new(&hole_cards, &board);
+                    assert_eq!(mask, form.board_mask);
+                    // A canonical flop is its own canonical form
+                    assert_eq!(mask, canonical_board_mask(&form.board()));
+                    forms.insert(mask);
+                    num_flops += 1;
+                }
+            }
+        }
+        assert_eq!(num_flops, 22100);
+        // The board is compared first, so its canonical mask doesn't depend on
+        // the hand, and there is one for each of the 1755 strategically
+        // different flops
+        assert_eq!(forms.len(), 1755);
+    }
+}
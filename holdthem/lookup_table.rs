@@ -0,0 +1,448 @@
+// A precomputed lookup table for ranking 5, 6 and 7 card hands.
+//
+// Every card maps to a u64 key which is summed over the cards in a hand:
+//  - Bits 0-16 hold the counts of the seven lowest values, in base 5
+//  - Bits 17-31 hold the counts of the six highest values, in base 5
+//  - Bits 32-47 hold one 4-bit counter per suit
+//
+// If any suit has five or more cards, the hand is a flush (or straight flush)
+// and is looked up in a table indexed by the 13-bit set of that suit's values.
+// Otherwise, the hand only depends on the count of each value.  The counts of
+// the low values are numbered in order of their total, so for a given set of
+// high value counts, every possible set of low value counts is a prefix of that
+// numbering.  The table stores these prefixes one after another, which keeps it
+// small (about 330KB) and lets a hand be ranked with two index lookups.
+//
+// Ranks are stored as u32s (see hand::rank_to_value), so they can be compared
+// directly.  The table is written to disk by build_to_file() and memory-mapped
+// by load(), so all processes using the same file share one copy of it.
+
+use crate::hand::{card_index, rank_to_value, Hand};
+use memmap::Mmap;
+use rs_poker::core::{Card, Rankable, Suit, Value};
+use std::convert::TryInto;
+use std::fs::File;
+use std::io::Write;
+use std::ops::Deref;
+use std::path::Path;
+
+const MAGIC: &[u8; 8] = b"HOLDTHEM";
+const VERSION: u32 = 1;
+const HEADER_SIZE: usize = 20;
+
+const NUM_LOW_VALUES: usize = 7;
+const NUM_HIGH_VALUES: usize = 6;
+const HIGH_KEY_SHIFT: u64 = 17;
+const SUIT_SHIFT: u64 = 32;
+
+const NUM_FLUSH_ENTRIES: usize = 1 << 13;
+const MAX_CARDS: usize = 7;
+
+/// The bytes of a table, either built in memory or mapped from a file
+enum TableData {
+    Owned(Vec<u8>),
+    Mapped(Mmap),
+}
+
+impl Deref for TableData {
+    type Target = [u8];
+    fn deref(&self) -> &[u8] {
+        match self {
+            TableData::Owned(x) => x,
+            TableData::Mapped(x) => x,
+        }
+    }
+}
+
+pub struct LookupTable {
+    data: TableData,
+    /// The key of every card, indexed by card index
+    card_keys: [u64; 52],
+    /// Maps the base-5 counts of the low values to their number
+    low_index: Vec<u32>,
+    /// Maps the base-5 counts of the high values to the start of their prefix
+    high_offset: Vec<u32>,
+    num_ranks: usize,
+}
+
+/// The counts of each value encoded by a base-5 key
+fn base_5_digits(key: usize, num_digits: usize) -> Vec<usize> {
+    (0..num_digits)
+        .map(|i| key / 5usize.pow(i as u32) % 5)
+        .collect()
+}
+
+fn num_cards(key: usize, num_digits: usize) -> usize {
+    base_5_digits(key, num_digits).iter().sum()
+}
+
+/// Numbers the base-5 keys of the low values (with at most MAX_CARDS cards)
+/// in order of their number of cards.  Returns the number of each key and the
+/// number of keys with at most n cards, for each n.
+fn make_low_index() -> (Vec<u32>, [usize; MAX_CARDS + 1]) {
+    let num_keys = 5usize.pow(NUM_LOW_VALUES as u32);
+    let mut index = vec![0; num_keys];
+    let mut num_with_at_most = [0; MAX_CARDS + 1];
+
+    let mut next = 0;
+    for n in 0..=MAX_CARDS {
+        for (key, idx) in index.iter_mut().enumerate() {
+            if num_cards(key, NUM_LOW_VALUES) == n {
+                *idx = next;
+                next += 1;
+            }
+        }
+        num_with_at_most[n] = next as usize;
+    }
+    (index, num_with_at_most)
+}
+
+/// Assigns each base-5 key of the high values (with at most MAX_CARDS cards)
+/// the offset of a block large enough to hold every possible low key.
+/// Returns the offsets and the total size of all blocks.
+fn make_high_offsets(num_low_with_at_most: &[usize; MAX_CARDS + 1]) -> (Vec<u32>, usize) {
+    let num_keys = 5usize.pow(NUM_HIGH_VALUES as u32);
+    let mut offsets = vec![0; num_keys];
+
+    let mut size = 0;
+    for (key, offset) in offsets.iter_mut().enumerate() {
+        let n = num_cards(key, NUM_HIGH_VALUES);
+        if n <= MAX_CARDS {
+            *offset = size as u32;
+            size += num_low_with_at_most[MAX_CARDS - n];
+        }
+    }
+    (offsets, size)
+}
+
+fn make_card_keys() -> [u64; 52] {
+    let mut keys = [0; 52];
+    for (idx, key) in keys.iter_mut().enumerate() {
+        let value = idx / 4;
+        let suit = idx % 4;
+        let value_key = if value < NUM_LOW_VALUES {
+            5u64.pow(value as u32)
+        } else {
+            5u64.pow((value - NUM_LOW_VALUES) as u32) << HIGH_KEY_SHIFT
+        };
+        *key = value_key | 1 << (SUIT_SHIFT + 4 * suit as u64);
+    }
+    keys
+}
+
+/// A hand made of the given number of cards of each value, with suits chosen
+/// so that no more than two cards share a suit (so it is never a flush)
+fn make_unsuited_hand(value_counts: &[usize]) -> Vec<Card> {
+    let mut cards = vec![];
+    for (value, count) in value_counts.iter().enumerate() {
+        for _ in 0..*count {
+            cards.push(Card {
+                value: Value::values()[value],
+                suit: Suit::suits()[cards.len() % 4],
+            });
+        }
+    }
+    cards
+}
+
+fn rank_cards(cards: &[Card]) -> u32 {
+    let hand = match cards.len() {
+        5 => Hand::Five(cards.try_into().unwrap()),
+        6 => Hand::Six(cards.try_into().unwrap()),
+        7 => Hand::Seven(cards.try_into().unwrap()),
+        _ => panic!("Cannot rank {} cards", cards.len()),
+    };
+    rank_to_value(&hand.rank())
+}
+
+fn read_u32(data: &[u8], offset: usize) -> u32 {
+    u32::from_le_bytes(data[offset..offset + 4].try_into().unwrap())
+}
+
+impl LookupTable {
+    /// Rank every possible hand (using rs_poker) and return the serialized table
+    pub fn build() -> Vec<u8> {
+        let (low_index, num_low_with_at_most) = make_low_index();
+        let (high_offset, num_ranks) = make_high_offsets(&num_low_with_at_most);
+
+        let mut flush_ranks = vec![0u32; NUM_FLUSH_ENTRIES];
+        for (mask, rank) in flush_ranks.iter_mut().enumerate() {
+            let num_cards = (mask as u32).count_ones() as usize;
+            if num_cards < 5 || num_cards > MAX_CARDS {
+                continue;
+            }
+            let cards: Vec<Card> = (0..13)
+                .filter(|value| mask & (1 << value) != 0)
+                .map(|value| Card {
+                    value: Value::values()[value],
+                    suit: Suit::Spade,
+                })
+                .collect();
+            *rank = rank_cards(&cards);
+        }
+
+        // The counts of every low key with at most MAX_CARDS cards
+        let low_counts: Vec<(usize, Vec<usize>)> = (0..low_index.len())
+            .map(|key| (key, base_5_digits(key, NUM_LOW_VALUES)))
+            .filter(|(_, counts)| counts.iter().sum::<usize>() <= MAX_CARDS)
+            .collect();
+
+        let mut ranks = vec![0u32; num_ranks];
+        for (high_key, &offset) in high_offset.iter().enumerate() {
+            let high_counts = base_5_digits(high_key, NUM_HIGH_VALUES);
+            if high_counts.iter().sum::<usize>() > MAX_CARDS {
+                continue;
+            }
+            for (low_key, counts) in low_counts.iter() {
+                let mut value_counts = counts.clone();
+                value_counts.extend(high_counts.iter());
+
+                let num_cards: usize = value_counts.iter().sum();
+                if num_cards >= 5 && num_cards <= MAX_CARDS {
+                    let idx = low_index[*low_key];
+                    ranks[(offset + idx) as usize] = rank_cards(&make_unsuited_hand(&value_counts));
+                }
+            }
+        }
+
+        let mut data: Vec<u8> =
+            Vec::with_capacity(HEADER_SIZE + 4 * (NUM_FLUSH_ENTRIES + num_ranks));
+        data.extend_from_slice(MAGIC);
+        data.extend_from_slice(&VERSION.to_le_bytes());
+        data.extend_from_slice(&(NUM_FLUSH_ENTRIES as u32).to_le_bytes());
+        data.extend_from_slice(&(num_ranks as u32).to_le_bytes());
+        for rank in flush_ranks.iter().chain(ranks.iter()) {
+            data.extend_from_slice(&rank.to_le_bytes());
+        }
+        data
+    }
+
+    /// Build the table and write it to the given path
+    pub fn build_to_file(path: &Path) -> Result<(), String> {
+        let data = LookupTable::build();
+        let mut file = File::create(path).map_err(|e| e.to_string())?;
+        file.write_all(&data).map_err(|e| e.to_string())?;
+        Ok(())
+    }
+
+    /// Memory-map a table written by build_to_file
+    pub fn load(path: &Path) -> Result<LookupTable, String> {
+        let file = File::open(path).map_err(|e| format!("{}: {}", path.display(), e))?;
+        let data = unsafe { Mmap::map(&file) }.map_err(|e| e.to_string())?;
+        LookupTable::from_data(TableData::Mapped(data))
+    }
+
+    /// Build the table in memory, without writing it to disk
+    pub fn new_in_memory() -> LookupTable {
+        LookupTable::from_data(TableData::Owned(LookupTable::build())).unwrap()
+    }
+
+    fn from_data(data: TableData) -> Result<LookupTable, String> {
+        let (low_index, num_low_with_at_most) = make_low_index();
+        let (high_offset, num_ranks) = make_high_offsets(&num_low_with_at_most);
+
+        if data.len() < HEADER_SIZE
+            || &data[0..8] != MAGIC
+            || read_u32(&data, 8) != VERSION
+            || read_u32(&data, 12) as usize != NUM_FLUSH_ENTRIES
+            || read_u32(&data, 16) as usize != num_ranks
+        {
+            return Err(String::from("Invalid lookup table header"));
+        }
+
+        if data.len() != HEADER_SIZE + 4 * (NUM_FLUSH_ENTRIES + num_ranks) {
+            return Err(String::from("Invalid lookup table size"));
+        }
+
+        Ok(LookupTable {
+            data,
+            card_keys: make_card_keys(),
+            low_index,
+            high_offset,
+            num_ranks,
+        })
+    }
+
+    fn flush_rank(&self, mask: usize) -> u32 {
+        read_u32(&self.data, HEADER_SIZE + 4 * mask)
+    }
+
+    fn unsuited_rank(&self, idx: usize) -> u32 {
+        read_u32(&self.data, HEADER_SIZE + 4 * (NUM_FLUSH_ENTRIES + idx))
+    }
+
+    /// The rank (see hand::rank_to_value) of 5, 6 or 7 cards
+    pub fn rank_value(&self, cards: &[Card]) -> u32 {
+        let mut key: u64 = 0;
+        for card in cards {
+            key += self.card_keys[card_index(card)];
+        }
+
+        // Adding 3 to each 4-bit suit counter sets its high bit if it is at least 5
+        let flush_bits = ((key >> SUIT_SHIFT) + 0x3333) & 0x8888;
+        if flush_bits != 0 {
+            let suit = flush_bits.trailing_zeros() as u8 / 4;
+            let mask = cards
+                .iter()
+                .filter(|c| c.suit as u8 == suit)
+                .fold(0, |mask, c| mask | 1 << c.value as usize);
+            return self.flush_rank(mask);
+        }
+
+        let low_key = (key & ((1 << HIGH_KEY_SHIFT) - 1)) as usize;
+        let high_key =
+            ((key >> HIGH_KEY_SHIFT) & ((1 << (SUIT_SHIFT - HIGH_KEY_SHIFT)) - 1)) as usize;
+        self.unsuited_rank((self.high_offset[high_key] + self.low_index[low_key]) as usize)
+    }
+
+    pub fn num_ranks(&self) -> usize {
+        self.num_ranks
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::globals::ALL_CARDS;
+    use crate::hand::{Board, HoleCards};
+    use lazy_static::lazy_static;
+    use rand::seq::SliceRandom;
+    use rand::thread_rng;
+
+    lazy_static! {
+        static ref TABLE: LookupTable = LookupTable::new_in_memory();
+    }
+
+    fn rs_poker_rank_value(cards: &[Card]) -> u32 {
+        rank_cards(cards)
+    }
+
+    fn make_hand(hole_cards: &str, board: &str) -> Hand {
+        Hand::from_hole_cards_and_board(
+            &HoleCards::new_from_string(hole_cards).unwrap(),
+            &Board::new_from_string(board).unwrap().unwrap(),
+        )
+    }
+
+    #[test]
+    fn test_all_five_card_hands() {
+        let mut cards: [Card; 5] = [ALL_CARDS[0]; 5];
+        for a in 0..52 {
+            for b in a + 1..52 {
+                for c in b + 1..52 {
+                    for d in c + 1..52 {
+                        for e in d + 1..52 {
+                            for (i, &idx) in [a, b, c, d, e].iter().enumerate() {
+                                cards[i] = ALL_CARDS[idx];
+                            }
+                            assert_eq!(TABLE.rank_value(&cards), rs_poker_rank_value(&cards));
+                        }
+                    }
+                }
+            }
+        }
+    }
+
+    #[test]
+    fn test_random_six_and_seven_card_hands() {
+        let mut rng = thread_rng();
+        let mut deck: Vec<Card> = ALL_CARDS.clone();
+        for _ in 0..200000 {
+            deck.shuffle(&mut rng);
+            assert_eq!(
+                TABLE.rank_value(&deck[..6]),
+                rs_poker_rank_value(&deck[..6])
+            );
+            assert_eq!(
+                TABLE.rank_value(&deck[..7]),
+                rs_poker_rank_value(&deck[..7])
+            );
+        }
+    }
+
+    #[test]
+    fn test_every_six_and_seven_card_entry() {
+        // Hands without a flush are ranked by their value counts, so check one
+        // hand for every count of each value
+        fn check_counts(counts: &mut [usize; 13], value: usize, num_cards: usize) {
+            if value == 13 {
+                if num_cards >= 6 {
+                    // Dealing the suits in turn keeps every suit below five cards
+                    let cards: Vec<Card> = (0..13)
+                        .flat_map(|v| std::iter::repeat(v).take(counts[v]))
+                        .enumerate()
+                        .map(|(i, v)| ALL_CARDS[v * 4 + i % 4])
+                        .collect();
+                    assert_eq!(TABLE.rank_value(&cards), rs_poker_rank_value(&cards));
+                }
+                return;
+            }
+            for count in 0..=4.min(7 - num_cards) {
+                counts[value] = count;
+                check_counts(counts, value + 1, num_cards + count);
+            }
+            counts[value] = 0;
+        }
+        check_counts(&mut [0; 13], 0, 0);
+
+        // Flushes are ranked by the values of the flush suit, whatever the
+        // other cards are
+        for values in 0u32..1 << 13 {
+            let num_values = values.count_ones() as usize;
+            if num_values < 5 || num_values > 7 {
+                continue;
+            }
+            let mut cards: Vec<Card> = (0..13)
+                .filter(|v| values & (1 << v) != 0)
+                .map(|v| ALL_CARDS[v * 4])
+                .collect();
+            let lowest = values.trailing_zeros() as usize;
+            for suit in 1..=7 - num_values {
+                cards.push(ALL_CARDS[lowest * 4 + suit]);
+            }
+            for num_cards in num_values.max(6)..=7 {
+                let hand = &cards[..num_cards];
+                assert_eq!(TABLE.rank_value(hand), rs_poker_rank_value(hand));
+            }
+        }
+    }
+
+    #[test]
+    fn test_flushes_with_pairs() {
+        // Flushes outrank the pairs and trips that are also in the hand
+        for (hole_cards, board) in &[
+            ("AdAc", "AsKs2s3s9s"),
+            ("9s9d", "AsKsQsJsTs"),
+            ("7d7c", "2s3s4s5s7s"),
+        ] {
+            let cards = make_hand(hole_cards, board);
+            assert_eq!(
+                TABLE.rank_value(cards.cards()),
+                rs_poker_rank_value(cards.cards())
+            );
+        }
+    }
+
+    #[test]
+    fn test_load_from_file() {
+        let path = std::env::temp_dir().join("holdthem_lookup_table_test.bin");
+        LookupTable::build_to_file(&path).unwrap();
+        let table = LookupTable::load(&path).unwrap();
+        std::fs::remove_file(&path).unwrap();
+
+        let cards = make_hand("AsAd", "KsKd2c3h9d");
+        assert_eq!(
+            table.rank_value(cards.cards()),
+            rs_poker_rank_value(cards.cards())
+        );
+        assert_eq!(table.num_ranks(), TABLE.num_ranks());
+    }
+
+    #[test]
+    fn test_invalid_file() {
+        let path = std::env::temp_dir().join("holdthem_lookup_table_invalid.bin");
+        std::fs::write(&path, b"not a lookup table").unwrap();
+        assert!(LookupTable::load(&path).is_err());
+        std::fs::remove_file(&path).unwrap();
+    }
+}
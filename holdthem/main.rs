@@ -1,16 +1,25 @@
+mod board_index;
 mod cardset;
+mod evaluator;
 mod features;
+mod flop_table;
 mod globals;
 mod hand;
+mod hand_set;
+mod isomorphism;
+mod lookup_table;
 mod nut_result;
 mod simulate;
 mod stack_array;
 
 use crate::simulate::simulate;
 
-use crate::hand::{Board, HoleCards};
+use crate::flop_table::FlopTable;
+use crate::hand::{Board, HandIndex, HoleCards};
+use crate::lookup_table::LookupTable;
 use clap::Clap;
 use rs_poker::core::{Card, Suit, Value};
+use std::path::Path;
 
 pub fn card_from_char(card_str: &str) -> Result<Card, String> {
     let value = Value::from_char(card_str.chars().next().unwrap()).unwrap();
@@ -32,16 +41,57 @@ struct Opts {
 
     #[clap(long, default_value = "100000000")]
     num_to_simulate: i64,
+
+    /// The number of threads to simulate with (by default, one per core)
+    #[clap(long)]
+    num_threads: Option<usize>,
+
+    /// Rank hands using the lookup table at this path
+    #[clap(long)]
+    lookup_table: Option<String>,
+
+    /// Build the lookup table, write it to this path and exit
+    #[clap(long)]
+    build_lookup_table: Option<String>,
+
+    /// Build the flop feature table, write it to this path and exit
+    #[clap(long)]
+    build_flop_table: Option<String>,
+
+    /// The number of hands the flop feature table simulates against each part
+    /// of the range
+    #[clap(long, default_value = "1000")]
+    flop_table_num_to_simulate: i64,
 }
 
 fn main() {
     let opts: Opts = Opts::parse();
 
+    if let Some(path) = opts.build_lookup_table {
+        LookupTable::build_to_file(Path::new(&path)).unwrap();
+        println!("Wrote lookup table to {}", path);
+        return;
+    }
+
+    if let Some(num_threads) = opts.num_threads {
+        simulate::set_num_threads(num_threads).unwrap();
+    }
+
+    if let Some(path) = opts.lookup_table {
+        evaluator::use_lookup_table(Path::new(&path)).unwrap();
+    }
+
+    if let Some(path) = opts.build_flop_table {
+        FlopTable::build_to_file(Path::new(&path), opts.flop_table_num_to_simulate).unwrap();
+        println!("Wrote flop table to {}", path);
+        return;
+    }
+
     let hand = HoleCards::new_from_string(&*opts.hand).unwrap();
-    let oppo_range: Vec<HoleCards> = opts
+    let oppo_range: Vec<HandIndex> = opts
         .range
         .split(',')
-        .map(|s| HoleCards::new_from_string(s).unwrap())
+        .map(|s| HoleCards::new_from_string(s).unwrap().hand_index())
         .collect();
 
     let board: Option<Board> = match opts.board {
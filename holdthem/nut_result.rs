@@ -1,13 +1,13 @@
-use crate::cardset::CardSet;
-use crate::globals::ALL_HANDS;
-use crate::hand::{Board, Hand, HoleCards};
-use rs_poker::core::Rankable;
+use crate::board_index;
+use crate::hand::{Board, HoleCards};
+use crate::hand_set::HandSet;
 
+/// The hands that beat, tie and lose to the hero
 #[derive(Debug, Clone)]
 pub struct NutResult {
-    pub better_hands: Vec<HoleCards>,
-    pub tied_hands: Vec<HoleCards>,
-    pub worse_hands: Vec<HoleCards>,
+    pub better_hands: HandSet,
+    pub tied_hands: HandSet,
+    pub worse_hands: HandSet,
 }
 
 impl NutResult {
@@ -25,34 +25,9 @@ impl NutResult {
     }
 }
 
-pub fn make_nut_result(hole_cards: &HoleCards, board: &Board) -> NutResult {
-    let hand = Hand::from_hole_cards_and_board(hole_cards, board);
-
-    let rank = hand.rank();
-    let mut nut_result = NutResult {
-        better_hands: vec![],
-        tied_hands: vec![],
-        worse_hands: vec![],
-    };
-
-    let used_cards = CardSet::from_hole_cards_and_board(hole_cards, &Some(board.clone()));
-
-    for villian_hole_cards in ALL_HANDS.iter() {
-        if used_cards.intersects(villian_hole_cards) {
-            continue;
-        }
-
-        let villian_hand = Hand::from_hole_cards_and_board(villian_hole_cards, board);
-        let villian_rank = villian_hand.rank();
-
-        if villian_rank < rank {
-            nut_result.worse_hands.push(villian_hole_cards.clone());
-        } else if rank != villian_rank {
-            nut_result.better_hands.push(villian_hole_cards.clone());
-        } else {
-            nut_result.tied_hands.push(villian_hole_cards.clone());
-        }
-    }
-
-    nut_result
+/// Split the hands that are possible on a board by whether they beat, tie or
+/// lose to the hero.  The board's ranks are kept in board_index's cache of
+/// recent boards, so later hands on the same board don't re-rank every hand.
+pub fn make_nut_result(hole_cards: &HoleCards, board: &Board) -> Result<NutResult, String> {
+    board_index::get(board).nut_result(hole_cards)
 }
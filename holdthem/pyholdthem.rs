@@ -1,20 +1,31 @@
+mod board_index;
 mod cardset;
+mod evaluator;
 mod features;
+mod flop_table;
 mod globals;
 mod hand;
+mod hand_set;
+mod isomorphism;
+mod lookup_table;
 mod nut_result;
 mod simulate;
 mod stack_array;
 
 use crate::simulate::simulate;
+use crate::simulate::{Budget, SamplingMode};
+use numpy::{PyArray1, PyReadonlyArray1, PyReadonlyArray2};
 use pyo3::exceptions::PyValueError;
 use pyo3::prelude::*;
 use pyo3::types::PyModule;
 use pyo3::{wrap_pyfunction, PyObjectProtocol};
 
-use crate::hand::{Board, Hand, HoleCards};
-
-use rs_poker::core::{Rank, Rankable};
+use crate::flop_table::FlopTable;
+use crate::hand::{value_to_tuple, Board, Hand, HandIndex, HoleCards};
+use crate::hand_set::NUM_HANDS;
+use crate::lookup_table::LookupTable;
+use crate::nut_result::make_nut_result;
+use std::path::Path;
 
 #[derive(Debug)]
 struct HoldThemError {
@@ -48,17 +59,7 @@ fn evaluate_hand(hole_cards: String, board: Vec<String>) -> Result<(i32, i32), H
     let hand =
         Hand::from_hole_cards_and_board(&hole_cards, &board.ok_or("Board must not be empty")?);
 
-    Ok(match hand.rank() {
-        Rank::HighCard(x) => (1, x as i32),
-        Rank::OnePair(x) => (2, x as i32),
-        Rank::TwoPair(x) => (3, x as i32),
-        Rank::ThreeOfAKind(x) => (4, x as i32),
-        Rank::Straight(x) => (5, x as i32),
-        Rank::Flush(x) => (6, x as i32),
-        Rank::FullHouse(x) => (7, x as i32),
-        Rank::FourOfAKind(x) => (8, x as i32),
-        Rank::StraightFlush(x) => (9, x as i32),
-    })
+    Ok(value_to_tuple(evaluator::current().rank_value(&hand)))
 }
 
 #[pyfunction]
@@ -74,17 +75,64 @@ fn evaluate_hand_from_indices(
     let hand =
         Hand::from_hole_cards_and_board(&hole_cards, &board.ok_or("Board must not be empty")?);
 
-    Ok(match hand.rank() {
-        Rank::HighCard(x) => (1, x as i32),
-        Rank::OnePair(x) => (2, x as i32),
-        Rank::TwoPair(x) => (3, x as i32),
-        Rank::ThreeOfAKind(x) => (4, x as i32),
-        Rank::Straight(x) => (5, x as i32),
-        Rank::Flush(x) => (6, x as i32),
-        Rank::FullHouse(x) => (7, x as i32),
-        Rank::FourOfAKind(x) => (8, x as i32),
-        Rank::StraightFlush(x) => (9, x as i32),
+    Ok(value_to_tuple(evaluator::current().rank_value(&hand)))
+}
+
+/// Evaluate N hands at once.
+///
+/// Takes a contiguous int32 array of N hole card indices and an int32 array
+/// of shape (N, board_size) of board card indices, and returns a pair of
+/// int32 arrays (hand_types, kickers) of length N.  The GIL is released
+/// while the hands are evaluated.
+#[pyfunction]
+fn evaluate_hands_batch<'py>(
+    py: Python<'py>,
+    hole_indices: PyReadonlyArray1<i32>,
+    board_indices: PyReadonlyArray2<i32>,
+) -> PyResult<(&'py PyArray1<i32>, &'py PyArray1<i32>)> {
+    let hole_slice = hole_indices.as_slice()?;
+    let board_slice = board_indices.as_slice()?;
+    let board_size = board_indices.shape()[1];
+
+    let mut hand_types = vec![0; hole_slice.len()];
+    let mut kickers = vec![0; hole_slice.len()];
+
+    py.allow_threads(|| {
+        hand::evaluate_hands_batch(
+            hole_slice,
+            board_slice,
+            board_size,
+            &mut hand_types,
+            &mut kickers,
+        )
     })
+    .map_err(HoldThemError::from)?;
+
+    Ok((
+        PyArray1::from_vec(py, hand_types),
+        PyArray1::from_vec(py, kickers),
+    ))
+}
+
+/// Rank every possible hand and write the lookup table to the given path.
+#[pyfunction]
+fn build_lookup_table(py: Python, path: String) -> Result<(), HoldThemError> {
+    py.allow_threads(|| LookupTable::build_to_file(Path::new(&path)))?;
+    Ok(())
+}
+
+/// Rank hands using the lookup table at the given path (which is memory-mapped,
+/// so it is shared by all processes using it).
+#[pyfunction]
+fn use_lookup_table(path: String) -> Result<(), HoldThemError> {
+    evaluator::use_lookup_table(Path::new(&path))?;
+    Ok(())
+}
+
+/// Rank hands using rs_poker (the default).
+#[pyfunction]
+fn use_rs_poker_evaluator() {
+    evaluator::use_rs_poker()
 }
 
 #[pyclass]
@@ -96,6 +144,14 @@ struct SimulationResult {
     pub num_losses: i64,
     #[pyo3(get)]
     pub num_ties: i64,
+    #[pyo3(get)]
+    pub num_simulations: i64,
+    #[pyo3(get)]
+    pub win_std_error: f32,
+    #[pyo3(get)]
+    pub tie_std_error: f32,
+    #[pyo3(get)]
+    pub lose_std_error: f32,
 }
 
 #[pyproto]
@@ -111,32 +167,132 @@ impl std::convert::From<&simulate::SimulationResult> for SimulationResult {
             num_wins: res.num_wins,
             num_losses: res.num_losses,
             num_ties: res.num_ties,
+            num_simulations: res.num_simulations(),
+            win_std_error: res.win_std_error(),
+            tie_std_error: res.tie_std_error(),
+            lose_std_error: res.lose_std_error(),
         }
     }
 }
 
+/// The indices of a range of hole cards given as strings (eg "AdKd")
+fn range_from_strings(range: &[String]) -> Result<Vec<HandIndex>, String> {
+    range
+        .iter()
+        .map(|s| Ok(HoleCards::new_from_string(s)?.hand_index()))
+        .collect()
+}
+
 #[pyfunction]
 fn simulate_hand(
+    py: Python,
     hand: String,
     range: Vec<String>,
     board: Vec<String>,
     num_to_simulate: i64,
 ) -> Result<SimulationResult, HoldThemError> {
-    let range: Vec<HoleCards> = range
-        .iter()
-        .map(|s| HoleCards::new_from_string(s))
-        .collect::<Result<Vec<HoleCards>, String>>()?;
+    let range = range_from_strings(&range[..])?;
     let board = Board::new_from_string_vec(&board[..])?;
+    let hand = HoleCards::new_from_string(&*hand)?;
 
-    let result = simulate(
-        &HoleCards::new_from_string(&*hand)?,
-        &range,
-        &board,
-        num_to_simulate,
-    )?;
+    let result = py.allow_threads(|| simulate(&hand, &range, &board, num_to_simulate))?;
     Ok(SimulationResult::from(&result))
 }
 
+/// As simulate_hand, with the hand, range and board given as indices.  The
+/// range is an array of hand indices, such as one returned by
+/// make_nut_result_from_indices.
+#[pyfunction]
+fn simulate_hand_from_indices(
+    py: Python,
+    hand: i32,
+    range: PyReadonlyArray1<u16>,
+    board: Vec<i32>,
+    num_to_simulate: i64,
+) -> Result<SimulationResult, HoldThemError> {
+    let range: Vec<HandIndex> = range.as_array().to_vec();
+    if let Some(index) = range.iter().find(|i| **i as usize >= NUM_HANDS) {
+        return Err(HoldThemError::from(format!(
+            "Invalid hand index: {}",
+            index
+        )));
+    }
+    let board = Board::new_from_indices(&board[..])?;
+    let hand = HoleCards::new_from_index(hand as usize);
+
+    let result = py.allow_threads(|| simulate(&hand, &range, &board, num_to_simulate))?;
+    Ok(SimulationResult::from(&result))
+}
+
+/// Simulate until the 95% confidence interval of each of the win, tie and lose
+/// fractions is at most max_ci_width wide, or max_to_simulate hands have been
+/// simulated.
+#[pyfunction]
+fn simulate_hand_until_converged(
+    py: Python,
+    hand: String,
+    range: Vec<String>,
+    board: Vec<String>,
+    max_ci_width: f32,
+    max_to_simulate: i64,
+) -> Result<SimulationResult, HoldThemError> {
+    let range = range_from_strings(&range[..])?;
+    let board = Board::new_from_string_vec(&board[..])?;
+    let hand = HoleCards::new_from_string(&*hand)?;
+
+    let result = py.allow_threads(|| {
+        simulate::simulate_until_converged(
+            &hand,
+            &range,
+            &board,
+            max_ci_width,
+            max_to_simulate,
+            SamplingMode::Random,
+        )
+    })?;
+    Ok(SimulationResult::from(&result))
+}
+
+/// Estimate the hero's equity (counting ties as half a win) against every hand
+/// in the range, ranking the hero's hand once per runout.  Returns a float32
+/// array of equities and an int64 array of the number of runouts each hand was
+/// evaluated on, both of length 1326 and indexed by hand index.  Hands that
+/// weren't evaluated have an equity of NaN.
+#[pyfunction]
+fn simulate_hand_equities<'py>(
+    py: Python<'py>,
+    hand: String,
+    range: Vec<String>,
+    board: Vec<String>,
+    num_runouts: i64,
+) -> PyResult<(&'py PyArray1<f32>, &'py PyArray1<i64>)> {
+    let range = range_from_strings(&range[..]).map_err(HoldThemError::from)?;
+    let board = Board::new_from_string_vec(&board[..]).map_err(HoldThemError::from)?;
+    let hand = HoleCards::new_from_string(&*hand).map_err(HoldThemError::from)?;
+
+    let equities = py
+        .allow_threads(|| simulate::simulate_hand_equities(&hand, &range, &board, num_runouts))
+        .map_err(HoldThemError::from)?;
+
+    let equity: Vec<f32> = (0..equities.num_runouts.len())
+        .map(|i| equities.equity(i))
+        .collect();
+    let num_runouts: Vec<i64> = equities.num_runouts.iter().map(|n| *n as i64).collect();
+
+    Ok((
+        PyArray1::from_vec(py, equity),
+        PyArray1::from_vec(py, num_runouts),
+    ))
+}
+
+/// Set the number of threads used to run simulations (by default, one per
+/// core).  This must be called before any simulation is run.
+#[pyfunction]
+fn set_num_threads(num_threads: usize) -> Result<(), HoldThemError> {
+    simulate::set_num_threads(num_threads)?;
+    Ok(())
+}
+
 #[pyclass]
 #[derive(Debug)]
 struct HandFeatures {
@@ -174,6 +330,16 @@ struct HandFeatures {
     pub tie_odds_vs_worse: f32,
     #[pyo3(get)]
     pub lose_odds_vs_worse: f32,
+
+    #[pyo3(get)]
+    pub win_std_error: f32,
+    #[pyo3(get)]
+    pub tie_std_error: f32,
+    #[pyo3(get)]
+    pub lose_std_error: f32,
+
+    #[pyo3(get)]
+    pub num_simulations: i64,
 }
 
 #[pyproto]
@@ -205,42 +371,240 @@ impl std::convert::From<&features::Features> for HandFeatures {
             win_odds_vs_worse: res.win_odds_vs_worse,
             tie_odds_vs_worse: res.tie_odds_vs_worse,
             lose_odds_vs_worse: res.lose_odds_vs_worse,
+
+            win_std_error: res.win_std_error,
+            tie_std_error: res.tie_std_error,
+            lose_std_error: res.lose_std_error,
+
+            num_simulations: res.num_simulations,
         }
     }
 }
 
 #[pyfunction]
 fn make_hand_features(
+    py: Python,
     hand: String,
     board: Vec<String>,
     num_to_simulate: i64,
 ) -> Result<HandFeatures, HoldThemError> {
     let hand = HoleCards::new_from_string(&*hand)?;
     let board = Board::new_from_string_vec(&board[..])?;
-    let result = features::make_hand_features(&hand, &board, num_to_simulate)?;
+    let result = py.allow_threads(|| {
+        features::make_hand_features_cached(&hand, &board, Budget::Fixed(num_to_simulate))
+    })?;
     Ok(HandFeatures::from(&result))
 }
 
 #[pyfunction]
 fn make_hand_features_from_indices(
+    py: Python,
     hand: i32,
     board: Vec<i32>,
     num_to_simulate: i64,
 ) -> Result<HandFeatures, HoldThemError> {
     let hand = HoleCards::new_from_index(hand as usize);
     let board = Board::new_from_indices(&board[..])?;
-    let result = features::make_hand_features(&hand, &board, num_to_simulate)?;
+    let result = py.allow_threads(|| {
+        features::make_hand_features_cached(&hand, &board, Budget::Fixed(num_to_simulate))
+    })?;
     Ok(HandFeatures::from(&result))
 }
 
+/// As make_hand_features_from_indices, simulating each range until its odds
+/// converge (see simulate_hand_until_converged)
+#[pyfunction]
+fn make_hand_features_until_converged(
+    py: Python,
+    hand: i32,
+    board: Vec<i32>,
+    max_ci_width: f32,
+    max_to_simulate: i64,
+) -> Result<HandFeatures, HoldThemError> {
+    let hand = HoleCards::new_from_index(hand as usize);
+    let board = Board::new_from_indices(&board[..])?;
+    let budget = Budget::UntilConverged {
+        max_ci_width,
+        max_to_simulate,
+    };
+    let result = py.allow_threads(|| features::make_hand_features_cached(&hand, &board, budget))?;
+    Ok(HandFeatures::from(&result))
+}
+
+/// Compute the features of many spots in parallel, with the GIL released.
+/// Takes an int32 array of N hole card indices and an int32 array of shape
+/// (N, board_size) of board card indices, where missing board cards (such as
+/// the turn and river of a flop) are -1.  Returns a structured array of length
+/// N with a float32 field for each feature of HandFeatures (excluding the
+/// standard errors and number of simulations).  Odds are simulated against
+/// max_to_simulate hands, or, if max_ci_width is given, until they converge
+/// (see make_hand_features_until_converged).
+#[pyfunction]
+fn make_hand_features_batch<'py>(
+    py: Python<'py>,
+    hole_indices: PyReadonlyArray1<i32>,
+    board_indices: PyReadonlyArray2<i32>,
+    max_to_simulate: i64,
+    max_ci_width: Option<f32>,
+) -> PyResult<&'py PyAny> {
+    let hole_slice = hole_indices.as_slice()?;
+    let board_slice = board_indices.as_slice()?;
+    let board_size = board_indices.shape()[1];
+
+    if board_indices.shape()[0] != hole_slice.len() {
+        return Err(HoldThemError::from("Expected one board per hand").into());
+    }
+
+    let spots = hole_slice
+        .iter()
+        .enumerate()
+        .map(|(i, hand)| {
+            if *hand < 0 || *hand as usize >= NUM_HANDS {
+                return Err(format!("Invalid hand index: {}", hand));
+            }
+            let board: Vec<i32> = board_slice[i * board_size..(i + 1) * board_size]
+                .iter()
+                .filter(|card| **card >= 0)
+                .cloned()
+                .collect();
+            Ok((
+                HoleCards::new_from_index(*hand as usize),
+                Board::new_from_indices(&board[..])?,
+            ))
+        })
+        .collect::<Result<Vec<(HoleCards, Option<Board>)>, String>>()
+        .map_err(HoldThemError::from)?;
+
+    let budget = match max_ci_width {
+        Some(max_ci_width) => Budget::UntilConverged {
+            max_ci_width,
+            max_to_simulate,
+        },
+        None => Budget::Fixed(max_to_simulate),
+    };
+
+    let results = py
+        .allow_threads(|| features::make_hand_features_batch(&spots, budget))
+        .map_err(HoldThemError::from)?;
+
+    let mut values = Vec::with_capacity(results.len() * features::NUM_FEATURES);
+    for result in results.iter() {
+        values.extend_from_slice(&result.values());
+    }
+
+    // View each row of feature values as a single record
+    let fields: Vec<(&str, &str)> = features::FEATURE_NAMES
+        .iter()
+        .map(|name| (*name, "f4"))
+        .collect();
+    let dtype = py.import("numpy")?.call_method1("dtype", (fields,))?;
+    PyArray1::from_vec(py, values)
+        .reshape([results.len(), features::NUM_FEATURES])?
+        .call_method1("view", (dtype,))?
+        .call_method1("reshape", (results.len(),))
+}
+
+/// The possible villian hands that beat, tie and lose to a hand on a board, as
+/// three uint16 arrays of hand indices in increasing order.  These can be
+/// passed back as ranges (see simulate_hand_from_indices) without
+/// enumerating the hands again.
+#[pyfunction]
+fn make_nut_result_from_indices<'py>(
+    py: Python<'py>,
+    hand: i32,
+    board: Vec<i32>,
+) -> PyResult<(&'py PyArray1<u16>, &'py PyArray1<u16>, &'py PyArray1<u16>)> {
+    let hand = HoleCards::new_from_index(hand as usize);
+    let board = Board::new_from_indices(&board[..])
+        .map_err(HoldThemError::from)?
+        .ok_or_else(|| HoldThemError::from("Board must not be empty"))?;
+    let nut_result = py
+        .allow_threads(|| make_nut_result(&hand, &board))
+        .map_err(HoldThemError::from)?;
+    Ok((
+        PyArray1::from_vec(py, nut_result.better_hands.indices()),
+        PyArray1::from_vec(py, nut_result.tied_hands.indices()),
+        PyArray1::from_vec(py, nut_result.worse_hands.indices()),
+    ))
+}
+
+/// The number of possible villian hands that beat, tie and lose to a hand on a
+/// board.  Each board's hand ranks are computed once and kept for the most
+/// recently used boards (see set_board_index_cache_size).
+#[pyfunction]
+fn nut_counts_from_indices(
+    py: Python,
+    hand: i32,
+    board: Vec<i32>,
+) -> Result<(usize, usize, usize), HoldThemError> {
+    let hand = HoleCards::new_from_index(hand as usize);
+    let board = Board::new_from_indices(&board[..])?.ok_or("Board must not be empty")?;
+    let counts = py.allow_threads(|| board_index::get(&board).nut_counts(&hand))?;
+    Ok((counts.num_better, counts.num_tied, counts.num_worse))
+}
+
+/// Compute the features of every hand on every flop, with num_to_simulate
+/// hands simulated against each part of the range, and write them to path.
+/// This runs on all cores and takes a long time.
+#[pyfunction]
+fn build_flop_table(py: Python, path: String, num_to_simulate: i64) -> Result<(), HoldThemError> {
+    py.allow_threads(|| FlopTable::build_to_file(Path::new(&path), num_to_simulate))?;
+    Ok(())
+}
+
+/// Memory-map the flop table at path and serve flop features from it.  Turn
+/// and river features are still computed live.
+#[pyfunction]
+fn use_flop_table(path: String) -> Result<(), HoldThemError> {
+    flop_table::use_flop_table(Path::new(&path))?;
+    Ok(())
+}
+
+/// Compute flop features live, instead of from a flop table
+#[pyfunction]
+fn clear_flop_table() {
+    flop_table::clear_flop_table()
+}
+
+/// Set the number of post-flop spots whose hand features are kept (0 disables
+/// the cache).  Features are shared by spots that are the same up to suit
+/// permutations and are simulated with the same budget.
+#[pyfunction]
+fn set_hand_features_cache_size(size: usize) {
+    features::set_cache_size(size)
+}
+
+/// Set the number of boards whose hand ranks are kept (0 disables the cache)
+#[pyfunction]
+fn set_board_index_cache_size(size: usize) {
+    board_index::set_cache_size(size)
+}
+
 /// A Python module implemented in Rust.
 #[pymodule]
 fn pyholdthem(_py: Python, m: &PyModule) -> PyResult<()> {
     m.add_function(wrap_pyfunction!(evaluate_hand, m)?)?;
     m.add_function(wrap_pyfunction!(evaluate_hand_from_indices, m)?)?;
+    m.add_function(wrap_pyfunction!(evaluate_hands_batch, m)?)?;
+    m.add_function(wrap_pyfunction!(build_lookup_table, m)?)?;
+    m.add_function(wrap_pyfunction!(use_lookup_table, m)?)?;
+    m.add_function(wrap_pyfunction!(use_rs_poker_evaluator, m)?)?;
     m.add_function(wrap_pyfunction!(simulate_hand, m)?)?;
+    m.add_function(wrap_pyfunction!(simulate_hand_from_indices, m)?)?;
+    m.add_function(wrap_pyfunction!(simulate_hand_until_converged, m)?)?;
+    m.add_function(wrap_pyfunction!(simulate_hand_equities, m)?)?;
+    m.add_function(wrap_pyfunction!(set_num_threads, m)?)?;
     m.add_function(wrap_pyfunction!(make_hand_features, m)?)?;
     m.add_function(wrap_pyfunction!(make_hand_features_from_indices, m)?)?;
+    m.add_function(wrap_pyfunction!(make_hand_features_until_converged, m)?)?;
+    m.add_function(wrap_pyfunction!(make_hand_features_batch, m)?)?;
+    m.add_function(wrap_pyfunction!(make_nut_result_from_indices, m)?)?;
+    m.add_function(wrap_pyfunction!(nut_counts_from_indices, m)?)?;
+    m.add_function(wrap_pyfunction!(set_board_index_cache_size, m)?)?;
+    m.add_function(wrap_pyfunction!(set_hand_features_cache_size, m)?)?;
+    m.add_function(wrap_pyfunction!(build_flop_table, m)?)?;
+    m.add_function(wrap_pyfunction!(use_flop_table, m)?)?;
+    m.add_function(wrap_pyfunction!(clear_flop_table, m)?)?;
 
     Ok(())
 }
@@ -1,13 +1,17 @@
 extern crate rand;
 
-use self::rand::rngs::ThreadRng;
+use self::rand::rngs::StdRng;
 use self::rand::seq::SliceRandom;
-use rand::thread_rng;
-use rs_poker::core::{Card, Rankable};
+use rand::{thread_rng, Rng, SeedableRng};
+use rayon::prelude::*;
+use rs_poker::core::Card;
+use std::hash::{Hash, Hasher};
+use std::ops::Range;
 
 use crate::cardset::CardSet;
+use crate::evaluator;
 use crate::globals::ALL_CARDS;
-use crate::hand::{Board, Hand, HoleCards};
+use crate::hand::{hole_cards_from_index, Board, Hand, HandIndex, HoleCards};
 use crate::stack_array::StackArray;
 
 #[derive(Debug, Clone)]
@@ -15,9 +19,123 @@ pub struct SimulationResult {
     pub num_wins: i64,
     pub num_losses: i64,
     pub num_ties: i64,
+    /// Whether the counts cover every possible outcome (see enumerate), in
+    /// which case the fractions have no sampling error
+    pub exact: bool,
+    draw_moments: DrawMoments,
+}
+
+/// Sums over the independent draws of a simulation, used to estimate the
+/// standard error of its fractions.  A draw may record several hands (see
+/// SamplingMode::Stratified), so each fraction is a ratio estimate p = X / N
+/// whose variance is estimated from the spread of x - p * n over the draws,
+/// where x is the number of hands with a given outcome in a draw and n is the
+/// number of hands in the draw.
+#[derive(Debug, Clone, Default)]
+struct DrawMoments {
+    num_draws: i64,
+    /// The sum of n^2
+    sum_sizes_squared: f64,
+    /// The sum of x^2, for wins, ties and losses
+    sum_counts_squared: [f64; 3],
+    /// The sum of x * n, for wins, ties and losses
+    sum_counts_by_size: [f64; 3],
+}
+
+impl DrawMoments {
+    fn add(&mut self, counts: &[i64; 3]) {
+        let size: i64 = counts.iter().sum();
+        self.num_draws += 1;
+        self.sum_sizes_squared += (size * size) as f64;
+        for i in 0..3 {
+            self.sum_counts_squared[i] += (counts[i] * counts[i]) as f64;
+            self.sum_counts_by_size[i] += (counts[i] * size) as f64;
+        }
+    }
+
+    fn merge(&self, other: &DrawMoments) -> DrawMoments {
+        let mut merged = self.clone();
+        merged.num_draws += other.num_draws;
+        merged.sum_sizes_squared += other.sum_sizes_squared;
+        for i in 0..3 {
+            merged.sum_counts_squared[i] += other.sum_counts_squared[i];
+            merged.sum_counts_by_size[i] += other.sum_counts_by_size[i];
+        }
+        merged
+    }
+
+    /// The standard error of count / total, for the outcome with the given index
+    fn std_error(&self, outcome: usize, count: i64, total: i64) -> f32 {
+        if self.num_draws < 2 || total == 0 {
+            return f32::NAN;
+        }
+        let frac = count as f64 / total as f64;
+        let sum_squared_residuals = self.sum_counts_squared[outcome]
+            - 2.0 * frac * self.sum_counts_by_size[outcome]
+            + frac * frac * self.sum_sizes_squared;
+        let num_draws = self.num_draws as f64;
+        let variance =
+            sum_squared_residuals * num_draws / ((num_draws - 1.0) * total as f64 * total as f64);
+        variance.max(0.0).sqrt() as f32
+    }
+}
+
+const WIN: usize = 0;
+const TIE: usize = 1;
+const LOSS: usize = 2;
+
+/// The index of the outcome (WIN, TIE or LOSS) for the hero
+fn outcome(hero_rank: u32, villian_rank: u32) -> usize {
+    if villian_rank == hero_rank {
+        TIE
+    } else if hero_rank <= villian_rank {
+        LOSS
+    } else {
+        WIN
+    }
 }
 
 impl SimulationResult {
+    pub fn new() -> SimulationResult {
+        SimulationResult {
+            num_wins: 0,
+            num_losses: 0,
+            num_ties: 0,
+            exact: false,
+            draw_moments: DrawMoments::default(),
+        }
+    }
+
+    /// Record the outcome of a single hand, given the rank values of each player
+    pub fn record(&mut self, hero_rank: u32, villian_rank: u32) {
+        let mut counts = [0; 3];
+        counts[outcome(hero_rank, villian_rank)] = 1;
+        self.add_counts(&counts);
+    }
+
+    /// Record the number of wins, ties and losses in one independent draw
+    fn record_draw(&mut self, counts: &[i64; 3]) {
+        self.add_counts(counts);
+        self.draw_moments.add(counts);
+    }
+
+    fn add_counts(&mut self, counts: &[i64; 3]) {
+        self.num_wins += counts[WIN];
+        self.num_ties += counts[TIE];
+        self.num_losses += counts[LOSS];
+    }
+
+    /// Combine the counts of two results
+    pub fn merge(&self, other: &SimulationResult) -> SimulationResult {
+        SimulationResult {
+            num_wins: self.num_wins + other.num_wins,
+            num_losses: self.num_losses + other.num_losses,
+            num_ties: self.num_ties + other.num_ties,
+            exact: self.exact && other.exact,
+            draw_moments: self.draw_moments.merge(&other.draw_moments),
+        }
+    }
+
     pub fn num_simulations(&self) -> i64 {
         self.num_wins + self.num_ties + self.num_losses
     }
@@ -30,6 +148,39 @@ impl SimulationResult {
     pub fn lose_frac(&self) -> f32 {
         self.num_losses as f32 / self.num_simulations() as f32
     }
+
+    fn std_error(&self, outcome: usize, count: i64) -> f32 {
+        if self.exact {
+            0.0
+        } else {
+            self.draw_moments
+                .std_error(outcome, count, self.num_simulations())
+        }
+    }
+    /// The estimated standard error of win_frac (NaN if it can't be estimated)
+    pub fn win_std_error(&self) -> f32 {
+        self.std_error(WIN, self.num_wins)
+    }
+    pub fn tie_std_error(&self) -> f32 {
+        self.std_error(TIE, self.num_ties)
+    }
+    pub fn lose_std_error(&self) -> f32 {
+        self.std_error(LOSS, self.num_losses)
+    }
+
+    /// The width of the widest 95% confidence interval of the win, tie and
+    /// lose fractions (NaN if it can't be estimated)
+    pub fn ci_width(&self) -> f32 {
+        let std_errors = [
+            self.win_std_error(),
+            self.tie_std_error(),
+            self.lose_std_error(),
+        ];
+        if std_errors.iter().any(|e| e.is_nan()) {
+            return f32::NAN;
+        }
+        2.0 * Z_95 * std_errors.iter().cloned().fold(0.0, f32::max)
+    }
 }
 
 enum DrawnCards {
@@ -79,9 +230,9 @@ impl FastDrawDeck {
         }
     }
 
-    pub fn draw(
+    pub fn draw<R: Rng>(
         &mut self,
-        rng: &mut ThreadRng,
+        rng: &mut R,
         num_to_draw: usize,
         skippable: &[Card],
     ) -> Result<DrawnCards, String> {
@@ -117,66 +268,1140 @@ impl FastDrawDeck {
     }
 }
 
+/// The number of hands sampled from each random number stream.  Samples are
+/// split into chunks of this size which are run in parallel, each with its own
+/// RNG seeded from the simulation's seed and the chunk's index, so the result
+/// for a given seed does not depend on the number of threads.
+const SAMPLES_PER_CHUNK: i64 = 10_000;
+
+/// The number of consecutive samples that are grouped into one draw when
+/// estimating the standard error of a stratified simulation
+const STRATIFIED_DRAW_SIZE: i64 = 16;
+
+/// Mixed into the seed to shuffle the order that stratified samples cycle
+/// through each range in, so the shuffle doesn't reuse a chunk's stream
+const STRATIFIED_ORDER_SEED: u64 = 0x9E37_79B9_7F4A_7C15;
+
+#[derive(Debug, Clone, Copy, PartialEq)]
+pub enum SamplingMode {
+    /// Each sample is a random hand from the range and a random runout
+    Random,
+    /// Samples cycle through the hands in the range (in an order shuffled from
+    /// the seed), each against its own random runout, so every possible range
+    /// hand gets an equal share of the samples.  This removes the variance from
+    /// picking range hands at random, so the odds have a lower standard error
+    /// for the same number of samples.
+    Stratified,
+}
+
+/// Estimate the odds of the hero's hand against a range.  If enumerating every
+/// possible runout against every hand in the range takes no more hand
+/// evaluations than num_to_simulate, the exact odds are returned instead.
 pub fn simulate(
     hero_hole_cards: &HoleCards,
-    range: &Vec<HoleCards>,
+    range: &[HandIndex],
+    board: &Option<Board>,
+    num_to_simulate: i64,
+) -> Result<SimulationResult, String> {
+    simulate_with_mode(
+        hero_hole_cards,
+        range,
+        board,
+        num_to_simulate,
+        SamplingMode::Random,
+    )
+}
+
+/// As simulate, sampling num_to_simulate hands with the given mode
+pub fn simulate_with_mode(
+    hero_hole_cards: &HoleCards,
+    range: &[HandIndex],
+    board: &Option<Board>,
+    num_to_simulate: i64,
+    mode: SamplingMode,
+) -> Result<SimulationResult, String> {
+    simulate_with_seed(
+        hero_hole_cards,
+        range,
+        board,
+        num_to_simulate,
+        mode,
+        thread_rng().gen(),
+    )
+}
+
+/// As simulate_with_mode, but with the random number streams derived from a
+/// seed.  Samples are run in parallel on the rayon thread pool (see
+/// set_num_threads).
+pub fn simulate_with_seed(
+    hero_hole_cards: &HoleCards,
+    range: &[HandIndex],
     board: &Option<Board>,
     num_to_simulate: i64,
+    mode: SamplingMode,
+    seed: u64,
+) -> Result<SimulationResult, String> {
+    let mut results = simulate_ranges_with_seed(
+        hero_hole_cards,
+        &[range],
+        board,
+        Budget::Fixed(num_to_simulate),
+        mode,
+        seed,
+    )?;
+    Ok(results.remove(0))
+}
+
+/// The number of hands sampled from each random number stream when sampling
+/// until the odds converge.  This is smaller than SAMPLES_PER_CHUNK so that
+/// the first batches, which are often enough, still run in parallel.
+const ADAPTIVE_SAMPLES_PER_CHUNK: i64 = 256;
+
+/// The z-score of a two-sided 95% confidence interval
+const Z_95: f32 = 1.96;
+
+/// Estimate the odds of the hero's hand against a range, sampling in batches
+/// until the 95% confidence interval of each of the win, tie and lose fractions
+/// is at most max_ci_width wide, or max_to_simulate hands have been sampled.
+/// Each batch is as big as all the previous ones, starting from
+/// ADAPTIVE_SAMPLES_PER_CHUNK hands.  As with simulate, the exact odds are
+/// returned if enumerating them costs no more than max_to_simulate.
+pub fn simulate_until_converged(
+    hero_hole_cards: &HoleCards,
+    range: &[HandIndex],
+    board: &Option<Board>,
+    max_ci_width: f32,
+    max_to_simulate: i64,
+    mode: SamplingMode,
+) -> Result<SimulationResult, String> {
+    simulate_until_converged_with_seed(
+        hero_hole_cards,
+        range,
+        board,
+        max_ci_width,
+        max_to_simulate,
+        mode,
+        thread_rng().gen(),
+    )
+}
+
+/// As simulate_until_converged, but with the random number streams derived
+/// from a seed
+pub fn simulate_until_converged_with_seed(
+    hero_hole_cards: &HoleCards,
+    range: &[HandIndex],
+    board: &Option<Board>,
+    max_ci_width: f32,
+    max_to_simulate: i64,
+    mode: SamplingMode,
+    seed: u64,
 ) -> Result<SimulationResult, String> {
-    if range.is_empty() {
-        return Err("Must have non-empty range".to_string());
+    let budget = Budget::UntilConverged {
+        max_ci_width,
+        max_to_simulate,
+    };
+    let mut results =
+        simulate_ranges_with_seed(hero_hole_cards, &[range], board, budget, mode, seed)?;
+    Ok(results.remove(0))
+}
+
+/// How many hands a simulation samples
+#[derive(Debug, Clone, Copy)]
+pub enum Budget {
+    /// Sample this many hands (see simulate)
+    Fixed(i64),
+    /// Sample until the odds converge (see simulate_until_converged)
+    UntilConverged {
+        max_ci_width: f32,
+        max_to_simulate: i64,
+    },
+}
+
+impl Budget {
+    /// The most hands that may be sampled
+    fn max_to_simulate(&self) -> i64 {
+        match self {
+            Budget::Fixed(num_to_simulate) => *num_to_simulate,
+            Budget::UntilConverged {
+                max_to_simulate, ..
+            } => *max_to_simulate,
+        }
+    }
+
+    /// The budget's parameters, with max_ci_width as its bits, so budgets can
+    /// be compared and hashed
+    fn key(&self) -> (i64, Option<u32>) {
+        match self {
+            Budget::Fixed(num_to_simulate) => (*num_to_simulate, None),
+            Budget::UntilConverged {
+                max_ci_width,
+                max_to_simulate,
+            } => (*max_to_simulate, Some(max_ci_width.to_bits())),
+        }
+    }
+}
+
+impl PartialEq for Budget {
+    fn eq(&self, other: &Budget) -> bool {
+        self.key() == other.key()
+    }
+}
+
+impl Eq for Budget {}
+
+impl Hash for Budget {
+    fn hash<H: Hasher>(&self, state: &mut H) {
+        self.key().hash(state)
+    }
+}
+
+/// Estimate the odds of the hero's hand against a range within a budget
+pub fn simulate_with_budget(
+    hero_hole_cards: &HoleCards,
+    range: &[HandIndex],
+    board: &Option<Board>,
+    budget: Budget,
+    mode: SamplingMode,
+) -> Result<SimulationResult, String> {
+    let mut results = simulate_ranges(hero_hole_cards, &[range], board, budget, mode)?;
+    Ok(results.remove(0))
+}
+
+/// Estimate the odds of the hero's hand against each of several ranges, each
+/// within the budget.  Every sample draws one runout and ranks the hero's hand
+/// on it once, then compares it to a hand from each range, so simulating
+/// several ranges costs little more than simulating one.  Ranges that are cheap
+/// enough to enumerate get their exact odds.
+pub fn simulate_ranges(
+    hero_hole_cards: &HoleCards,
+    ranges: &[&[HandIndex]],
+    board: &Option<Board>,
+    budget: Budget,
+    mode: SamplingMode,
+) -> Result<Vec<SimulationResult>, String> {
+    simulate_ranges_with_seed(
+        hero_hole_cards,
+        ranges,
+        board,
+        budget,
+        mode,
+        thread_rng().gen(),
+    )
+}
+
+/// As simulate_ranges, but with the random number streams derived from a seed
+pub fn simulate_ranges_with_seed(
+    hero_hole_cards: &HoleCards,
+    ranges: &[&[HandIndex]],
+    board: &Option<Board>,
+    budget: Budget,
+    mode: SamplingMode,
+    seed: u64,
+) -> Result<Vec<SimulationResult>, String> {
+    let mut results: Vec<Option<SimulationResult>> = vec![None; ranges.len()];
+
+    // The hands of each range that is sampled, and its index in ranges
+    let mut sampled_ranges: Vec<(usize, Vec<&HoleCards>)> = vec![];
+
+    for (i, range) in ranges.iter().enumerate() {
+        if range.is_empty() {
+            return Err("Must have non-empty range".to_string());
+        }
+        if enumeration_cost(hero_hole_cards, range, board) <= budget.max_to_simulate() {
+            results[i] = Some(enumerate(hero_hole_cards, range, board)?);
+            continue;
+        }
+        let villians = possible_hands(hero_hole_cards, range, board);
+        if villians.is_empty() {
+            return Err("Range has no hands that are possible with this board".to_string());
+        }
+        sampled_ranges.push((i, villians));
+    }
+
+    if !sampled_ranges.is_empty() {
+        let mut villians: Vec<Vec<&HoleCards>> =
+            sampled_ranges.iter().map(|(_, v)| v.clone()).collect();
+        // Hands that are close in the range share cards, and runouts that are
+        // close share a pass through the deck, so stratified samples cycle
+        // through the hands in a random order to keep them independent
+        if mode == SamplingMode::Stratified {
+            let mut rng = StdRng::seed_from_u64(seed ^ STRATIFIED_ORDER_SEED);
+            for range in villians.iter_mut() {
+                range.shuffle(&mut rng);
+            }
+        }
+
+        let sampled_results = match budget {
+            Budget::Fixed(num_to_simulate) => sample_chunks(
+                hero_hole_cards,
+                &villians,
+                board,
+                0..num_to_simulate,
+                SAMPLES_PER_CHUNK,
+                mode,
+                seed,
+            )?,
+            Budget::UntilConverged {
+                max_ci_width,
+                max_to_simulate,
+            } => {
+                let mut sampled_results = vec![SimulationResult::new(); villians.len()];
+                let mut num_simulated = 0;
+
+                while num_simulated < max_to_simulate {
+                    let batch_end = (2 * num_simulated)
+                        .max(ADAPTIVE_SAMPLES_PER_CHUNK)
+                        .min(max_to_simulate);
+                    let batch_results = sample_chunks(
+                        hero_hole_cards,
+                        &villians,
+                        board,
+                        num_simulated..batch_end,
+                        ADAPTIVE_SAMPLES_PER_CHUNK,
+                        mode,
+                        seed,
+                    )?;
+                    sampled_results = merge_all(&sampled_results, &batch_results);
+                    num_simulated = batch_end;
+
+                    if sampled_results.iter().all(|r| r.ci_width() <= max_ci_width) {
+                        break;
+                    }
+                }
+                sampled_results
+            }
+        };
+
+        for ((i, _), result) in sampled_ranges.iter().zip(sampled_results.into_iter()) {
+            results[*i] = Some(result);
+        }
     }
 
+    Ok(results.into_iter().map(|r| r.unwrap()).collect())
+}
+
+/// Merge each result with the result at the same position
+fn merge_all(a: &[SimulationResult], b: &[SimulationResult]) -> Vec<SimulationResult> {
+    a.iter().zip(b.iter()).map(|(x, y)| x.merge(y)).collect()
+}
+
+/// Run the given samples in parallel, in chunks of chunk_size (the first
+/// sample must be at the start of a chunk) which each have their own random
+/// number stream.
+fn sample_chunks(
+    hero_hole_cards: &HoleCards,
+    villians: &[Vec<&HoleCards>],
+    board: &Option<Board>,
+    samples: Range<i64>,
+    chunk_size: i64,
+    mode: SamplingMode,
+    seed: u64,
+) -> Result<Vec<SimulationResult>, String> {
+    let first_chunk = samples.start / chunk_size;
+    let last_chunk = (samples.end + chunk_size - 1) / chunk_size;
+
+    let chunk_results = (first_chunk..last_chunk)
+        .into_par_iter()
+        .map(|chunk| {
+            let first_sample = chunk * chunk_size;
+            let num_samples = chunk_size.min(samples.end - first_sample);
+            let mut rng = StdRng::seed_from_u64(seed.wrapping_add(chunk as u64));
+            sample(
+                hero_hole_cards,
+                villians,
+                board,
+                first_sample,
+                num_samples,
+                mode,
+                &mut rng,
+            )
+        })
+        .collect::<Result<Vec<Vec<SimulationResult>>, String>>()?;
+
+    Ok(chunk_results.iter().fold(
+        vec![SimulationResult::new(); villians.len()],
+        |total, results| merge_all(&total, results),
+    ))
+}
+
+/// Set the number of threads used by simulate (by default, one per core).
+/// This may only be called before any simulation is run.
+pub fn set_num_threads(num_threads: usize) -> Result<(), String> {
+    rayon::ThreadPoolBuilder::new()
+        .num_threads(num_threads)
+        .build_global()
+        .map_err(|e| e.to_string())
+}
+
+/// Draw num_to_simulate runouts and compare the hero's hand on each to a hand
+/// from each range.  Randomly sampled hands are picked uniformly from the range;
+/// stratified ones cycle through it, picking the hand at first_sample first.  A hand that shares a card with the
+/// runout is compared on a fresh runout drawn without its cards instead, which
+/// keeps each hand's runouts uniformly distributed.
+fn sample<R: Rng>(
+    hero_hole_cards: &HoleCards,
+    villians: &[Vec<&HoleCards>],
+    board: &Option<Board>,
+    first_sample: i64,
+    num_to_simulate: i64,
+    mode: SamplingMode,
+    rng: &mut R,
+) -> Result<Vec<SimulationResult>, String> {
     // First, create the deck
     let mut deck = FastDrawDeck::new(CardSet::from_hole_cards_and_board(hero_hole_cards, board));
 
     // Cards to draw
     let num_cards_to_draw = 5 - board.as_ref().map_or(0, |b| b.len());
 
-    let mut rng = thread_rng();
+    let evaluator = evaluator::current();
 
-    let mut simulation_result = SimulationResult {
-        num_wins: 0,
-        num_losses: 0,
-        num_ties: 0,
+    let rank_hands = |full_board: &Board, villian_hole_cards: &HoleCards| {
+        let hero_rank = evaluator.rank_value(&Hand::from_hole_cards_and_board(
+            hero_hole_cards,
+            full_board,
+        ));
+        let villian_rank = evaluator.rank_value(&Hand::from_hole_cards_and_board(
+            villian_hole_cards,
+            full_board,
+        ));
+        (hero_rank, villian_rank)
     };
 
-    for _ in 0..num_to_simulate {
-        // Randomy pick the opponent's card
-        let villian_hole_cards = range.choose(&mut rng).unwrap();
+    let draw_size = match mode {
+        SamplingMode::Random => 1,
+        SamplingMode::Stratified => STRATIFIED_DRAW_SIZE,
+    };
 
-        let drawn_board = deck.draw(&mut rng, num_cards_to_draw, villian_hole_cards.slice())?;
-        let full_board: Board = drawn_board.combine(board)?;
+    let mut results = vec![SimulationResult::new(); villians.len()];
+    let mut counts = vec![[0; 3]; villians.len()];
 
-        let hero_hand: Hand = Hand::from_hole_cards_and_board(hero_hole_cards, &full_board);
-        let hero_rank = hero_hand.rank();
+    for i in 0..num_to_simulate {
+        let full_board: Board = deck.draw(rng, num_cards_to_draw, &[])?.combine(board)?;
+        let board_cards = CardSet::from_iter(full_board.cards().iter().copied());
 
-        let villian_hand: Hand = Hand::from_hole_cards_and_board(villian_hole_cards, &full_board);
-        let villian_rank = villian_hand.rank();
+        let hero_rank = evaluator.rank_value(&Hand::from_hole_cards_and_board(
+            hero_hole_cards,
+            &full_board,
+        ));
 
-        if villian_rank == hero_rank {
-            simulation_result.num_ties += 1
-        } else if hero_rank <= villian_rank {
-            simulation_result.num_losses += 1
-        } else {
-            simulation_result.num_wins += 1
+        for (range_index, range) in villians.iter().enumerate() {
+            let villian_hole_cards = match mode {
+                SamplingMode::Random => *range.choose(rng).unwrap(),
+                SamplingMode::Stratified => {
+                    range[((first_sample + i) % range.len() as i64) as usize]
+                }
+            };
+
+            let (hero_rank, villian_rank) = if board_cards.intersects(villian_hole_cards) {
+                let villian_board: Board = deck
+                    .draw(rng, num_cards_to_draw, villian_hole_cards.slice())?
+                    .combine(board)?;
+                rank_hands(&villian_board, villian_hole_cards)
+            } else {
+                let villian_rank = evaluator.rank_value(&Hand::from_hole_cards_and_board(
+                    villian_hole_cards,
+                    &full_board,
+                ));
+                (hero_rank, villian_rank)
+            };
+
+            counts[range_index][outcome(hero_rank, villian_rank)] += 1;
+            if (i + 1) % draw_size == 0 || i + 1 == num_to_simulate {
+                results[range_index].record_draw(&counts[range_index]);
+                counts[range_index] = [0; 3];
+            }
+        }
+    }
+    Ok(results)
+}
+
+/// The hands in the range that don't conflict with the hero's cards or the board
+fn possible_hands(
+    hero_hole_cards: &HoleCards,
+    range: &[HandIndex],
+    board: &Option<Board>,
+) -> Vec<&'static HoleCards> {
+    let used_cards = CardSet::from_hole_cards_and_board(hero_hole_cards, board);
+    range
+        .iter()
+        .map(|i| hole_cards_from_index(*i))
+        .filter(|h| !used_cards.intersects(h))
+        .collect()
+}
+
+fn num_combinations(n: i64, k: i64) -> i64 {
+    (0..k).fold(1, |acc, i| acc * (n - i) / (i + 1))
+}
+
+/// The number of (villian hand, runout) pairs that enumerate would evaluate.
+pub fn enumeration_cost(
+    hero_hole_cards: &HoleCards,
+    range: &[HandIndex],
+    board: &Option<Board>,
+) -> i64 {
+    let num_villians = possible_hands(hero_hole_cards, range, board).len() as i64;
+
+    let num_board_cards = board.as_ref().map_or(0, |b| b.len()) as i64;
+    let num_remaining_cards = 52 - 4 - num_board_cards;
+    num_villians * num_combinations(num_remaining_cards, 5 - num_board_cards)
+}
+
+/// Calls f with every combination of k cards from the deck
+fn for_each_combination<F>(deck: &[Card], k: usize, mut f: F)
+where
+    F: FnMut(&[Card]),
+{
+    let n = deck.len();
+    if k > n {
+        return;
+    }
+
+    let mut indices: Vec<usize> = (0..k).collect();
+    let mut combination: Vec<Card> = indices.iter().map(|&i| deck[i]).collect();
+
+    loop {
+        f(&combination);
+
+        // Find the last index that can be advanced, and reset all that follow it
+        let mut i = k;
+        while i > 0 && indices[i - 1] == i - 1 + n - k {
+            i -= 1;
+        }
+        if i == 0 {
+            return;
+        }
+        indices[i - 1] += 1;
+        for j in i..k {
+            indices[j] = indices[j - 1] + 1;
+        }
+        for j in i - 1..k {
+            combination[j] = deck[indices[j]];
         }
     }
+}
+
+/// Calculate the exact odds of the hero's hand against a range by evaluating
+/// every possible runout against every hand in the range (skipping hands that
+/// conflict with the hero's cards, the board or the runout).
+pub fn enumerate(
+    hero_hole_cards: &HoleCards,
+    range: &[HandIndex],
+    board: &Option<Board>,
+) -> Result<SimulationResult, String> {
+    let villians = possible_hands(hero_hole_cards, range, board);
+    if villians.is_empty() {
+        return Err("Range has no hands that are possible with this board".to_string());
+    }
+
+    let used_cards = CardSet::from_hole_cards_and_board(hero_hole_cards, board);
+    let deck: Vec<Card> = ALL_CARDS
+        .iter()
+        .filter(|c| !used_cards.contains(c))
+        .copied()
+        .collect();
+
+    let board_cards: &[Card] = board.as_ref().map_or(&[], |b| b.cards());
+    let mut full_board_cards: [Card; 5] = [ALL_CARDS[0]; 5];
+    full_board_cards[..board_cards.len()].copy_from_slice(board_cards);
+
+    let evaluator = evaluator::current();
+
+    let mut simulation_result = SimulationResult::new();
+
+    for_each_combination(&deck, 5 - board_cards.len(), |runout| {
+        full_board_cards[board_cards.len()..].copy_from_slice(runout);
+        let full_board = Board::River(full_board_cards);
+        let runout_cards = CardSet::from_iter(runout.iter().copied());
+
+        let hero_rank = evaluator.rank_value(&Hand::from_hole_cards_and_board(
+            hero_hole_cards,
+            &full_board,
+        ));
+
+        for villian_hole_cards in villians.iter() {
+            if runout_cards.intersects(villian_hole_cards) {
+                continue;
+            }
+            let villian_rank = evaluator.rank_value(&Hand::from_hole_cards_and_board(
+                villian_hole_cards,
+                &full_board,
+            ));
+            simulation_result.record(hero_rank, villian_rank);
+        }
+    });
+
+    simulation_result.exact = true;
     Ok(simulation_result)
 }
 
+/// The number of possible hole cards
+const NUM_HANDS: usize = 52 * 51 / 2;
+
+/// The outcomes of each villian hand against the hero, indexed by
+/// HoleCards::index
+#[derive(Debug, Clone)]
+pub struct HandEquities {
+    pub num_wins: Vec<u32>,
+    pub num_ties: Vec<u32>,
+    pub num_runouts: Vec<u32>,
+    /// Whether every possible runout was evaluated
+    pub exact: bool,
+}
+
+impl HandEquities {
+    fn new() -> HandEquities {
+        HandEquities {
+            num_wins: vec![0; NUM_HANDS],
+            num_ties: vec![0; NUM_HANDS],
+            num_runouts: vec![0; NUM_HANDS],
+            exact: false,
+        }
+    }
+
+    fn merge(&self, other: &HandEquities) -> HandEquities {
+        let add = |a: &[u32], b: &[u32]| a.iter().zip(b.iter()).map(|(x, y)| x + y).collect();
+        HandEquities {
+            num_wins: add(&self.num_wins, &other.num_wins),
+            num_ties: add(&self.num_ties, &other.num_ties),
+            num_runouts: add(&self.num_runouts, &other.num_runouts),
+            exact: self.exact && other.exact,
+        }
+    }
+
+    /// The hero's equity against the hand with the given index (a tie counts as
+    /// half a win), or NaN if it wasn't evaluated
+    pub fn equity(&self, hand_index: usize) -> f32 {
+        if self.num_runouts[hand_index] == 0 {
+            return f32::NAN;
+        }
+        (self.num_wins[hand_index] as f32 + 0.5 * self.num_ties[hand_index] as f32)
+            / self.num_runouts[hand_index] as f32
+    }
+
+    /// Rank the hero's hand on a runout once, and compare it to every villian
+    /// that doesn't share a card with it
+    fn record_runout(
+        &mut self,
+        evaluator: &evaluator::Evaluator,
+        hero_hole_cards: &HoleCards,
+        villians: &[&HoleCards],
+        full_board: &Board,
+        runout_cards: &CardSet,
+    ) {
+        let hero_rank = evaluator.rank_value(&Hand::from_hole_cards_and_board(
+            hero_hole_cards,
+            full_board,
+        ));
+
+        for villian_hole_cards in villians.iter() {
+            if runout_cards.intersects(villian_hole_cards) {
+                continue;
+            }
+            let villian_rank = evaluator.rank_value(&Hand::from_hole_cards_and_board(
+                villian_hole_cards,
+                full_board,
+            ));
+            let index = villian_hole_cards.index();
+            self.num_runouts[index] += 1;
+            match outcome(hero_rank, villian_rank) {
+                WIN => self.num_wins[index] += 1,
+                TIE => self.num_ties[index] += 1,
+                _ => {}
+            }
+        }
+    }
+}
+
+/// Estimate the hero's equity against every hand in the range.  Each of
+/// num_runouts random runouts is ranked once for the hero and once for every
+/// hand in the range that doesn't share a card with it.  If there are no more
+/// than num_runouts possible runouts, every one is evaluated once instead.
+pub fn simulate_hand_equities(
+    hero_hole_cards: &HoleCards,
+    range: &[HandIndex],
+    board: &Option<Board>,
+    num_runouts: i64,
+) -> Result<HandEquities, String> {
+    let villians = possible_hands(hero_hole_cards, range, board);
+    if villians.is_empty() {
+        return Err("Range has no hands that are possible with this board".to_string());
+    }
+
+    let used_cards = CardSet::from_hole_cards_and_board(hero_hole_cards, board);
+    let num_board_cards = board.as_ref().map_or(0, |b| b.len());
+    let num_cards_to_draw = 5 - num_board_cards;
+
+    let evaluator = evaluator::current();
+
+    if num_combinations(50 - num_board_cards as i64, num_cards_to_draw as i64) <= num_runouts {
+        let deck: Vec<Card> = ALL_CARDS
+            .iter()
+            .filter(|c| !used_cards.contains(c))
+            .copied()
+            .collect();
+
+        let board_cards: &[Card] = board.as_ref().map_or(&[], |b| b.cards());
+        let mut full_board_cards: [Card; 5] = [ALL_CARDS[0]; 5];
+        full_board_cards[..board_cards.len()].copy_from_slice(board_cards);
+
+        let mut equities = HandEquities::new();
+        for_each_combination(&deck, num_cards_to_draw, |runout| {
+            full_board_cards[board_cards.len()..].copy_from_slice(runout);
+            equities.record_runout(
+                &evaluator,
+                hero_hole_cards,
+                &villians,
+                &Board::River(full_board_cards),
+                &CardSet::from_iter(runout.iter().copied()),
+            );
+        });
+        equities.exact = true;
+        return Ok(equities);
+    }
+
+    // Split the runouts into chunks of about SAMPLES_PER_CHUNK hand evaluations
+    let runouts_per_chunk = (SAMPLES_PER_CHUNK / villians.len() as i64).max(1);
+    let num_chunks = (num_runouts + runouts_per_chunk - 1) / runouts_per_chunk;
+    let seed: u64 = thread_rng().gen();
+
+    let chunk_equities: Vec<HandEquities> = (0..num_chunks)
+        .into_par_iter()
+        .map(|chunk| {
+            let num_chunk_runouts = runouts_per_chunk.min(num_runouts - chunk * runouts_per_chunk);
+            let mut rng = StdRng::seed_from_u64(seed.wrapping_add(chunk as u64));
+            let mut deck =
+                FastDrawDeck::new(CardSet::from_hole_cards_and_board(hero_hole_cards, board));
+
+            let mut equities = HandEquities::new();
+            for _ in 0..num_chunk_runouts {
+                let full_board: Board = deck
+                    .draw(&mut rng, num_cards_to_draw, &[])?
+                    .combine(board)?;
+                let runout_cards = CardSet::from_iter(full_board.cards().iter().copied());
+                equities.record_runout(
+                    &evaluator,
+                    hero_hole_cards,
+                    &villians,
+                    &full_board,
+                    &runout_cards,
+                );
+            }
+            Ok(equities)
+        })
+        .collect::<Result<Vec<HandEquities>, String>>()?;
+
+    Ok(chunk_equities
+        .iter()
+        .fold(HandEquities::new(), |total, equities| total.merge(equities)))
+}
+
 #[cfg(test)]
 mod test {
     use super::*;
+    use crate::globals::ALL_HANDS;
 
     #[test]
     fn test_simulate_pocket_pair() {
         let hole_cards = HoleCards::new_from_string("KdKh").unwrap();
         let range = vec![
-            HoleCards::new_from_string("AdAh").unwrap(),
-            HoleCards::new_from_string("2c2s").unwrap(),
+            HoleCards::new_from_string("AdAh").unwrap().hand_index(),
+            HoleCards::new_from_string("2c2s").unwrap().hand_index(),
         ];
         let result = simulate(&hole_cards, &range, &None, 1).unwrap();
         println!("{:?}", result);
     }
+
+    #[test]
+    fn test_simulate_with_seed() {
+        let hole_cards = HoleCards::new_from_string("KdKh").unwrap();
+        let range = vec![
+            HoleCards::new_from_string("AdAh").unwrap().hand_index(),
+            HoleCards::new_from_string("2c2s").unwrap().hand_index(),
+        ];
+        let num_to_simulate = 3 * SAMPLES_PER_CHUNK + 7;
+
+        let result = simulate_with_seed(
+            &hole_cards,
+            &range,
+            &None,
+            num_to_simulate,
+            SamplingMode::Random,
+            17,
+        )
+        .unwrap();
+        assert_eq!(result.num_simulations(), num_to_simulate);
+
+        // The same seed gives the same result
+        let again = simulate_with_seed(
+            &hole_cards,
+            &range,
+            &None,
+            num_to_simulate,
+            SamplingMode::Random,
+            17,
+        )
+        .unwrap();
+        assert_eq!(result.num_wins, again.num_wins);
+        assert_eq!(result.num_ties, again.num_ties);
+
+        // KK wins about half the time against this range
+        assert!((result.win_frac() - 0.5).abs() < 0.05);
+    }
+
+    #[test]
+    fn test_simulate_stratified() {
+        let hole_cards = HoleCards::new_from_string("KdKh").unwrap();
+        let range = vec![
+            HoleCards::new_from_string("AdAh").unwrap().hand_index(),
+            HoleCards::new_from_string("2c2s").unwrap().hand_index(),
+            HoleCards::new_from_string("7c2d").unwrap().hand_index(),
+        ];
+        let board = Board::new_from_string("Ts5h3c").unwrap();
+        let exact = enumerate(&hole_cards, &range, &board).unwrap();
+        assert!(exact.exact);
+        assert_eq!(exact.win_std_error(), 0.0);
+
+        let num_to_simulate = 2000;
+        let random = simulate_with_seed(
+            &hole_cards,
+            &range,
+            &board,
+            num_to_simulate,
+            SamplingMode::Random,
+            5,
+        )
+        .unwrap();
+        let stratified = simulate_with_seed(
+            &hole_cards,
+            &range,
+            &board,
+            num_to_simulate,
+            SamplingMode::Stratified,
+            5,
+        )
+        .unwrap();
+        assert_eq!(stratified.num_simulations(), num_to_simulate);
+        assert!(!stratified.exact);
+
+        // Both estimates are consistent with the exact odds, but the stratified
+        // one has a lower standard error
+        for result in [&random, &stratified].iter() {
+            let error = result.win_std_error();
+            assert!(error > 0.0);
+            assert!((result.win_frac() - exact.win_frac()).abs() < 4.0 * error);
+        }
+        assert!(stratified.win_std_error() < random.win_std_error());
+    }
+
+    #[test]
+    fn test_stratified_large_range() {
+        let hole_cards = HoleCards::new_from_string("KdKh").unwrap();
+        let range: Vec<HandIndex> = ALL_HANDS.iter().map(|h| h.hand_index()).collect();
+        let board = Board::new_from_string("Ts5h3c").unwrap();
+        let exact = enumerate(&hole_cards, &range, &board).unwrap();
+
+        // Hands next to each other in the range share cards, which mustn't bias
+        // the odds
+        let result = simulate_with_seed(
+            &hole_cards,
+            &range,
+            &board,
+            200_000,
+            SamplingMode::Stratified,
+            3,
+        )
+        .unwrap();
+        assert!((result.win_frac() - exact.win_frac()).abs() < 4.0 * result.win_std_error());
+
+        // The standard error matches the spread of the odds over seeds, and
+        // halves with four times as many samples
+        let spread = |num_to_simulate: i64| {
+            let results: Vec<SimulationResult> = (0..40)
+                .map(|seed| {
+                    simulate_with_seed(
+                        &hole_cards,
+                        &range,
+                        &board,
+                        num_to_simulate,
+                        SamplingMode::Stratified,
+                        seed,
+                    )
+                    .unwrap()
+                })
+                .collect();
+            let n = results.len() as f32;
+            let mean = results.iter().map(|r| r.win_frac()).sum::<f32>() / n;
+            let std_dev = (results
+                .iter()
+                .map(|r| (r.win_frac() - mean).powi(2))
+                .sum::<f32>()
+                / (n - 1.0))
+                .sqrt();
+            let std_error = results.iter().map(|r| r.win_std_error()).sum::<f32>() / n;
+            (std_dev, std_error)
+        };
+        let (std_dev, std_error) = spread(1024);
+        let (more_std_dev, more_std_error) = spread(4096);
+        for (d, e) in [(std_dev, std_error), (more_std_dev, more_std_error)].iter() {
+            assert!(*e > 0.6 * d && *e < 1.6 * d);
+        }
+        assert!((std_error / more_std_error - 2.0).abs() < 0.2);
+        assert!(std_dev / more_std_dev > 1.4 && std_dev / more_std_dev < 2.8);
+    }
+
+    #[test]
+    fn test_simulate_ranges_matches_separate_simulations() {
+        let hole_cards = HoleCards::new_from_string("AsQd").unwrap();
+        let board = Board::new_from_string("Qc9c4h").unwrap();
+        let hands: Vec<HandIndex> = ALL_HANDS.iter().map(|h| h.hand_index()).collect();
+        let ranges: Vec<&[HandIndex]> = hands.chunks(hands.len() / 3 + 1).collect();
+        assert_eq!(ranges.len(), 3);
+
+        // The odds from sharing runouts between the ranges agree with the odds
+        // from simulating each range on its own
+        let budget = Budget::Fixed(20_000);
+        let shared = simulate_ranges_with_seed(
+            &hole_cards,
+            &ranges,
+            &board,
+            budget,
+            SamplingMode::Stratified,
+            13,
+        )
+        .unwrap();
+        for (range, result) in ranges.iter().zip(shared.iter()) {
+            let separate = simulate_with_seed(
+                &hole_cards,
+                range,
+                &board,
+                20_000,
+                SamplingMode::Stratified,
+                17,
+            )
+            .unwrap();
+            for (frac, separate_frac, error, separate_error) in [
+                (
+                    result.win_frac(),
+                    separate.win_frac(),
+                    result.win_std_error(),
+                    separate.win_std_error(),
+                ),
+                (
+                    result.tie_frac(),
+                    separate.tie_frac(),
+                    result.tie_std_error(),
+                    separate.tie_std_error(),
+                ),
+                (
+                    result.lose_frac(),
+                    separate.lose_frac(),
+                    result.lose_std_error(),
+                    separate.lose_std_error(),
+                ),
+            ]
+            .iter()
+            {
+                let combined_error = (error.powi(2) + separate_error.powi(2)).sqrt();
+                assert!((frac - separate_frac).abs() < 4.0 * combined_error);
+            }
+        }
+    }
+
+    #[test]
+    fn test_simulate_ranges() {
+        let hole_cards = HoleCards::new_from_string("JhTh").unwrap();
+        let board = Board::new_from_string("9h8c2h").unwrap();
+        let better = vec![
+            HoleCards::new_from_string("QdJd").unwrap().hand_index(),
+            HoleCards::new_from_string("9s9d").unwrap().hand_index(),
+        ];
+        let worse = vec![
+            HoleCards::new_from_string("AcKc").unwrap().hand_index(),
+            HoleCards::new_from_string("7c6s").unwrap().hand_index(),
+            HoleCards::new_from_string("4d3d").unwrap().hand_index(),
+        ];
+
+        let results = simulate_ranges_with_seed(
+            &hole_cards,
+            &[&better[..], &worse[..]],
+            &board,
+            Budget::Fixed(1500),
+            SamplingMode::Stratified,
+            11,
+        )
+        .unwrap();
+        assert_eq!(results.len(), 2);
+
+        // Sharing runouts between the ranges doesn't bias either estimate
+        for (range, result) in [&better, &worse].iter().zip(results.iter()) {
+            let exact = enumerate(&hole_cards, range, &board).unwrap();
+            assert_eq!(result.num_simulations(), 1500);
+            for (frac, exact_frac, error) in [
+                (result.win_frac(), exact.win_frac(), result.win_std_error()),
+                (
+                    result.lose_frac(),
+                    exact.lose_frac(),
+                    result.lose_std_error(),
+                ),
+            ]
+            .iter()
+            {
+                assert!((frac - exact_frac).abs() < 4.0 * error);
+            }
+        }
+
+        // A range that is cheap enough to enumerate is exact
+        let results = simulate_ranges_with_seed(
+            &hole_cards,
+            &[
+                &better[..],
+                &[HoleCards::new_from_string("AcKc").unwrap().hand_index()],
+            ],
+            &board,
+            Budget::Fixed(1500),
+            SamplingMode::Stratified,
+            11,
+        )
+        .unwrap();
+        assert!(!results[0].exact);
+        assert!(results[1].exact);
+    }
+
+    #[test]
+    fn test_simulate_hand_equities() {
+        let hole_cards = HoleCards::new_from_string("AdAh").unwrap();
+        let range = vec![
+            HoleCards::new_from_string("KsKc").unwrap().hand_index(),
+            HoleCards::new_from_string("7c2d").unwrap().hand_index(),
+            // Conflicts with the hero, so is skipped
+            HoleCards::new_from_string("AsAd").unwrap().hand_index(),
+        ];
+
+        // On the turn, every river is evaluated
+        let board = Board::new_from_string("Kd8h3s4c").unwrap();
+        let equities = simulate_hand_equities(&hole_cards, &range, &board, 1000).unwrap();
+        assert!(equities.exact);
+        let kings = range[0] as usize;
+        assert_eq!(equities.num_runouts[kings], 44);
+        // Aces only win if one of the last two aces comes
+        assert_eq!(equities.num_wins[kings], 2);
+        assert!(equities.equity(range[2] as usize).is_nan());
+
+        // On the flop, there are more possible runouts (1081), so they're sampled
+        let board = Board::new_from_string("Kd8h3s").unwrap();
+        let equities = simulate_hand_equities(&hole_cards, &range, &board, 1000).unwrap();
+        assert!(!equities.exact);
+        for hand in range[..2].iter() {
+            let exact = enumerate(&hole_cards, &[*hand], &board).unwrap();
+            let exact_equity = exact.win_frac() + 0.5 * exact.tie_frac();
+            assert!((equities.equity(*hand as usize) - exact_equity).abs() < 0.06);
+            assert!(equities.num_runouts[*hand as usize] > 900);
+        }
+    }
+
+    #[test]
+    fn test_simulate_until_converged() {
+        let hole_cards = HoleCards::new_from_string("AdAh").unwrap();
+        let range = vec![
+            HoleCards::new_from_string("7c2d").unwrap().hand_index(),
+            HoleCards::new_from_string("8c3d").unwrap().hand_index(),
+        ];
+        let board = Board::new_from_string("AsKh4c").unwrap();
+
+        // An easy spot converges quickly
+        let result = simulate_until_converged_with_seed(
+            &hole_cards,
+            &range,
+            &board,
+            0.05,
+            1_000_000,
+            SamplingMode::Stratified,
+            3,
+        )
+        .unwrap();
+        assert!(result.num_simulations() < 1_000_000);
+        assert!(result.ci_width() <= 0.05);
+
+        // An unreachable width stops at the budget
+        let result = simulate_until_converged_with_seed(
+            &hole_cards,
+            &range,
+            &board,
+            0.0001,
+            1500,
+            SamplingMode::Stratified,
+            3,
+        )
+        .unwrap();
+        assert_eq!(result.num_simulations(), 1500);
+        assert!(result.ci_width() > 0.0001);
+    }
+
+    #[test]
+    fn test_enumerate_river() {
+        let hole_cards = HoleCards::new_from_string("KdKh").unwrap();
+        let range = vec![
+            HoleCards::new_from_string("AdAh").unwrap().hand_index(),
+            HoleCards::new_from_string("2c2s").unwrap().hand_index(),
+            // Conflicts with the board, so is skipped
+            HoleCards::new_from_string("3s3c").unwrap().hand_index(),
+        ];
+        let board = Board::new_from_string("3s4s9cTdJh").unwrap();
+
+        assert_eq!(enumeration_cost(&hole_cards, &range, &board), 2);
+
+        let result = simulate(&hole_cards, &range, &board, 1000).unwrap();
+        assert_eq!(result.num_wins, 1);
+        assert_eq!(result.num_losses, 1);
+        assert_eq!(result.num_ties, 0);
+    }
+
+    #[test]
+    fn test_enumerate_turn() {
+        let hole_cards = HoleCards::new_from_string("AdAh").unwrap();
+        let range = vec![HoleCards::new_from_string("KcKs").unwrap().hand_index()];
+        let board = Board::new_from_string("2c7d9hKd").unwrap();
+
+        assert_eq!(enumeration_cost(&hole_cards, &range, &board), 44);
+
+        // The hero only wins if one of the last two aces comes
+        let result = enumerate(&hole_cards, &range, &board).unwrap();
+        assert_eq!(result.num_wins, 2);
+        assert_eq!(result.num_losses, 42);
+        assert_eq!(result.num_ties, 0);
+    }
+
+    #[test]
+    fn test_enumerate_flop() {
+        let hole_cards = HoleCards::new_from_string("AdAh").unwrap();
+        let range = vec![HoleCards::new_from_string("KcKs").unwrap().hand_index()];
+        let board = Board::new_from_string("2c7d9h").unwrap();
+
+        let num_runouts = num_combinations(45, 2);
+        assert_eq!(enumeration_cost(&hole_cards, &range, &board), num_runouts);
+
+        let result = enumerate(&hole_cards, &range, &board).unwrap();
+        assert_eq!(result.num_simulations(), num_runouts);
+
+        // Sampling with more than the enumeration cost gives the exact result
+        let simulated = simulate(&hole_cards, &range, &board, num_runouts).unwrap();
+        assert_eq!(simulated.num_wins, result.num_wins);
+        assert_eq!(simulated.num_ties, result.num_ties);
+    }
+
+    #[test]
+    fn test_for_each_combination() {
+        let deck: Vec<Card> = ALL_CARDS[..6].to_vec();
+        let mut count = 0;
+        for_each_combination(&deck, 3, |combination| {
+            assert_eq!(combination.len(), 3);
+            assert!(combination[0] < combination[1] && combination[1] < combination[2]);
+            count += 1;
+        });
+        assert_eq!(count, 20);
+
+        count = 0;
+        for_each_combination(&deck, 0, |_| count += 1);
+        assert_eq!(count, 1);
+    }
 }
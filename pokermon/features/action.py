@@ -38,14 +38,23 @@ def encode_action(action: Action, game: GameView) -> int:
     # 5 = Raise Min + 3*delta
     # 6 = Raise Min + 4*delta
     # 7 = Raise Min + 5*delta = ALL IN
+    return encode_action_amount(
+        action,
+        min_raise=game.amount_to_add_for_min_raise(),
+        remaining_stack=game.current_stack_sizes()[game.current_player()],
+    )
+
+
+def encode_action_amount(action: Action, min_raise: int, remaining_stack: int) -> int:
+    """
+    As encode_action, given the amount the current player must add to min raise and
+    their remaining stack
+    """
     if action.move == Move.FOLD:
         return 0
     elif action.move == Move.CHECK_CALL:
         return 1
     else:
-        min_raise = game.amount_to_add_for_min_raise()
-        remaining_stack = game.current_stack_sizes()[game.current_player()]
-
         if action.amount_added == remaining_stack:
             return 22
         elif action.amount_added < min_raise or action.amount_added > remaining_stack:
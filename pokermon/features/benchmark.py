@@ -0,0 +1,135 @@
+"""
+Measure the time taken to featurize a hand, by building its per-timestep features
+with a pass over the hand for each kind of feature, and with make_timesteps, and
+by building the examples of each player separately, and together with
+make_forward_backward_examples.
+
+python -m pokermon.features.benchmark --num_hands 1000
+"""
+
+import argparse
+import copy
+import random
+import time
+from typing import Callable, List, Tuple
+
+import pyholdthem
+from pokermon.ai.policy import Policy
+from pokermon.ai.random_policy import RandomPolicy
+from pokermon.features.action import make_last_actions, make_next_actions
+from pokermon.features.examples import (
+    make_forward_backward_example,
+    make_forward_backward_examples,
+)
+from pokermon.features.player_state import make_player_states
+from pokermon.features.public_state import make_public_states
+from pokermon.features.rewards import make_rewards
+from pokermon.features.timesteps import make_timesteps
+from pokermon.poker import dealer
+from pokermon.poker.deal import FullDeal
+from pokermon.poker.game import Game, GameView
+from pokermon.poker.result import Result
+from pokermon.simulate.simulate import simulate
+
+Hand = Tuple[GameView, FullDeal, Result]
+
+
+def replay(hands: List[Hand]) -> List[Hand]:
+    """Copies of the hands, whose games have nothing memoized"""
+    return [
+        (
+            Game(
+                starting_stacks=game.starting_stacks(), events=list(game.events())
+            ).view(),
+            deal,
+            result,
+        )
+        for game, deal, result in hands
+    ]
+
+
+def featurize_per_feature(hand: Hand) -> None:
+    game, deal, result = hand
+    for player_index, hole_cards in enumerate(deal.hole_cards):
+        make_public_states(game, deal.board)
+        make_player_states(player_index, game, hole_cards, deal.board)
+        make_last_actions(game)
+        make_next_actions(game)
+        make_rewards(game, copy.deepcopy(result))
+
+
+def featurize_single_pass(hand: Hand) -> None:
+    game, deal, result = hand
+    for player_index, hole_cards in enumerate(deal.hole_cards):
+        make_timesteps(
+            player_index, game, hole_cards, deal.board, copy.deepcopy(result)
+        )
+
+
+def make_examples_per_player(hand: Hand) -> None:
+    game, deal, result = hand
+    result = copy.deepcopy(result)
+    for player_index, hole_cards in enumerate(deal.hole_cards):
+        make_forward_backward_example(
+            player_index, game, hole_cards, deal.board, result
+        ).SerializeToString()
+
+
+def make_examples_together(hand: Hand) -> None:
+    game, deal, result = hand
+    for example in make_forward_backward_examples(
+        game, deal.hole_cards, deal.board, copy.deepcopy(result)
+    ):
+        example.SerializeToString()
+
+
+def time_per_hand(featurize: Callable[[Hand], None], hands: List[Hand]) -> float:
+    """The mean time, in milliseconds, taken to featurize each hand"""
+    start = time.perf_counter()
+    for hand in hands:
+        featurize(hand)
+    return 1000 * (time.perf_counter() - start) / len(hands)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the featurization of hands.")
+
+    parser.add_argument(
+        "--num_hands",
+        help="Number of random hands to featurize",
+        type=int,
+        default=1000,
+    )
+
+    parser.add_argument(
+        "--num_players",
+        help="Number of players in each hand",
+        type=int,
+        default=2,
+    )
+
+    args = parser.parse_args()
+
+    hands: List[Hand] = []
+    for _ in range(args.num_hands):
+        players: List[Policy] = [RandomPolicy() for _ in range(args.num_players)]
+        starting_stacks = [random.randint(10, 300) for _ in players]
+        deal = dealer.deal_cards(args.num_players)
+        game, result = simulate(players, starting_stacks, deal)
+        hands.append((game.view(), deal, result))
+
+    # Views are memoized per game, so each method featurizes its own replay of the
+    # hands, and hand features aren't reused between methods
+    pyholdthem.set_hand_features_cache_size(0)
+
+    for name, featurize in [
+        ("per feature", featurize_per_feature),
+        ("single pass", featurize_single_pass),
+        ("examples per player", make_examples_per_player),
+        ("examples together", make_examples_together),
+    ]:
+        print(f"{name}: {time_per_hand(featurize, replay(hands)):.3f}ms per hand")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,619 @@
+"""
+A columnar format for shards of examples, as an alternative to TFRecord files of
+serialized SequenceExamples.
+
+Each feature of a shard is stored as a column: a flat buffer of all of its values,
+and buffers of offsets which say where the values of each example (and, for
+sequence features, of each step of each example) begin and end.  The buffers are
+laid out, aligned, one after another in a single file, which is memory mapped when
+read, so reading an example's features gives NumPy views into the file instead of
+parsing protos.
+
+A shard file is made up of:
+- The magic bytes, and the length of the header (a little endian u64)
+- The header, a JSON description of each column and its buffers
+- The buffers, each aligned to ALIGNMENT bytes
+
+Every example written to a shard must have the same schema: the same context and
+sequence features, with the same types.
+"""
+
+import json
+import mmap
+import random
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np  # type: ignore
+import tensorflow as tf  # type: ignore
+
+MAGIC = b"PKMNCOL1"
+ALIGNMENT = 64
+
+CONTEXT = "context"
+SEQUENCE = "sequence"
+
+# The numpy dtype of the values of each kind of feature.  Bytes are stored as their
+# concatenated bytes, with an extra level of offsets for where each value begins
+_KIND_DTYPES = {
+    "int64_list": "<i8",
+    "float_list": "<f4",
+    "bytes_list": "u1",
+}
+
+_OFFSETS_DTYPE = "<i8"
+
+ParseSpec = Union[tf.io.FixedLenFeature, tf.io.VarLenFeature]
+
+
+@dataclass
+class _ColumnBuilder:
+    kind: str
+    feature_kind: str
+
+    # The values of every example, and the levels of offsets into them: examples
+    # to values (context) or examples to steps to values (sequence), then values to
+    # bytes (bytes features only)
+    values: List[Any]
+    offsets: List[List[int]]
+
+    def add_feature(self, feature: tf.train.Feature) -> None:
+        feature_kind = feature.WhichOneof("kind")
+        if feature_kind != self.feature_kind:
+            raise ValueError(f"Expected a {self.feature_kind}, got a {feature_kind}")
+
+        values = getattr(feature, feature_kind).value
+        value_offsets = self.offsets[-1]
+
+        if feature_kind == "bytes_list":
+            for value in values:
+                self.values.extend(value)
+                value_offsets.append(len(self.values))
+            self.offsets[-2].append(len(value_offsets) - 1)
+        else:
+            self.values.extend(values)
+            value_offsets.append(len(self.values))
+
+
+def _new_column(kind: str, feature_kind: str) -> _ColumnBuilder:
+    if feature_kind not in _KIND_DTYPES:
+        raise ValueError(f"Unexpected feature kind {feature_kind}")
+
+    if kind == SEQUENCE and feature_kind == "bytes_list":
+        raise ValueError("Sequence features of bytes aren't supported")
+
+    num_levels = (1 if kind == CONTEXT else 2) + (feature_kind == "bytes_list")
+    return _ColumnBuilder(
+        kind=kind,
+        feature_kind=feature_kind,
+        values=[],
+        offsets=[[0] for _ in range(num_levels)],
+    )
+
+
+class ColumnarShardWriter:
+    """
+    Writes SequenceExamples to a columnar shard.  Like a tf.io.TFRecordWriter, it
+    can be used as a context manager, and the shard is written once it is closed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._num_examples = 0
+        self._columns: Dict[Tuple[str, str], _ColumnBuilder] = {}
+
+    def __enter__(self) -> "ColumnarShardWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(self, example: tf.train.SequenceExample) -> None:
+        context = example.context.feature
+        feature_lists = example.feature_lists.feature_list
+
+        if self._num_examples == 0:
+            columns: Dict[Tuple[str, str], _ColumnBuilder] = {}
+            for name, feature in context.items():
+                columns[(CONTEXT, name)] = _new_column(
+                    CONTEXT, feature.WhichOneof("kind")
+                )
+            for name, feature_list in feature_lists.items():
+                if not feature_list.feature:
+                    raise ValueError(f"Can't infer the type of empty feature {name}")
+                columns[(SEQUENCE, name)] = _new_column(
+                    SEQUENCE, feature_list.feature[0].WhichOneof("kind")
+                )
+            self._columns = columns
+
+        names = {(CONTEXT, name) for name in context} | {
+            (SEQUENCE, name) for name in feature_lists
+        }
+        if names != self._columns.keys():
+            raise ValueError("Every example in a shard must have the same features")
+
+        # Check every feature before adding any, so that a bad example doesn't
+        # leave the columns with different numbers of examples
+        for (kind, name), column in self._columns.items():
+            if kind == CONTEXT:
+                features = [context[name]]
+            else:
+                features = list(feature_lists[name].feature)
+            for feature in features:
+                feature_kind = feature.WhichOneof("kind")
+                if feature_kind != column.feature_kind:
+                    raise ValueError(
+                        f"Expected {name} to be a {column.feature_kind}, "
+                        f"got a {feature_kind}"
+                    )
+
+        for (kind, name), column in self._columns.items():
+            if kind == CONTEXT:
+                column.add_feature(context[name])
+            else:
+                for feature in feature_lists[name].feature:
+                    column.add_feature(feature)
+                column.offsets[0].append(len(column.offsets[1]) - 1)
+
+        self._num_examples += 1
+
+    def close(self) -> None:
+        columns = []
+        buffers: List[np.ndarray] = []
+
+        def add_buffer(buffer: np.ndarray) -> int:
+            buffers.append(buffer)
+            return len(buffers) - 1
+
+        for (kind, name), column in sorted(self._columns.items()):
+            columns.append(
+                {
+                    "name": name,
+                    "kind": kind,
+                    "feature_kind": column.feature_kind,
+                    "values": add_buffer(
+                        np.asarray(
+                            column.values, dtype=_KIND_DTYPES[column.feature_kind]
+                        )
+                    ),
+                    "offsets": [
+                        add_buffer(np.asarray(offsets, dtype=_OFFSETS_DTYPE))
+                        for offsets in column.offsets
+                    ],
+                }
+            )
+
+        # The buffers are placed after the header, which holds their positions, so
+        # the positions are relative to the end of the (padded) header
+        positions = []
+        position = 0
+        for buffer in buffers:
+            positions.append([position, len(buffer)])
+            position = _align(position + buffer.nbytes)
+
+        header = json.dumps(
+            {
+                "num_examples": self._num_examples,
+                "columns": columns,
+                "buffers": positions,
+            }
+        ).encode("utf-8")
+
+        data_start = _align(len(MAGIC) + 8 + len(header))
+
+        with open(self.path, "wb") as f:
+            f.write(MAGIC)
+            f.write(np.uint64(len(header)).astype("<u8").tobytes())
+            f.write(header)
+            for buffer, (buffer_position, _) in zip(buffers, positions):
+                f.write(b"\0" * (data_start + buffer_position - f.tell()))
+                f.write(buffer.tobytes())
+
+
+def _align(position: int) -> int:
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+@dataclass(frozen=True)
+class _Column:
+    kind: str
+    feature_kind: str
+    values: np.ndarray
+    offsets: List[np.ndarray]
+
+
+class ColumnarShard:
+    """
+    A memory mapped columnar shard.  The features of each example are read as
+    read-only NumPy views into the shard, which keep the file mapped while they
+    are alive.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} isn't a columnar shard")
+
+        header_length = int(
+            np.frombuffer(self._mmap, dtype="<u8", count=1, offset=len(MAGIC))[0]
+        )
+        header_start = len(MAGIC) + 8
+        header = json.loads(self._mmap[header_start : header_start + header_length])
+        data_start = _align(header_start + header_length)
+
+        self.num_examples: int = header["num_examples"]
+
+        def buffer(buffer_index: int, dtype: str) -> np.ndarray:
+            position, length = header["buffers"][buffer_index]
+            return np.frombuffer(
+                self._mmap, dtype=dtype, count=length, offset=data_start + position
+            )
+
+        self._columns: Dict[Tuple[str, str], _Column] = {
+            (column["kind"], column["name"]): _Column(
+                kind=column["kind"],
+                feature_kind=column["feature_kind"],
+                values=buffer(column["values"], _KIND_DTYPES[column["feature_kind"]]),
+                offsets=[buffer(i, _OFFSETS_DTYPE) for i in column["offsets"]],
+            )
+            for column in header["columns"]
+        }
+
+    def __enter__(self) -> "ColumnarShard":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.num_examples
+
+    def close(self) -> None:
+        self._columns = {}
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Views into the shard are still alive, so the mapping is left to be
+            # closed once they're garbage collected
+            pass
+
+    def context_feature_names(self) -> List[str]:
+        return [name for kind, name in self._columns if kind == CONTEXT]
+
+    def sequence_feature_names(self) -> List[str]:
+        return [name for kind, name in self._columns if kind == SEQUENCE]
+
+    def context(self, name: str, index: int) -> Union[np.ndarray, List[bytes]]:
+        """
+        The values of a context feature of an example, as a view into the shard
+        (or, for bytes features, a list of the values)
+        """
+        column = self._column(CONTEXT, name)
+        start, end = column.offsets[0][index : index + 2]
+
+        if column.feature_kind == "bytes_list":
+            byte_offsets = column.offsets[1][start : end + 1]
+            return [
+                column.values[a:b].tobytes()
+                for a, b in zip(byte_offsets[:-1], byte_offsets[1:])
+            ]
+
+        return column.values[start:end]
+
+    def sequence(self, name: str, index: int) -> Union[np.ndarray, List[np.ndarray]]:
+        """
+        The values of a sequence feature of an example, as a view into the shard of
+        shape [num_steps, num_values_per_step].  If the steps have different numbers
+        of values, a list of a view per step is returned instead.
+        """
+        column = self._column(SEQUENCE, name)
+        step_start, step_end = column.offsets[0][index : index + 2]
+        value_offsets = column.offsets[1][step_start : step_end + 1]
+        values = column.values[value_offsets[0] : value_offsets[-1]]
+
+        widths = np.diff(value_offsets)
+        if len(widths) == 0 or np.all(widths == widths[0]):
+            return values.reshape(len(widths), widths[0] if len(widths) else 0)
+
+        return np.split(values, value_offsets[1:-1] - value_offsets[0])
+
+    def _column(self, kind: str, name: str) -> _Column:
+        if (kind, name) not in self._columns:
+            raise KeyError(f"No {kind} feature {name} in {self.path}")
+        return self._columns[(kind, name)]
+
+    def gather(
+        self, kind: str, name: str, indices: np.ndarray
+    ) -> Tuple[np.ndarray, List[np.ndarray]]:
+        """
+        The values of a numeric feature of the given examples, concatenated, and
+        the number of values of each example (context), or the number of steps of
+        each example and values of each step (sequence)
+        """
+        column = self._column(kind, name)
+        if column.feature_kind == "bytes_list":
+            raise ValueError(f"Can't gather bytes feature {name}")
+
+        offsets = column.offsets[0]
+        ids, counts = _concatenated_ranges(offsets[indices], offsets[indices + 1])
+        lengths = [counts]
+
+        if kind == SEQUENCE:
+            offsets = column.offsets[1]
+            ids, widths = _concatenated_ranges(offsets[ids], offsets[ids + 1])
+            lengths.append(widths)
+
+        return column.values[ids], lengths
+
+
+def _concatenated_ranges(
+    starts: np.ndarray, ends: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """The concatenation of range(start, end) for each start and end, and lengths"""
+    lengths = ends - starts
+    range_starts = np.cumsum(lengths) - lengths
+    return (
+        np.repeat(starts - range_starts, lengths) + np.arange(lengths.sum()),
+        lengths,
+    )
+
+
+def _positions(lengths: np.ndarray) -> np.ndarray:
+    """The position of each element of consecutive runs of the given lengths"""
+    return np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+
+def _sparse_indices(lengths: List[np.ndarray]) -> Tuple[np.ndarray, List[int]]:
+    """
+    The indices and dense shape of the sparse tensor of a feature, given the
+    number of values of each example (context), or the number of steps of each
+    example and values of each step (sequence)
+    """
+    rows = np.arange(len(lengths[0]))
+    indices: List[np.ndarray] = []
+    dense_shape = [len(lengths[0])]
+
+    for level_lengths in lengths:
+        rows = np.repeat(rows, level_lengths)
+        indices = [np.repeat(i, level_lengths) for i in indices]
+        indices.append(_positions(level_lengths))
+        dense_shape.append(int(level_lengths.max(initial=0)))
+
+    return np.stack([rows] + indices, axis=1), dense_shape
+
+
+@dataclass(frozen=True)
+class _BatchFeature:
+    name: str
+    kind: str
+    spec: ParseSpec
+
+    def is_sparse(self) -> bool:
+        return isinstance(self.spec, tf.io.VarLenFeature)
+
+    def rank(self) -> int:
+        return 2 if self.kind == CONTEXT else 3
+
+
+class _BatchLayout:
+    """
+    Packs the arrays of the features of a batch into a few arrays, which are split
+    back into the batch's tensors in the dataset's graph.  tf.data spends longer
+    passing a batch out of Python, and running the graph that splits it, the more
+    arrays it has, so a batch is packed into: the values of the features of each
+    type, the number of values of each feature, and, for the sparse context and
+    sequence features, a matrix of their indices and one of their dense shapes.
+    """
+
+    def __init__(
+        self,
+        context_features: Dict[str, ParseSpec],
+        sequence_features: Dict[str, ParseSpec],
+    ):
+        self.features = [
+            _BatchFeature(name, kind, spec)
+            for kind, specs in [
+                (CONTEXT, context_features),
+                (SEQUENCE, sequence_features),
+            ]
+            for name, spec in specs.items()
+        ]
+
+        for feature in self.features:
+            if feature.is_sparse():
+                continue
+            if not isinstance(feature.spec, tf.io.FixedLenFeature):
+                raise ValueError(f"Unexpected spec for {feature.name}")
+            if feature.kind == SEQUENCE:
+                raise ValueError(
+                    f"Fixed length sequence {feature.name} isn't supported"
+                )
+
+        self.dtypes = sorted(
+            {feature.spec.dtype for feature in self.features}, key=lambda d: d.name
+        )
+
+        # The positions of the features of each type, and of the sparse features of
+        # each rank
+        self.dtype_positions = [
+            [i for i, f in enumerate(self.features) if f.spec.dtype == dtype]
+            for dtype in self.dtypes
+        ]
+        self.sparse_positions = [
+            [i for i, f in enumerate(self.features) if f.is_sparse() and f.kind == kind]
+            for kind in [CONTEXT, SEQUENCE]
+        ]
+
+    def signature(self) -> Tuple[tf.TensorSpec, ...]:
+        return (
+            tuple(tf.TensorSpec([None], dtype) for dtype in self.dtypes)
+            + (tf.TensorSpec([len(self.features)], tf.int64),)
+            + tuple(tf.TensorSpec([None, rank], tf.int64) for rank in [2, 3])
+            + tuple(
+                tf.TensorSpec([len(positions), rank], tf.int64)
+                for positions, rank in zip(self.sparse_positions, [2, 3])
+            )
+        )
+
+    def pack(
+        self, examples: List[Tuple[ColumnarShard, np.ndarray]]
+    ) -> Tuple[np.ndarray, ...]:
+        """Pack the given examples of each shard into a batch"""
+
+        values = []
+        num_values = []
+        indices: List[List[np.ndarray]] = [
+            [np.zeros((0, rank), np.int64)] for rank in [2, 3]
+        ]
+        dense_shapes: List[List[List[int]]] = [[], []]
+
+        for feature in self.features:
+            gathered = [
+                shard.gather(feature.kind, feature.name, shard_indices)
+                for shard, shard_indices in examples
+            ]
+            feature_values = np.concatenate(
+                [shard_values for shard_values, _ in gathered]
+            ).astype(feature.spec.dtype.as_numpy_dtype, copy=False)
+            lengths = [
+                np.concatenate(level_lengths)
+                for level_lengths in zip(
+                    *[shard_lengths for _, shard_lengths in gathered]
+                )
+            ]
+
+            values.append(feature_values)
+            num_values.append(len(feature_values))
+
+            if feature.is_sparse():
+                feature_indices, dense_shape = _sparse_indices(lengths)
+                level = 0 if feature.kind == CONTEXT else 1
+                indices[level].append(feature_indices)
+                dense_shapes[level].append(dense_shape)
+            else:
+                size = int(np.prod(feature.spec.shape))
+                if np.any(lengths[0] != size):
+                    raise ValueError(
+                        f"Expected {size} values of {feature.name} in every example"
+                    )
+
+        return (
+            tuple(
+                np.concatenate([values[i] for i in positions])
+                for positions in self.dtype_positions
+            )
+            + (np.array(num_values, dtype=np.int64),)
+            + tuple(np.concatenate(level_indices) for level_indices in indices)
+            + tuple(
+                np.array(level_shapes, dtype=np.int64).reshape(-1, rank)
+                for level_shapes, rank in zip(dense_shapes, [2, 3])
+            )
+        )
+
+    def unpack(self, *arrays) -> Dict[str, Union[tf.Tensor, tf.SparseTensor]]:
+        """Split the tensors of a batch out of its packed arrays"""
+
+        num_dtypes = len(self.dtypes)
+        values = arrays[:num_dtypes]
+        num_values = arrays[num_dtypes]
+        indices = arrays[num_dtypes + 1 : num_dtypes + 3]
+        dense_shapes = arrays[num_dtypes + 3 :]
+
+        feature_values: Dict[int, tf.Tensor] = {}
+        for positions, dtype_values in zip(self.dtype_positions, values):
+            split = tf.split(dtype_values, tf.gather(num_values, positions))
+            feature_values.update(zip(positions, split))
+
+        feature_indices: Dict[int, tf.Tensor] = {}
+        feature_shapes: Dict[int, tf.Tensor] = {}
+        for positions, level_indices, level_shapes in zip(
+            self.sparse_positions, indices, dense_shapes
+        ):
+            if positions:
+                split = tf.split(level_indices, tf.gather(num_values, positions))
+                feature_indices.update(zip(positions, split))
+                feature_shapes.update(zip(positions, tf.unstack(level_shapes)))
+
+        batch = {}
+        for i, feature in enumerate(self.features):
+            if feature.is_sparse():
+                batch[feature.name] = tf.SparseTensor(
+                    indices=feature_indices[i],
+                    values=feature_values[i],
+                    dense_shape=feature_shapes[i],
+                )
+            else:
+                batch[feature.name] = tf.reshape(
+                    feature_values[i], [-1] + list(feature.spec.shape)
+                )
+
+        return batch
+
+
+def make_dataset(
+    paths: List[str],
+    context_features: Dict[str, ParseSpec],
+    sequence_features: Dict[str, ParseSpec],
+    batch_size: int,
+    shuffle: bool = False,
+    seed: Optional[int] = None,
+) -> tf.data.Dataset:
+    """
+    A dataset of batches of the examples in the given shards, with the same
+    tensors as parse_sequence_example makes from the serialized examples, given
+    the same parse specs.  If shuffled, the order of the shards, and of the
+    examples in each shard, are shuffled, but each batch is still drawn from at
+    most a few consecutive shards, so that its values are gathered from a few
+    large slices.
+    """
+
+    layout = _BatchLayout(context_features, sequence_features)
+
+    def make_batches() -> Iterator[Tuple[np.ndarray, ...]]:
+        rng = random.Random(seed)
+        shard_paths = list(paths)
+        if shuffle:
+            rng.shuffle(shard_paths)
+
+        pending: List[Tuple[ColumnarShard, np.ndarray]] = []
+        num_pending = 0
+
+        for path in shard_paths:
+            shard = ColumnarShard(path)
+            order = np.arange(len(shard))
+            if shuffle:
+                order = np.random.RandomState(rng.getrandbits(32)).permutation(order)
+
+            start = 0
+            while start < len(order):
+                indices = order[start : start + batch_size - num_pending]
+                start += len(indices)
+                pending.append((shard, indices))
+                num_pending += len(indices)
+
+                if num_pending == batch_size:
+                    batch = layout.pack(pending)
+                    # Batches hold copies of the values, so the earlier shards are
+                    # no longer needed
+                    for pending_shard, _ in pending:
+                        if pending_shard is not shard:
+                            pending_shard.close()
+                    pending, num_pending = [], 0
+                    yield batch
+
+            if not pending:
+                shard.close()
+
+        if pending:
+            batch = layout.pack(pending)
+            for pending_shard, _ in pending:
+                pending_shard.close()
+            yield batch
+
+    return tf.data.Dataset.from_generator(
+        make_batches, output_signature=layout.signature()
+    ).map(layout.unpack, num_parallel_calls=tf.data.AUTOTUNE)
@@ -0,0 +1,177 @@
+import random
+from typing import List
+
+import numpy as np  # type: ignore
+import pytest
+import tensorflow as tf  # type: ignore
+
+from pokermon.ai.policy import Policy
+from pokermon.ai.random_policy import RandomPolicy
+from pokermon.features.columnar import ColumnarShard, ColumnarShardWriter, make_dataset
+from pokermon.features.context import PublicContext
+from pokermon.features.examples import (
+    make_example,
+    make_forward_backward_examples,
+    seq_example_to_dict,
+)
+from pokermon.poker import dealer
+from pokermon.simulate.simulate import simulate
+
+
+def make_examples(num_hands: int, num_players: int) -> List[tf.train.SequenceExample]:
+    examples = []
+    for _ in range(num_hands):
+        players: List[Policy] = [RandomPolicy() for _ in range(num_players)]
+        starting_stacks = [random.randint(10, 300) for _ in players]
+        deal = dealer.deal_cards(num_players)
+        game, result = simulate(players, starting_stacks, deal)
+        examples.extend(
+            make_forward_backward_examples(
+                game.view(),
+                deal.hole_cards,
+                deal.board,
+                result,
+                player_names=[f"player_{i}" for i in range(num_players)],
+            )
+        )
+    return examples
+
+
+def write_shard(path: str, examples: List[tf.train.SequenceExample]) -> None:
+    with ColumnarShardWriter(path) as writer:
+        for example in examples:
+            writer.write(example)
+
+
+def test_shard_round_trip(tmp_path) -> None:
+    random.seed(11)
+    examples = make_examples(5, 2) + make_examples(5, 3)
+
+    path = str(tmp_path / "examples-0.col")
+    write_shard(path, examples)
+
+    with ColumnarShard(path) as shard:
+        assert len(shard) == len(examples)
+
+        for index, example in enumerate(examples):
+            expected = seq_example_to_dict(example)
+
+            context = {}
+            for name in shard.context_feature_names():
+                values = shard.context(name, index)
+                context[name] = [
+                    v.decode("utf-8") if isinstance(v, bytes) else v for v in values
+                ]
+            assert context == expected["context"]
+
+            features = {
+                name: [step.tolist() for step in shard.sequence(name, index)]
+                for name in shard.sequence_feature_names()
+            }
+            assert features == expected["features"]
+
+
+def test_shard_rejects_different_features(tmp_path) -> None:
+    with pytest.raises(ValueError):
+        write_shard(
+            str(tmp_path / "examples-0.col"),
+            [
+                make_example(
+                    public_context=PublicContext(
+                        num_players=2, starting_stack_sizes=[1, 2]
+                    )
+                ),
+                make_example(player_name="foo"),
+            ],
+        )
+
+
+def test_shard_rejects_different_feature_kinds(tmp_path) -> None:
+    path = str(tmp_path / "examples-0.col")
+
+    examples = [make_example(player_name=name) for name in ["foo", "bar", "baz"]]
+    for num_steps, example in enumerate(examples):
+        example.context.feature["num_steps"].int64_list.value[:] = [num_steps]
+
+    # The player name is a bytes feature, so an int64 one has a different kind
+    examples[1].context.feature["player_name"].int64_list.value.append(1)
+
+    with ColumnarShardWriter(path) as writer:
+        writer.write(examples[0])
+        with pytest.raises(ValueError):
+            writer.write(examples[1])
+        writer.write(examples[2])
+
+    # The example that was rejected left no trace in any column
+    with ColumnarShard(path) as shard:
+        assert len(shard) == 2
+        assert shard.context("player_name", 1) == [b"baz"]
+        assert list(shard.context("num_steps", 1)) == [2]
+
+
+def test_dataset_matches_parsed_examples(tmp_path) -> None:
+    random.seed(12)
+    examples = make_examples(12, 2)
+
+    paths = [str(tmp_path / f"examples-{i}.col") for i in range(2)]
+    write_shard(paths[0], examples[:10])
+    write_shard(paths[1], examples[10:])
+
+    # The specs of the kinds of features that feature columns parse
+    context_features = {
+        "public_context__starting_stack_sizes": tf.io.FixedLenFeature([2], tf.int64),
+        "private_context__hand_encoded": tf.io.VarLenFeature(tf.int64),
+    }
+    sequence_features = {
+        "last_action__action_encoded": tf.io.VarLenFeature(tf.int64),
+        "last_action__amount_raised_percent_of_pot": tf.io.VarLenFeature(tf.float32),
+        "public_state__stack_sizes": tf.io.VarLenFeature(tf.int64),
+        "public_state__flop_0_rank": tf.io.VarLenFeature(tf.int64),
+        "reward__cumulative_reward": tf.io.VarLenFeature(tf.int64),
+    }
+
+    batch_size = 7
+    batches = [examples[i : i + batch_size] for i in range(0, 24, batch_size)]
+    dataset = make_dataset(paths, context_features, sequence_features, batch_size)
+
+    num_batches = 0
+    for batch, batch_examples in zip(dataset, batches):
+        ctx, seq, _ = tf.io.parse_sequence_example(
+            [example.SerializeToString() for example in batch_examples],
+            context_features=context_features,
+            sequence_features=sequence_features,
+        )
+        expected = {**ctx, **seq}
+
+        assert batch.keys() == expected.keys()
+        for name, tensor in batch.items():
+            if isinstance(tensor, tf.SparseTensor):
+                np.testing.assert_array_equal(tensor.indices, expected[name].indices)
+                np.testing.assert_array_equal(tensor.values, expected[name].values)
+                np.testing.assert_array_equal(
+                    tensor.dense_shape, expected[name].dense_shape
+                )
+            else:
+                np.testing.assert_array_equal(tensor, expected[name])
+
+        num_batches += 1
+
+    assert num_batches == len(batches)
+    assert len(list(dataset)) == len(batches)
+
+    # Shuffling reorders the examples, but keeps all of them
+    shuffled = make_dataset(
+        paths, context_features, sequence_features, batch_size, shuffle=True, seed=3
+    )
+    stack_sizes = np.concatenate(
+        [batch["public_context__starting_stack_sizes"] for batch in shuffled]
+    )
+    expected_stack_sizes = [
+        list(
+            example.context.feature[
+                "public_context__starting_stack_sizes"
+            ].int64_list.value
+        )
+        for example in examples
+    ]
+    assert sorted(stack_sizes.tolist()) == sorted(expected_stack_sizes)
@@ -1,26 +1,23 @@
 import dataclasses
+import functools
 import typing
 from collections import OrderedDict, defaultdict
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import tensorflow as tf  # type: ignore
 
-from pokermon.features.action import (
-    LastAction,
-    NextAction,
-    make_last_actions,
-    make_next_actions,
-)
+from pokermon.features.action import LastAction, NextAction
 from pokermon.features.context import (
     PrivateContext,
     PublicContext,
     make_private_context,
     make_public_context,
 )
-from pokermon.features.player_state import PlayerState, make_player_states
-from pokermon.features.public_state import PublicState, make_public_states
-from pokermon.features.rewards import Reward, make_rewards
+from pokermon.features.player_state import PlayerState
+from pokermon.features.public_state import PublicState
+from pokermon.features.rewards import Reward
 from pokermon.features.target import Target
+from pokermon.features.timesteps import make_public_timesteps, make_timesteps
 from pokermon.features.utils import field_feature_name
 from pokermon.poker.board import Board
 from pokermon.poker.game import GameView, Street
@@ -35,13 +32,15 @@ def make_forward_example(
     board: Board,
     player_name: Optional[str] = None,
 ) -> tf.train.SequenceExample:
+    timesteps = make_timesteps(player_index, game, hole_cards, board)
+
     return make_example(
         player_name=player_name,
         public_context=make_public_context(game),
         private_context=make_private_context(hole_cards),
-        public_states=make_public_states(game, board=board),
-        player_states=make_player_states(player_index, game, hole_cards, board),
-        last_actions=make_last_actions(game),
+        public_states=timesteps.public_states,
+        player_states=timesteps.player_states,
+        last_actions=timesteps.last_actions,
     )
 
 
@@ -61,16 +60,88 @@ def make_forward_backward_example(
     # assert game.num_players() == self.num_players
     assert game.street() == Street.HAND_OVER
 
+    timesteps = make_timesteps(player_index, game, hole_cards, board, result)
+
     return make_example(
         player_name=player_name,
         public_context=make_public_context(game),
         private_context=make_private_context(hole_cards),
-        public_states=make_public_states(game, board=board),
-        player_states=make_player_states(player_index, game, hole_cards, board),
-        last_actions=make_last_actions(game),
-        next_actions=make_next_actions(game),
-        rewards=make_rewards(game, result),
+        public_states=timesteps.public_states,
+        player_states=timesteps.player_states,
+        last_actions=timesteps.last_actions,
+        next_actions=timesteps.next_actions,
+        rewards=timesteps.rewards,
+    )
+
+
+def make_forward_backward_examples(
+    game: GameView,
+    hole_cards: List[HoleCards],
+    board: Board,
+    result: Result,
+    player_names: Optional[List[str]] = None,
+) -> List[tf.train.SequenceExample]:
+    """
+    Make the forward-backward example of every player in a finished hand (see
+    make_forward_backward_example).  The public part of the hand (its public
+    context, public states and actions) is featurized once and shared by every
+    player's example, which only adds the player's private features.
+    """
+
+    assert game.street() == Street.HAND_OVER
+
+    public_timesteps = make_public_timesteps(game, board)
+
+    public_context_features = _make_feature_map(
+        PublicContext, make_public_context(game)
     )
+    public_state_features = _make_timestamp_features(
+        PublicState, public_timesteps.public_states
+    )
+    last_action_features = _make_timestamp_features(
+        LastAction, public_timesteps.last_actions
+    )
+    next_action_features = _make_timestamp_features(
+        NextAction, public_timesteps.next_actions
+    )
+
+    examples = []
+
+    for player_index, player_hole_cards in enumerate(hole_cards):
+        timesteps = make_timesteps(
+            player_index,
+            game,
+            player_hole_cards,
+            board,
+            result,
+            public_timesteps=public_timesteps,
+        )
+
+        context_features: Dict[str, tf.train.Feature] = OrderedDict()
+
+        if player_names and player_names[player_index]:
+            context_features["player_name"] = _bytes_feature(
+                [player_names[player_index]]
+            )
+
+        context_features.update(public_context_features)
+        context_features.update(
+            _make_feature_map(PrivateContext, make_private_context(player_hole_cards))
+        )
+
+        # The same order as make_example
+        timestamp_features: Dict[str, tf.train.FeatureList] = OrderedDict()
+        timestamp_features.update(public_state_features)
+        timestamp_features.update(
+            _make_timestamp_features(PlayerState, timesteps.player_states)
+        )
+        timestamp_features.update(last_action_features)
+        timestamp_features.update(next_action_features)
+        timestamp_features.update(_make_timestamp_features(Reward, timesteps.rewards))
+
+        examples.append(_make_sequence_example(context_features, timestamp_features))
+
+    return examples
 
 
 def _bytes_feature(values: List[str]) -> tf.train.Feature:
@@ -125,40 +196,114 @@ def seq_example_to_dict(example: tf.train.SequenceExample) -> Dict[str, Any]:
     return feature_map
 
 
-def _make_feature_map(clazz, val: Any, default_val=-1) -> Dict[str, tf.train.Feature]:
-    feature_map = {}
+# Writes a value of a field into a feature
+FieldWriter = Callable[[tf.train.Feature, Any], None]
 
-    val_map = dataclasses.asdict(val)
 
-    for field in dataclasses.fields(clazz):
+def _write_int64(feature: tf.train.Feature, val: int) -> None:
+    feature.int64_list.value.append(val)
 
-        name = field_feature_name(clazz, field)
 
-        val = val_map[field.name]
-        field_type = field.type
+def _write_float(feature: tf.train.Feature, val: float) -> None:
+    feature.float_list.value.append(val)
 
-        if typing.get_origin(field_type) == typing.Union:
-            first_type, second_type = typing.get_args(field_type)
-            if second_type != type(None):  # noqa: E721
-                raise Exception()
-            field_type = first_type
-            if val is None:
-                val = default_val
-
-        if field_type == List[int]:
-            feature_map[name] = _int64_feature(val)
-        elif field_type == List[float]:
-            feature_map[name] = _float_feature(val)
-        elif field_type == int:
-            feature_map[name] = _int64_feature([val])
-        elif field_type == float:
-            feature_map[name] = _float_feature([val])
-        elif field_type == bool:
-            feature_map[name] = _int64_feature([int(val)])
-        else:
-            raise Exception("Unexpected type %s", field.type)
 
-    return feature_map
+def _write_bool(feature: tf.train.Feature, val: bool) -> None:
+    feature.int64_list.value.append(int(val))
+
+
+def _write_int64_list(feature: tf.train.Feature, val: List[int]) -> None:
+    # Mark the list as set, even if it is empty
+    feature.int64_list.SetInParent()
+    feature.int64_list.value.extend(val)
+
+
+def _write_float_list(feature: tf.train.Feature, val: List[float]) -> None:
+    feature.float_list.SetInParent()
+    feature.float_list.value.extend(val)
+
+
+def _write_optional(writer: FieldWriter, default_val: Any) -> FieldWriter:
+    def write(feature: tf.train.Feature, val: Any) -> None:
+        writer(feature, default_val if val is None else val)
+
+    return write
+
+
+class _FeatureEncoder:
+    """
+    Writes the fields of a feature dataclass into tf.train.Features.  The name and
+    type of each field are read once, when the encoder is made, so that encoding a
+    row only reads its attributes.
+    """
+
+    def __init__(self, clazz, default_val=-1):
+        self.feature_names: List[str] = []
+        self._fields: List[Tuple[str, FieldWriter]] = []
+
+        for field in dataclasses.fields(clazz):
+
+            field_type = field.type
+            is_optional = False
+
+            if typing.get_origin(field_type) == typing.Union:
+                first_type, second_type = typing.get_args(field_type)
+                if second_type != type(None):  # noqa: E721
+                    raise Exception()
+                field_type = first_type
+                is_optional = True
+
+            writer: FieldWriter
+            if field_type == List[int]:
+                writer = _write_int64_list
+            elif field_type == List[float]:
+                writer = _write_float_list
+            elif field_type == int:
+                writer = _write_int64
+            elif field_type == float:
+                writer = _write_float
+            elif field_type == bool:
+                writer = _write_bool
+            else:
+                raise Exception("Unexpected type %s", field.type)
+
+            if is_optional:
+                writer = _write_optional(writer, default_val)
+
+            self.feature_names.append(field_feature_name(clazz, field))
+            self._fields.append((field.name, writer))
+
+    def feature_map(self, val: Any) -> Dict[str, tf.train.Feature]:
+        """The features of a single row"""
+        features = [tf.train.Feature() for _ in self._fields]
+
+        for feature, (name, writer) in zip(features, self._fields):
+            writer(feature, getattr(val, name))
+
+        return dict(zip(self.feature_names, features))
+
+    def feature_lists(self, vals: List[Any]) -> Dict[str, tf.train.FeatureList]:
+        """The features of a sequence of rows, with a feature list per field"""
+        feature_lists = [tf.train.FeatureList() for _ in self._fields]
+        fields = [
+            (feature_list.feature, name, writer)
+            for feature_list, (name, writer) in zip(feature_lists, self._fields)
+        ]
+
+        for val in vals:
+            for features, name, writer in fields:
+                writer(features.add(), getattr(val, name))
+
+        return dict(zip(self.feature_names, feature_lists))
+
+
+@functools.lru_cache(maxsize=None)
+def _feature_encoder(clazz) -> _FeatureEncoder:
+    return _FeatureEncoder(clazz)
+
+
+def _make_feature_map(clazz, val: Any) -> Dict[str, tf.train.Feature]:
+    return _feature_encoder(clazz).feature_map(val)
 
 
 def with_prefix(prefix, d):
@@ -212,38 +357,35 @@ def make_example(
     if target:
         context_features.update(_make_feature_map(Target, target))
 
-    timestamp_features: Dict[str, List[tf.train.Feature]] = defaultdict(list)
+    timestamp_features: Dict[str, tf.train.FeatureList] = OrderedDict()
+    timestamp_features.update(_make_timestamp_features(PublicState, public_states))
+    timestamp_features.update(_make_timestamp_features(PlayerState, player_states))
+    timestamp_features.update(_make_timestamp_features(LastAction, last_actions))
+    timestamp_features.update(_make_timestamp_features(NextAction, next_actions))
+    timestamp_features.update(_make_timestamp_features(Reward, rewards))
+
+    return _make_sequence_example(context_features, timestamp_features)
 
-    if public_states:
-        for public_state in public_states:
-            for k, v in _make_feature_map(PublicState, public_state).items():
-                timestamp_features[k].append(v)
 
-    if player_states:
-        for player_state in player_states:
-            for k, v in _make_feature_map(PlayerState, player_state).items():
-                timestamp_features[k].append(v)
+def _make_timestamp_features(
+    clazz, vals: Optional[List[Any]]
+) -> Dict[str, tf.train.FeatureList]:
+    if not vals:
+        return {}
 
-    if last_actions:
-        for last_action in last_actions:
-            for k, v in _make_feature_map(LastAction, last_action).items():
-                timestamp_features[k].append(v)
+    return _feature_encoder(clazz).feature_lists(vals)
 
-    if next_actions:
-        for next_action in next_actions:
-            for k, v in _make_feature_map(NextAction, next_action).items():
-                timestamp_features[k].append(v)
 
-    if rewards:
-        for reward in rewards:
-            for k, v in _make_feature_map(Reward, reward).items():
-                timestamp_features[k].append(v)
+def _make_sequence_example(
+    context_features: Dict[str, tf.train.Feature],
+    timestamp_features: Dict[str, tf.train.FeatureList],
+) -> tf.train.SequenceExample:
 
     num_steps = None
     for name, feature_list in timestamp_features.items():
         if num_steps is None:
-            num_steps = len(feature_list)
-        elif len(feature_list) != num_steps:
+            num_steps = len(feature_list.feature)
+        elif len(feature_list.feature) != num_steps:
             raise Exception(f"Invalid number of features for {name}")
 
     context_features["num_steps"] = _int64_feature([num_steps or 0])
@@ -253,7 +395,6 @@ def make_example(
     )
 
     for feature_name, feature_list in timestamp_features.items():
-        for feature in feature_list:
-            seq_ex.feature_lists.feature_list[feature_name].feature.append(feature)
+        seq_ex.feature_lists.feature_list[feature_name].CopyFrom(feature_list)
 
     return seq_ex
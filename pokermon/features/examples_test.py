@@ -1,21 +1,33 @@
 # from pokermon.features import reenforcement_types
+import copy
+import random
+from typing import List
+
+from pokermon.ai.policy import Policy
+from pokermon.ai.random_policy import RandomPolicy
 from pokermon.features.action import make_last_actions, make_next_actions
 from pokermon.features.context import (
     PublicContext,
     make_private_context,
     make_public_context,
 )
-from pokermon.features.examples import make_example, seq_example_to_dict
+from pokermon.features.examples import (
+    make_example,
+    make_forward_backward_example,
+    make_forward_backward_examples,
+    seq_example_to_dict,
+)
 from pokermon.features.player_state import make_player_states
 from pokermon.features.public_state import PublicState, make_public_states
 from pokermon.features.rewards import make_rewards
 from pokermon.features.target import make_target
-from pokermon.poker import result
+from pokermon.poker import dealer, result
 from pokermon.poker.board import Board, mkflop
 from pokermon.poker.cards import mkcard
 from pokermon.poker.deal import FullDeal
 from pokermon.poker.game_runner import GameRunner
 from pokermon.poker.hands import mkhand
+from pokermon.simulate.simulate import simulate
 
 
 def test_context() -> None:
@@ -1001,3 +1013,39 @@ def test_full_hand() -> None:
             ],
         },
     }
+
+
+def test_forward_backward_examples_share_public_features() -> None:
+    random.seed(3)
+
+    for _ in range(5):
+        players: List[Policy] = [RandomPolicy(), RandomPolicy(), RandomPolicy()]
+        starting_stacks = [random.randint(10, 300) for _ in players]
+        deal = dealer.deal_cards(len(players))
+        game, results = simulate(players, starting_stacks, deal)
+        player_names = ["a", "b", "c"]
+
+        separate_results = copy.deepcopy(results)
+        separate = [
+            make_forward_backward_example(
+                player_index,
+                game.view(),
+                deal.hole_cards[player_index],
+                deal.board,
+                separate_results,
+                player_name=player_names[player_index],
+            )
+            for player_index in range(len(players))
+        ]
+
+        shared = make_forward_backward_examples(
+            game.view(),
+            deal.hole_cards,
+            deal.board,
+            copy.deepcopy(results),
+            player_names=player_names,
+        )
+
+        assert [e.SerializeToString() for e in shared] == [
+            e.SerializeToString() for e in separate
+        ]
@@ -3,7 +3,9 @@
 # player: The selected player
 # current_player: The player whose turn it is
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set
+
+import numpy as np  # type: ignore
 
 import pyholdthem
 from pokermon.features.utils import iter_game_states
@@ -12,6 +14,14 @@ from pokermon.poker.evaluation import evaluate_hand
 from pokermon.poker.game import GameView, Street
 from pokermon.poker.hands import HoleCards
 
+# Hand odds are simulated until their 95% confidence intervals are at most this
+# wide, or this many hands have been simulated
+ODDS_CI_WIDTH = 0.05
+MAX_ODDS_SIMULATIONS = 1000
+
+# The number of cards on a complete board
+BOARD_SIZE = 5
+
 
 @dataclass(frozen=True)
 class PlayerState:
@@ -46,67 +56,102 @@ class PlayerState:
     lose_odds_vs_worse: Optional[float] = None
 
 
+def make_hand_features(hole_cards: HoleCards, boards: List[Board]) -> np.ndarray:
+    """
+    Compute the hand features of the hole cards on each of the boards in a single
+    call.  Returns a structured array with a row for each board and a field for
+    each feature (see pyholdthem.make_hand_features_batch).
+    """
+    hole_indices = np.full(len(boards), hole_cards.index(), dtype=np.int32)
+    board_indices = np.full((len(boards), BOARD_SIZE), -1, dtype=np.int32)
+    for i, board in enumerate(boards):
+        card_indices = board.card_indices()
+        board_indices[i, : len(card_indices)] = card_indices
+
+    return pyholdthem.make_hand_features_batch(
+        hole_indices, board_indices, MAX_ODDS_SIMULATIONS, ODDS_CI_WIDTH
+    )
+
+
+def make_current_player_states(
+    hole_cards: HoleCards, board: Board, streets: Set[Street]
+) -> Dict[Street, PlayerState]:
+    """
+    The state of the player on each of the given streets, when it is their turn.
+    These don't vary within a street, and the hand features of every post-flop
+    street are computed together, in one call.
+    """
+
+    player_states = {}
+
+    post_flop_streets = sorted(street for street in streets if street != Street.PREFLOP)
+    post_flop_boards = [board.at_street(street) for street in post_flop_streets]
+
+    if Street.PREFLOP in streets:
+        player_states[Street.PREFLOP] = PlayerState(
+            is_current_player=True, current_player_offset=0
+        )
+
+    for street, current_board, hand_features in zip(
+        post_flop_streets,
+        post_flop_boards,
+        make_hand_features(hole_cards, post_flop_boards),
+    ):
+        hand_eval = evaluate_hand(hole_cards, current_board)
+
+        player_states[street] = PlayerState(
+            is_current_player=True,
+            current_player_offset=0,
+            current_hand_type=hand_eval.hand_type.value,
+            frac_better_hands=float(hand_features["frac_better_hands"]),
+            frac_tied_hands=float(hand_features["frac_tied_hands"]),
+            frac_worse_hands=float(hand_features["frac_worse_hands"]),
+            win_odds=float(hand_features["win_odds"]),
+            tie_odds=float(hand_features["tie_odds"]),
+            lose_odds=float(hand_features["lose_odds"]),
+            win_odds_vs_better=float(hand_features["win_odds_vs_better"]),
+            tie_odds_vs_better=float(hand_features["tie_odds_vs_better"]),
+            lose_odds_vs_better=float(hand_features["lose_odds_vs_better"]),
+            win_odds_vs_tied=float(hand_features["win_odds_vs_tied"]),
+            tie_odds_vs_tied=float(hand_features["tie_odds_vs_tied"]),
+            lose_odds_vs_tied=float(hand_features["lose_odds_vs_tied"]),
+            win_odds_vs_worse=float(hand_features["win_odds_vs_worse"]),
+            tie_odds_vs_worse=float(hand_features["tie_odds_vs_worse"]),
+            lose_odds_vs_worse=float(hand_features["lose_odds_vs_worse"]),
+        )
+
+    return player_states
+
+
 def make_player_states(
     player_index: int, game: GameView, hole_cards: HoleCards, board: Board
 ) -> List[PlayerState]:
 
-    player_states = []
-    street_cache: Dict[Street, PlayerState] = {}
+    game_views = [game.view(i) for i in iter_game_states(game)]
+
+    current_player_states = make_current_player_states(
+        hole_cards,
+        board,
+        {
+            game_view.street()
+            for game_view in game_views
+            if game_view.current_player() == player_index
+        },
+    )
 
-    for i in iter_game_states(game):
-        game_view = game.view(i)
+    player_states = []
 
-        is_player_turn = game_view.current_player() == player_index
+    for game_view in game_views:
 
         # We don't set the rest of the values for non-current-players
-        if not is_player_turn:
+        if game_view.current_player() != player_index:
             player_states.append(
                 PlayerState(
                     is_current_player=False,
                     current_player_offset=(game_view.current_player() - player_index),
                 )
             )
-            continue
-
-        street = game_view.street()
-
-        # These values don't vary by street, so we cache them
-        if street in street_cache:
-            player_states.append(street_cache[street])
-            continue
-
-        if game_view.street() == Street.PREFLOP:
-            player_state = PlayerState(is_current_player=True, current_player_offset=0)
-
         else:
-            current_board = board.at_street(game_view.street())
-            hand_eval = evaluate_hand(hole_cards, current_board)
-            hand_features = pyholdthem.make_hand_features_from_indices(
-                hole_cards.index(), [c.index() for c in current_board.cards()], 1000
-            )
-
-            player_state = PlayerState(
-                is_current_player=True,
-                current_player_offset=0,
-                current_hand_type=hand_eval.hand_type.value,
-                frac_better_hands=hand_features.frac_better_hands,
-                frac_tied_hands=hand_features.frac_tied_hands,
-                frac_worse_hands=hand_features.frac_worse_hands,
-                win_odds=hand_features.win_odds,
-                tie_odds=hand_features.tie_odds,
-                lose_odds=hand_features.lose_odds,
-                win_odds_vs_better=hand_features.win_odds_vs_better,
-                tie_odds_vs_better=hand_features.tie_odds_vs_better,
-                lose_odds_vs_better=hand_features.lose_odds_vs_better,
-                win_odds_vs_tied=hand_features.win_odds_vs_tied,
-                tie_odds_vs_tied=hand_features.tie_odds_vs_tied,
-                lose_odds_vs_tied=hand_features.lose_odds_vs_tied,
-                win_odds_vs_worse=hand_features.win_odds_vs_worse,
-                tie_odds_vs_worse=hand_features.tie_odds_vs_worse,
-                lose_odds_vs_worse=hand_features.lose_odds_vs_worse,
-            )
-
-        street_cache[street] = player_state
-        player_states.append(player_state)
+            player_states.append(current_player_states[game_view.street()])
 
     return player_states
@@ -4,7 +4,7 @@
 # - Private State: The state that requires knowing someone's hole cards
 
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import List, Optional, Sequence
 
 from pokermon.features.utils import card_order, iter_game_states
 from pokermon.poker.board import Board
@@ -36,6 +36,80 @@ class PublicState:
     river_suit: Optional[int]
 
 
+def make_public_state(
+    street: Street,
+    board: Board,
+    current_player: int,
+    is_folded: Sequence[int],
+    is_all_in: Sequence[int],
+    stack_sizes: Sequence[int],
+    amount_to_call: Sequence[int],
+    pot_size: int,
+    min_raise_amount: int,
+) -> PublicState:
+    """
+    The public state of a game on the given street, where the board only holds the
+    cards dealt by that street
+    """
+
+    current_player_mask = [0 for _ in range(len(is_folded))]
+    current_player_mask[current_player] = 1
+
+    if board.flop is not None:
+        flop_0, flop_1, flop_2 = sorted(board.flop, key=card_order)
+        flop_0_rank = flop_0.rank.value
+        flop_0_suit = flop_0.suit.value
+        flop_1_rank = flop_1.rank.value
+        flop_1_suit = flop_1.suit.value
+        flop_2_rank = flop_2.rank.value
+        flop_2_suit = flop_2.suit.value
+    else:
+        flop_0_rank = None
+        flop_0_suit = None
+        flop_1_rank = None
+        flop_1_suit = None
+        flop_2_rank = None
+        flop_2_suit = None
+
+    if board.turn is not None:
+        turn = board.turn
+        turn_rank = turn.rank.value
+        turn_suit = turn.suit.value
+    else:
+        turn_rank = None
+        turn_suit = None
+
+    if board.river is not None:
+        river = board.river
+        river_rank = river.rank.value
+        river_suit = river.suit.value
+    else:
+        river_rank = None
+        river_suit = None
+
+    return PublicState(
+        num_players_remaining=sum(not folded for folded in is_folded),
+        pot_size=pot_size,
+        street=street.value,
+        current_player_mask=current_player_mask,
+        folded_player_mask=list(is_folded),
+        all_in_player_mask=list(is_all_in),
+        stack_sizes=list(stack_sizes),
+        amount_to_call=list(amount_to_call),
+        min_raise_amount=min_raise_amount,
+        flop_0_rank=flop_0_rank,
+        flop_0_suit=flop_0_suit,
+        flop_1_rank=flop_1_rank,
+        flop_1_suit=flop_1_suit,
+        flop_2_rank=flop_2_rank,
+        flop_2_suit=flop_2_suit,
+        turn_rank=turn_rank,
+        turn_suit=turn_suit,
+        river_rank=river_rank,
+        river_suit=river_suit,
+    )
+
+
 def make_public_states(game: GameView, board: Optional[Board]):
     public_states = []
 
@@ -47,62 +121,17 @@ def make_public_states(game: GameView, board: Optional[Board]):
         else:
             current_board = board.at_street(game_view.street())
 
-        current_player_mask = [0 for _ in range(game_view.num_players())]
-        current_player_mask[game_view.current_player()] = 1
-
-        if game_view.street() >= Street.FLOP and current_board.flop is not None:
-            flop_0, flop_1, flop_2 = sorted(current_board.flop, key=card_order)
-            flop_0_rank = flop_0.rank.value
-            flop_0_suit = flop_0.suit.value
-            flop_1_rank = flop_1.rank.value
-            flop_1_suit = flop_1.suit.value
-            flop_2_rank = flop_2.rank.value
-            flop_2_suit = flop_2.suit.value
-        else:
-            flop_0_rank = None
-            flop_0_suit = None
-            flop_1_rank = None
-            flop_1_suit = None
-            flop_2_rank = None
-            flop_2_suit = None
-
-        if game_view.street() >= Street.TURN and current_board.turn is not None:
-            turn = current_board.turn
-            turn_rank = turn.rank.value
-            turn_suit = turn.suit.value
-        else:
-            turn_rank = None
-            turn_suit = None
-
-        if game_view.street() >= Street.RIVER and current_board.river is not None:
-            river = current_board.river
-            river_rank = river.rank.value
-            river_suit = river.suit.value
-        else:
-            river_rank = None
-            river_suit = None
-
         public_states.append(
-            PublicState(
-                num_players_remaining=sum(game_view.is_in_hand()),
-                pot_size=game_view.pot_size(),
-                street=game_view.street().value,
-                current_player_mask=current_player_mask,
-                folded_player_mask=game_view.is_folded(),
-                all_in_player_mask=game_view.is_all_in(),
+            make_public_state(
+                street=game_view.street(),
+                board=current_board,
+                current_player=game_view.current_player(),
+                is_folded=game_view.is_folded(),
+                is_all_in=game_view.is_all_in(),
                 stack_sizes=game_view.current_stack_sizes(),
                 amount_to_call=game_view.amount_to_call(),
+                pot_size=game_view.pot_size(),
                 min_raise_amount=game_view.min_bet_amount(),
-                flop_0_rank=flop_0_rank,
-                flop_0_suit=flop_0_suit,
-                flop_1_rank=flop_1_rank,
-                flop_1_suit=flop_1_suit,
-                flop_2_rank=flop_2_rank,
-                flop_2_suit=flop_2_suit,
-                turn_rank=turn_rank,
-                turn_suit=turn_suit,
-                river_rank=river_rank,
-                river_suit=river_suit,
             )
         )
 
@@ -33,17 +33,29 @@ def make_rewards(game: GameView, result: Result):
     # This only makes sense at the end of the game
     assert game.street() == Street.HAND_OVER
 
+    return make_rewards_from_actions(
+        [game.view(i).next_action() for i in iter_game_states(game)],
+        game.num_players(),
+        result,
+    )
+
+
+def make_rewards_from_actions(
+    actions: List[Action], num_players: int, result: Result
+) -> List[Reward]:
+    """
+    Generate a list of rewards for the non-voluntary actions of a finished hand
+    """
+
     rewards = []
 
     # Profits between now and the end of the hand
     cumulative_rewards: List[int] = result.earned_from_pot
 
-    is_last_action: List[bool] = [True for _ in range(game.num_players())]
+    is_last_action: List[bool] = [True for _ in range(num_players)]
 
     # Iterate in reverse order
-    for i in reversed(list(iter_game_states(game))):
-
-        a: Action = game.view(i).next_action()
+    for a in reversed(actions):
 
         won_hand = result.won_hand[a.player_index]
 
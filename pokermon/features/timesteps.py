@@ -0,0 +1,286 @@
+# The per-timestep features of a hand, built in a single pass over its events
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from pokermon.features.action import LastAction, NextAction, encode_action_amount
+from pokermon.features.player_state import PlayerState, make_current_player_states
+from pokermon.features.public_state import PublicState, make_public_state
+from pokermon.features.rewards import Reward, make_rewards_from_actions
+from pokermon.poker.board import Board
+from pokermon.poker.game import BIG_BLIND_AMOUNT, Action, GameView, Move, Street
+from pokermon.poker.hands import HoleCards
+from pokermon.poker.result import Result
+
+
+@dataclass(frozen=True)
+class Timesteps:
+    """
+    The features of each timestep of a hand (see iter_game_states), as made by
+    make_public_states, make_player_states, make_last_actions, make_next_actions
+    and make_rewards.
+    """
+
+    public_states: List[PublicState]
+    player_states: List[PlayerState]
+    last_actions: List[LastAction]
+
+    # The next action of each timestep that has one (every timestep, if the hand is
+    # over)
+    next_actions: List[NextAction]
+
+    # Only known once the hand is over
+    rewards: Optional[List[Reward]] = None
+
+
+@dataclass(frozen=True)
+class PublicTimesteps:
+    """
+    The features of each timestep of a hand that don't depend on whose point of view
+    it is seen from, which can be shared by every player's Timesteps.
+    """
+
+    public_states: List[PublicState]
+    last_actions: List[LastAction]
+    next_actions: List[NextAction]
+
+    # The street and current player of each timestep
+    streets: List[Street]
+    current_players: List[int]
+
+    # The action made at each timestep that has one
+    actions: List[Action]
+
+
+@dataclass(frozen=True)
+class _Timestep:
+    street: Street
+    current_player: int
+    public_state: PublicState
+
+    # The action made at this timestep, and its encoding (None at the current
+    # timestep of a hand that isn't over)
+    action: Optional[Action]
+    last_action: Optional[LastAction]
+    next_action: Optional[NextAction]
+
+
+def make_timesteps(
+    player_index: int,
+    game: GameView,
+    hole_cards: HoleCards,
+    board: Board,
+    result: Optional[Result] = None,
+    public_timesteps: Optional[PublicTimesteps] = None,
+) -> Timesteps:
+    """
+    Build the features of every timestep of a hand, from the point of view of the
+    given player.  The public features are built by make_public_timesteps, unless
+    they are given.  Rewards are only made if the result of the hand is given.
+    """
+
+    if public_timesteps is None:
+        public_timesteps = make_public_timesteps(game, board)
+
+    current_player_states = make_current_player_states(
+        hole_cards,
+        board,
+        {
+            street
+            for street, current_player in zip(
+                public_timesteps.streets, public_timesteps.current_players
+            )
+            if current_player == player_index
+        },
+    )
+
+    player_states = [
+        (
+            current_player_states[street]
+            if current_player == player_index
+            else PlayerState(
+                is_current_player=False,
+                current_player_offset=(current_player - player_index),
+            )
+        )
+        for street, current_player in zip(
+            public_timesteps.streets, public_timesteps.current_players
+        )
+    ]
+
+    return Timesteps(
+        public_states=public_timesteps.public_states,
+        player_states=player_states,
+        last_actions=public_timesteps.last_actions,
+        next_actions=public_timesteps.next_actions,
+        rewards=(
+            make_rewards_from_actions(
+                public_timesteps.actions, game.num_players(), result
+            )
+            if result is not None
+            else None
+        ),
+    )
+
+
+def make_public_timesteps(game: GameView, board: Board) -> PublicTimesteps:
+    """
+    Build the public features of every timestep of a hand with a single pass over
+    its events.  The running state of the game is updated as each event is read,
+    rather than viewing the game at each timestep.
+    """
+
+    num_players = game.num_players()
+    starting_stacks = game.starting_stacks()
+
+    street = Street.PREFLOP
+    boards: Dict[Street, Board] = {street: board.at_street(street)}
+
+    amount_added_in_street = [0] * num_players
+    amount_added_total = [0] * num_players
+    is_folded = [False] * num_players
+
+    # The total bet of the most recent action on this street, and the player who
+    # made it (None if no action has been made on this street yet)
+    street_total_bet: Optional[int] = None
+    street_last_player: Optional[int] = None
+    last_raise_amount = 0
+
+    timesteps: List[_Timestep] = []
+
+    def add_timestep(action: Optional[Action]) -> None:
+        stack_sizes = [
+            starting_stack - amount_added
+            for starting_stack, amount_added in zip(starting_stacks, amount_added_total)
+        ]
+        is_all_in = [stack_size == 0 for stack_size in stack_sizes]
+
+        # The first player after the last to act on this street who can still act
+        starting_player = (
+            0 if street_last_player is None else (street_last_player + 1) % num_players
+        )
+        current_player = -1
+        for i in range(num_players):
+            player = (starting_player + i) % num_players
+            if not is_folded[player] and not is_all_in[player]:
+                current_player = player
+                break
+
+        current_bet = max(amount_added_in_street)
+        pot_size = sum(amount_added_total)
+        min_bet_amount = max(BIG_BLIND_AMOUNT, last_raise_amount)
+
+        public_state = make_public_state(
+            street=street,
+            board=boards[street],
+            current_player=current_player,
+            is_folded=is_folded,
+            is_all_in=is_all_in,
+            stack_sizes=stack_sizes,
+            amount_to_call=[current_bet - amount for amount in amount_added_in_street],
+            pot_size=pot_size,
+            min_raise_amount=min_bet_amount,
+        )
+
+        last_action = None
+        next_action = None
+
+        if action is not None:
+            stack_size = stack_sizes[current_player]
+            raise_amount = action.total_bet - current_bet
+            action_encoded = encode_action_amount(
+                action,
+                min_raise=min(
+                    stack_size,
+                    current_bet
+                    + min_bet_amount
+                    - amount_added_in_street[current_player],
+                ),
+                remaining_stack=stack_size,
+            )
+
+            last_action = LastAction(
+                move=action.move.value,
+                action_encoded=action_encoded,
+                amount_added=action.amount_added,
+                amount_added_percent_of_remaining=action.amount_added / stack_size,
+                amount_raised=raise_amount,
+                amount_raised_percent_of_pot=raise_amount / pot_size,
+            )
+            next_action = NextAction(
+                move=action.move.value,
+                action_encoded=action_encoded,
+                amount_added=action.amount_added,
+                new_total_bet=action.total_bet,
+                amount_raised=raise_amount,
+            )
+
+        timesteps.append(
+            _Timestep(
+                street=street,
+                current_player=current_player,
+                public_state=public_state,
+                action=action,
+                last_action=last_action,
+                next_action=next_action,
+            )
+        )
+
+    for event in game.events():
+
+        if isinstance(event, Street):
+            # Re-dealing the current street continues it
+            if event != street:
+                street = event
+                boards[street] = board.at_street(street)
+                amount_added_in_street = [0] * num_players
+                street_total_bet = None
+                street_last_player = None
+                last_raise_amount = 0
+            continue
+
+        # Since Small/Big blinds are forced actions, we don't generate timesteps for
+        # them
+        if event.move != Move.SMALL_BLIND and event.move != Move.BIG_BLIND:
+            add_timestep(event)
+
+        player = event.player_index
+        amount_added_in_street[player] += event.amount_added
+        amount_added_total[player] += event.amount_added
+        if event.move == Move.FOLD:
+            is_folded[player] = True
+
+        # The last raise is the difference between the current bet and the most
+        # recent different bet on this street (or the bet itself if there is none)
+        if street_total_bet is None:
+            last_raise_amount = event.total_bet
+        elif event.total_bet != street_total_bet:
+            last_raise_amount = event.total_bet - street_total_bet
+
+        street_total_bet = event.total_bet
+        street_last_player = player
+
+    # If the hand isn't over, the current state is the last timestep, though its
+    # action isn't known yet
+    if street != Street.HAND_OVER:
+        add_timestep(None)
+
+    # We need a dummy entry for the first voluntary action
+    last_actions = [
+        LastAction(
+            move=-1,
+            action_encoded=-1,
+            amount_added=-1,
+            amount_added_percent_of_remaining=-1,
+            amount_raised=-1,
+            amount_raised_percent_of_pot=-1,
+        )
+    ] + [t.last_action for t in timesteps[:-1] if t.last_action is not None]
+
+    return PublicTimesteps(
+        public_states=[t.public_state for t in timesteps],
+        last_actions=last_actions,
+        next_actions=[t.next_action for t in timesteps if t.next_action is not None],
+        streets=[t.street for t in timesteps],
+        current_players=[t.current_player for t in timesteps],
+        actions=[t.action for t in timesteps if t.action is not None],
+    )
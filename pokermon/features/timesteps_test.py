@@ -0,0 +1,85 @@
+import copy
+import dataclasses
+import random
+from typing import List
+
+import pytest
+from pytest import approx
+
+import pyholdthem
+from pokermon.ai.policy import Policy
+from pokermon.ai.random_policy import RandomPolicy
+from pokermon.features.action import make_last_actions, make_next_actions
+from pokermon.features.player_state import PlayerState, make_player_states
+from pokermon.features.public_state import make_public_states
+from pokermon.features.rewards import make_rewards
+from pokermon.features.timesteps import make_timesteps
+from pokermon.poker import dealer
+from pokermon.poker.game import Street
+from pokermon.simulate.simulate import simulate
+
+
+@pytest.fixture
+def no_hand_features_cache():
+    # Otherwise, the second simulation of a hand's features is just the first
+    # one, read from the cache
+    pyholdthem.set_hand_features_cache_size(0)
+    yield
+    pyholdthem.set_hand_features_cache_size(100_000)  # The default
+
+
+def assert_player_states_match(
+    player_states: List[PlayerState], expected: List[PlayerState]
+) -> None:
+    """The odds of the states are simulated, so only have to be close"""
+    assert len(player_states) == len(expected)
+    for player_state, expected_state in zip(player_states, expected):
+        for field in dataclasses.fields(PlayerState):
+            value = getattr(player_state, field.name)
+            expected_value = getattr(expected_state, field.name)
+            if isinstance(expected_value, float):
+                assert value == approx(expected_value, abs=0.1), field.name
+            else:
+                assert value == expected_value, field.name
+
+
+def test_timesteps_match_per_feature_builders(no_hand_features_cache) -> None:
+    random.seed(7)
+
+    for _ in range(10):
+        players: List[Policy] = [RandomPolicy(), RandomPolicy(), RandomPolicy()]
+        starting_stacks = [random.randint(10, 300) for _ in players]
+        deal = dealer.deal_cards(len(players))
+        game, result = simulate(players, starting_stacks, deal)
+
+        # Every finished hand, and the hand as it stood at a point part way
+        # through
+        views = [game.view(), game.view(random.randint(3, game.timestamp() - 1))]
+
+        for player_index in range(len(players)):
+            for view in views:
+                hole_cards = deal.hole_cards[player_index]
+                is_over = view.street() == Street.HAND_OVER
+
+                timesteps = make_timesteps(
+                    player_index,
+                    view,
+                    hole_cards,
+                    deal.board,
+                    copy.deepcopy(result) if is_over else None,
+                )
+
+                assert timesteps.public_states == make_public_states(view, deal.board)
+                assert_player_states_match(
+                    timesteps.player_states,
+                    make_player_states(player_index, view, hole_cards, deal.board),
+                )
+                assert timesteps.last_actions == make_last_actions(view)
+
+                if is_over:
+                    assert timesteps.next_actions == make_next_actions(view)
+                    assert timesteps.rewards == make_rewards(
+                        view, copy.deepcopy(result)
+                    )
+                else:
+                    assert timesteps.rewards is None
@@ -1,5 +1,5 @@
 import dataclasses
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import tensorflow as tf  # type: ignore
 from tensorflow.python.feature_column import feature_column_v2 as fc  # type: ignore
@@ -8,6 +8,8 @@ from tensorflow.python.feature_column.feature_column_v2 import (  # type: ignore
 )
 from tensorflow.python.ops import parsing_ops  # type: ignore
 
+from pokermon.features import columnar
+
 FeatureTensors = Dict[str, tf.Tensor]
 TargetTensors = Dict[str, tf.Tensor]
 
@@ -60,8 +62,7 @@ class FeatureConfig:
         fs.update(seq)
         return fs
 
-    def make_features_and_target_tensors(self, serialized_examples_tensor):
-
+    def _parse_specs(self):
         context_features = fc.make_parse_example_spec_v2(self.context_features)
         context_targets = fc.make_parse_example_spec_v2(self.context_targets)
         context_data = {}
@@ -74,18 +75,52 @@ class FeatureConfig:
         sequence_data.update(sequence_features)
         sequence_data.update(sequence_targets)
 
+        return context_data, sequence_data
+
+    def _split_features_and_targets(self, tensors):
+        feature_names = fc.make_parse_example_spec_v2(
+            self.context_features + self.sequence_features
+        )
+        target_names = fc.make_parse_example_spec_v2(
+            self.context_targets + self.sequence_targets
+        )
+
+        fs = {name: t for name, t in tensors.items() if name in feature_names}
+        ts = {name: t for name, t in tensors.items() if name in target_names}
+
+        return fs, ts
+
+    def make_features_and_target_tensors(self, serialized_examples_tensor):
+
+        context_data, sequence_data = self._parse_specs()
+
         ctx, seq, _ = parsing_ops.parse_sequence_example(
             serialized_examples_tensor,
             context_features=context_data,
             sequence_features=sequence_data,
         )
 
-        fs = {}
-        fs.update({name: t for name, t in ctx.items() if name in context_features})
-        fs.update({name: t for name, t in seq.items() if name in sequence_features})
-
-        ts = {}
-        ts.update({name: t for name, t in ctx.items() if name in context_targets})
-        ts.update({name: t for name, t in seq.items() if name in sequence_targets})
-
-        return fs, ts
+        tensors = {}
+        tensors.update(ctx)
+        tensors.update(seq)
+
+        return self._split_features_and_targets(tensors)
+
+    def make_columnar_dataset(
+        self,
+        paths: List[str],
+        batch_size: int,
+        shuffle: bool = False,
+        seed: Optional[int] = None,
+    ) -> tf.data.Dataset:
+        """
+        A dataset of the features and targets of batches of examples read from
+        columnar shards, which are the same as make_features_and_target_tensors
+        makes from the same examples when serialized.
+        """
+
+        context_data, sequence_data = self._parse_specs()
+
+        return columnar.make_dataset(
+            paths, context_data, sequence_data, batch_size, shuffle=shuffle, seed=seed
+        ).map(self._split_features_and_targets)
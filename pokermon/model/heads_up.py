@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import List, Tuple
 
 import numpy as np  # type: ignore
 import tensorflow as tf  # type: ignore
@@ -13,7 +13,7 @@ from pokermon.model import rnn
 from pokermon.model.feature_config import FeatureTensors, TargetTensors
 from pokermon.model.model_features import make_feature_config
 from pokermon.model.rnn import policy_vector_size
-from pokermon.model.utils import ensure_all_dense, select_proportionally
+from pokermon.model.utils import ensure_all_dense, make_step_mask, select_proportionally
 from pokermon.poker.board import Board
 from pokermon.poker.game import Action, GameView, Street
 from pokermon.poker.hands import HoleCards
@@ -51,7 +51,7 @@ class HeadsUpModel(Policy):
         # Create the action probabilities at the last time step
         action_probs: np.Array = self._next_action_policy(
             serialized_example_tensor
-        ).numpy()
+        ).numpy()[0]
         action_index = select_proportionally(action_probs)
         return make_action_from_encoded(action_index=action_index, game=game)
 
@@ -67,6 +67,9 @@ class HeadsUpModel(Policy):
         [batch_size, time]
         """
 
+        # Hands in a batch are padded to the length of the longest one
+        is_step = make_step_mask(target_tensors["public_state__num_players_remaining"])
+
         # TODO: This seems weird/unnecessary...?
         target_tensors = ensure_all_dense(target_tensors)
 
@@ -91,7 +94,12 @@ class HeadsUpModel(Policy):
             tf.cast(0, tf.int64),
             "pot size negatve",
         )
-        num_players = target_tensors["public_state__num_players_remaining"]
+        # Padded steps have no players
+        num_players = tf.where(
+            is_step,
+            target_tensors["public_state__num_players_remaining"],
+            tf.cast(2, tf.int64),
+        )
         tf.debugging.assert_greater(
             num_players,
             tf.cast(1, tf.int64),
@@ -140,33 +148,56 @@ class HeadsUpModel(Policy):
             player_id, game, hole_cards, board, result
         )
 
+        return example, self.train_on_examples([example])
+
+    def train_on_examples(self, examples: List[tf.train.SequenceExample]) -> tf.Tensor:
+        """
+        Take a single gradient step on a batch of forward-backward examples, of any
+        size, and return its mean loss.
+        """
         _, loss = self._update_weights(
-            tf.convert_to_tensor([example.SerializeToString()])
+            tf.convert_to_tensor([example.SerializeToString() for example in examples])
         )
 
-        return example, loss
+        return loss
 
+    # The batch dimension is left unknown, so batches of any size share a trace
     @tf.function(
-        input_signature=[tf.TensorSpec(shape=(1,), dtype=tf.string)], autograph=False
+        input_signature=[tf.TensorSpec(shape=(None,), dtype=tf.string)],
+        autograph=False,
     )
     def _next_action_policy(self, serialized_examples):
+        """The action probabilities at the last step of each example [batch, action]"""
         fs = self.feature_config.make_feature_tensors(serialized_examples)
-        # Create the action probabilities at the last time step
-        return self.action_probs(fs)[0, -1, :]
 
-    @tf.function(
-        input_signature=[tf.TensorSpec(shape=(1,), dtype=tf.string)], autograph=False
-    )
-    def _update_weights(self, serialized_examples):
-        with tf.GradientTape() as tape:
-            (
-                feature_tensors,
-                target_tensors,
-            ) = self.feature_config.make_features_and_target_tensors(
-                serialized_examples
-            )
+        # Examples are padded to the length of the longest one
+        num_steps = tf.reduce_sum(
+            tf.cast(make_step_mask(fs["last_action__action_encoded"]), tf.int32),
+            axis=[1, 2],
+        )
+        return tf.gather(self.action_probs(fs), num_steps - 1, batch_dims=1)
+
+    def mean_loss(
+        self, feature_tensors: FeatureTensors, target_tensors: TargetTensors
+    ) -> tf.Tensor:
+        """The mean loss of the steps of a batch, not counting padded steps"""
+        is_step = tf.squeeze(
+            make_step_mask(target_tensors["public_state__num_players_remaining"]), -1
+        )
+        return tf.reduce_sum(
+            self.loss(feature_tensors, target_tensors)
+        ) / tf.reduce_sum(tf.cast(is_step, tf.float32))
 
-            loss_value = tf.reduce_mean(self.loss(feature_tensors, target_tensors))
+    def update_weights(
+        self, feature_tensors: FeatureTensors, target_tensors: TargetTensors
+    ):
+        """
+        Take a gradient step on a batch of features and targets, as made by
+        FeatureConfig.make_features_and_target_tensors.  Returns the gradients and
+        the mean loss of the batch.
+        """
+        with tf.GradientTape() as tape:
+            loss_value = self.mean_loss(feature_tensors, target_tensors)
 
             gradients = tape.gradient(loss_value, self.model.trainable_variables)
             self.optimizer.apply_gradients(
@@ -174,3 +205,15 @@ class HeadsUpModel(Policy):
             )
 
         return gradients, loss_value
+
+    @tf.function(
+        input_signature=[tf.TensorSpec(shape=(None,), dtype=tf.string)],
+        autograph=False,
+    )
+    def _update_weights(self, serialized_examples):
+        (
+            feature_tensors,
+            target_tensors,
+        ) = self.feature_config.make_features_and_target_tensors(serialized_examples)
+
+        return self.update_weights(feature_tensors, target_tensors)
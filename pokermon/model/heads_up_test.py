@@ -124,3 +124,58 @@ def test_loss():
     batch_size = 1
     num_steps = 9
     assert loss.shape == [batch_size, num_steps]
+
+
+def test_batches_share_a_trace():
+    model = heads_up.HeadsUpModel("HeadsUp")
+
+    deal = FullDeal(
+        hole_cards=[mkhand("AcAd"), mkhand("AsKh")],
+        board=Board(flop=mkflop("KsJs3d"), turn=mkcard("7s"), river=mkcard("6s")),
+    )
+
+    game = GameRunner(starting_stacks=[300, 400])
+    game.start_game()
+    short_example = make_forward_example(
+        0, game.game_view(), deal.hole_cards[0], deal.board
+    )
+
+    game.bet_raise(to=10)
+    game.call()
+    game.check()
+    long_example = make_forward_example(
+        1, game.game_view(), deal.hole_cards[1], deal.board
+    )
+
+    def next_action_policy(examples):
+        return model._next_action_policy(
+            tf.convert_to_tensor([example.SerializeToString() for example in examples])
+        ).numpy()
+
+    # Each example's policy is taken at its own last step, despite the padding
+    short_probs = next_action_policy([short_example])
+    long_probs = next_action_policy([long_example])
+    assert_array_almost_equal(
+        next_action_policy([short_example, long_example]),
+        np.concatenate([short_probs, long_probs]),
+    )
+
+    game.fold()
+    results = result.get_result(deal, game.game_view())
+    examples = [
+        make_forward_backward_example(
+            player_index,
+            game.game_view(),
+            deal.hole_cards[player_index],
+            deal.board,
+            results,
+        )
+        for player_index in range(2)
+    ]
+    assert model._next_action_policy.experimental_get_tracing_count() == 1
+
+    # The first update is traced again, once the optimizer's variables exist
+    model.train_on_examples(examples[:1])
+    num_traces = model._update_weights.experimental_get_tracing_count()
+    model.train_on_examples(examples)
+    assert model._update_weights.experimental_get_tracing_count() == num_traces
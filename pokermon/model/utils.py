@@ -17,3 +17,16 @@ def ensure_dense(t):
 
 def ensure_all_dense(tensor_dict):
     return {k: ensure_dense(t) for k, t in tensor_dict.items()}
+
+
+def make_step_mask(t):
+    """
+    Whether each step of a batch of sequence features is one of its examples'
+    steps, rather than padding.  [batch, time, 1]
+    """
+    if isinstance(t, tf.sparse.SparseTensor):
+        return tf.sparse.to_dense(
+            tf.SparseTensor(t.indices, tf.ones_like(t.values, tf.bool), t.dense_shape)
+        )
+    else:
+        return tf.ones_like(t, tf.bool)
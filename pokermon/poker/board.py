@@ -52,6 +52,9 @@ class Board:
         else:
             return tuple()
 
+    def card_indices(self) -> List[int]:
+        return [c.index() for c in self.cards()]
+
     def __len__(self):
         if self.flop is None:
             return 0
@@ -1,10 +1,8 @@
 from __future__ import annotations
 
 import functools
-from dataclasses import dataclass
-from typing import Dict, List, Tuple
-
-import regex as regex  # type: ignore
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
 
 from pokermon.poker.ordered_enum import OrderedEnum
 
@@ -32,15 +30,24 @@ class Rank(OrderedEnum):
     ACE = 14
 
 
+NUM_CARDS = 52
+
+
 @dataclass(order=True, frozen=True)
 class Card:
     rank: Rank
     suit: Suit
 
+    # The integer (0-51) representation of this card, computed once on creation
+    _index: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(
+            self, "_index", (self.rank.value - 2) * 4 + (self.suit.value - 1)
+        )
+
     def index(self) -> int:
-        v = self.rank.value - 2
-        s = self.suit.value - 1
-        return v * 4 + s
+        return self._index
 
 
 RANK_SUIT_MAP: Dict[Rank, Dict[Suit, Card]] = {}
@@ -52,8 +59,79 @@ for rank in Rank:
         card = Card(rank=rank, suit=suit)
         RANK_SUIT_MAP[rank][suit] = card
 
+# Ordered by index, so ALL_CARDS[card.index()] == card
 ALL_CARDS = tuple([c for r, d in RANK_SUIT_MAP.items() for c in d.values()])
 
+
+def card_from_index(index: int) -> Card:
+    return ALL_CARDS[index]
+
+
+class CardSet:
+    """
+    An immutable set of cards, stored as a 52-bit mask of card indices.
+    """
+
+    __slots__ = ("mask",)
+
+    def __init__(self, mask: int = 0):
+        self.mask = mask
+
+    @staticmethod
+    def from_indices(indices: Iterable[int]) -> CardSet:
+        mask = 0
+        for i in indices:
+            mask |= 1 << i
+        return CardSet(mask)
+
+    @staticmethod
+    def from_cards(cards: Iterable[Card]) -> CardSet:
+        return CardSet.from_indices(c.index() for c in cards)
+
+    def __contains__(self, card: Union[Card, int]) -> bool:
+        index = card if isinstance(card, int) else card.index()
+        return bool(self.mask >> index & 1)
+
+    def __len__(self) -> int:
+        return bin(self.mask).count("1")
+
+    def __iter__(self) -> Iterator[int]:
+        """Iterate over the indices of the cards in the set, in increasing order"""
+        mask = self.mask
+        while mask:
+            lowest = mask & -mask
+            yield lowest.bit_length() - 1
+            mask ^= lowest
+
+    def __or__(self, other: CardSet) -> CardSet:
+        return CardSet(self.mask | other.mask)
+
+    def __and__(self, other: CardSet) -> CardSet:
+        return CardSet(self.mask & other.mask)
+
+    def __sub__(self, other: CardSet) -> CardSet:
+        return CardSet(self.mask & ~other.mask)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, CardSet) and self.mask == other.mask
+
+    def __hash__(self) -> int:
+        return hash(self.mask)
+
+    def __repr__(self) -> str:
+        return f"CardSet({[ALL_CARDS[i] for i in self]})"
+
+    def intersects(self, other: CardSet) -> bool:
+        return self.mask & other.mask != 0
+
+    def cards(self) -> List[Card]:
+        return [ALL_CARDS[i] for i in self]
+
+    def complement(self) -> CardSet:
+        """The set of all cards that are not in this set"""
+        return CardSet(~self.mask & ((1 << NUM_CARDS) - 1))
+
+
 RANK_MAP = {
     "A": Rank.ACE,
     "K": Rank.KING,
@@ -90,8 +168,6 @@ INVERSE_RANK_MAP = {
 
 SUIT_MAP = {"S": Suit.SPADES, "C": Suit.CLUBS, "D": Suit.DIAMONDS, "H": Suit.HEARTS}
 
-_card_regex = regex.compile("^(([AKQJT]|10|[2-9])([SHCD]))+$")
-
 
 def sorted_cards(cards: Tuple[Card, ...]) -> Tuple[Card, ...]:
     return tuple(sorted(cards, reverse=True))
@@ -107,13 +183,22 @@ def mkcard(s: str) -> Card:
 def mkcards(s: str) -> List[Card]:
     s = s.upper()
 
-    match = _card_regex.match(s)
-
-    if not match:
+    if not s:
         raise Exception("Invaid Cards")
 
     cards = []
 
-    for rank_code, suit_code in zip(match.captures(2), match.captures(3)):
+    i = 0
+    while i < len(s):
+        # Ten may be written as either T or 10
+        rank_length = 2 if s.startswith("10", i) else 1
+        rank_code = s[i : i + rank_length]
+        suit_code = s[i + rank_length : i + rank_length + 1]
+
+        if rank_code not in RANK_MAP or suit_code not in SUIT_MAP:
+            raise Exception("Invaid Cards")
+
         cards.append(RANK_SUIT_MAP[RANK_MAP[rank_code]][SUIT_MAP[suit_code]])
+        i += rank_length + 1
+
     return cards
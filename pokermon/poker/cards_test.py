@@ -1,6 +1,18 @@
+import pytest
+
 from pokermon.poker.board import Board, mkflop
-from pokermon.poker.cards import Card, Rank, Suit, mkcard
+from pokermon.poker.cards import (
+    ALL_CARDS,
+    Card,
+    CardSet,
+    Rank,
+    Suit,
+    card_from_index,
+    mkcard,
+    mkcards,
+)
 from pokermon.poker.game import Street
+from pokermon.poker.hands import ALL_HANDS, hole_cards_from_indices, mkhand
 
 
 def test_board_at_street() -> None:
@@ -26,3 +38,45 @@ def test_board_at_street() -> None:
         turn=None,
         river=None,
     )
+
+
+def test_mkcards() -> None:
+    assert mkcards("AdKs") == [
+        Card(rank=Rank.ACE, suit=Suit.DIAMONDS),
+        Card(rank=Rank.KING, suit=Suit.SPADES),
+    ]
+    assert mkcards("10h9c") == mkcards("Th9C")
+
+    for invalid in ["", "A", "Ax", "1s", "Ad10"]:
+        with pytest.raises(Exception):
+            mkcards(invalid)
+
+
+def test_card_indices() -> None:
+    for i, card in enumerate(ALL_CARDS):
+        assert card.index() == i
+        assert card_from_index(i) == card
+
+    for i, hand in enumerate(ALL_HANDS):
+        assert hand.index() == i
+        first, second = hand.cards
+        assert hole_cards_from_indices(first.index(), second.index()) == hand
+        assert hole_cards_from_indices(second.index(), first.index()) == hand
+
+
+def test_card_set() -> None:
+    hand = CardSet.from_cards(mkhand("AdKs").cards)
+    board = CardSet.from_cards(mkcards("Kd5h7s"))
+
+    assert len(hand) == 2
+    assert mkcard("Ad") in hand
+    assert mkcard("Ad").index() in hand
+    assert mkcard("Kd") not in hand
+    assert list(hand) == sorted(c.index() for c in mkcards("AdKs"))
+
+    assert not hand.intersects(board)
+    assert len(hand | board) == 5
+    assert (hand | board) - board == hand
+    assert (hand | board) & board == board
+    assert len(hand.complement()) == 50
+    assert board.cards() == sorted(mkcards("Kd5h7s"), key=lambda c: c.index())
@@ -1,23 +1,25 @@
 import random
-from typing import Set
 
 from pokermon.poker import cards, hands
 from pokermon.poker.board import Board
-from pokermon.poker.cards import Card
+from pokermon.poker.cards import CardSet
 from pokermon.poker.deal import FullDeal
 
 
 def deal_cards(num_players: int) -> FullDeal:
 
     # First, select the preflop hands
-    preflop_hands = random.sample(hands.ALL_HANDS, num_players)
+    preflop_hands = [
+        hands.ALL_HANDS[i]
+        for i in random.sample(range(len(hands.ALL_HANDS)), num_players)
+    ]
 
     # Then, select the board
-    selected_cards: Set[Card] = set()
-    for hand in preflop_hands:
-        selected_cards.update(hand.cards)
-    remaining_cards = [c for c in cards.ALL_CARDS if c not in selected_cards]
-    board_cards = random.sample(remaining_cards, 5)
+    selected_cards = CardSet.from_indices(
+        i for hand in preflop_hands for i in hands.HAND_CARD_INDICES[hand.index()]
+    )
+    remaining_cards = list(selected_cards.complement())
+    board_cards = [cards.ALL_CARDS[i] for i in random.sample(remaining_cards, 5)]
 
     return FullDeal(
         hole_cards=preflop_hands,
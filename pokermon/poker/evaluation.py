@@ -2,6 +2,9 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from functools import total_ordering
+from typing import List, Sequence, Tuple
+
+import numpy as np  # type: ignore
 
 import pyholdthem
 from pokermon.poker.board import Board
@@ -36,8 +39,42 @@ class EvaluationResult:
 
 
 def evaluate_hand(hole_cards: HoleCards, board: Board) -> EvaluationResult:
-    (hand, kicker) = pyholdthem.evaluate_hand_from_indices(
-        hole_cards.index(), [c.index() for c in board.cards()]
+    hand, kicker = pyholdthem.evaluate_hand_from_indices(
+        hole_cards.index(), board.card_indices()
     )
 
     return EvaluationResult(hand_type=HandType(hand), kicker=kicker)
+
+
+def evaluate_hands(
+    hole_cards: Sequence[HoleCards], board: Board
+) -> List[EvaluationResult]:
+    """
+    Evaluate several hands against the same board in a single call.
+    """
+    hole_indices = np.array([h.index() for h in hole_cards], dtype=np.int32)
+    board_indices = np.tile(
+        np.array(board.card_indices(), dtype=np.int32), (len(hole_cards), 1)
+    )
+
+    hand_types, kickers = evaluate_hands_batch(hole_indices, board_indices)
+
+    return [
+        EvaluationResult(hand_type=HandType(int(hand)), kicker=int(kicker))
+        for hand, kicker in zip(hand_types, kickers)
+    ]
+
+
+def evaluate_hands_batch(
+    hole_indices: np.ndarray, board_indices: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Evaluate N hands given as arrays of indices:
+      hole_indices: Array of shape [N] of hole card indices (see HoleCards.index)
+      board_indices: Array of shape [N, board_size] of card indices (see Card.index)
+    Returns a pair of int32 arrays of shape [N]: (hand_types, kickers)
+    """
+    return pyholdthem.evaluate_hands_batch(
+        np.ascontiguousarray(hole_indices, dtype=np.int32),
+        np.ascontiguousarray(board_indices, dtype=np.int32),
+    )
@@ -1,6 +1,13 @@
-from pokermon.poker.board import Board, mkflop
+import numpy as np  # type: ignore
+
+from pokermon.poker.board import Board, Street, mkboard, mkflop
 from pokermon.poker.cards import mkcard
-from pokermon.poker.evaluation import EvaluationResult, evaluate_hand
+from pokermon.poker.evaluation import (
+    EvaluationResult,
+    evaluate_hand,
+    evaluate_hands,
+    evaluate_hands_batch,
+)
 from pokermon.poker.hands import HandType, mkhand
 
 
@@ -48,3 +55,28 @@ def sanity_tests() -> None:
     assert evaluate_hand(mkhand("7d8s"), Board(flop=mkflop("AdAcJs"))) > evaluate_hand(
         mkhand("8s6h"), Board(flop=mkflop("AdAcJs"))
     )
+
+
+def test_evaluate_hands() -> None:
+    hands = [mkhand("AcKc"), mkhand("2c7d"), mkhand("AdAc")]
+    board = mkboard("TcJcQc5h7s")
+
+    assert evaluate_hands(hands, board) == [
+        evaluate_hand(hand, board) for hand in hands
+    ]
+
+
+def test_evaluate_hands_batch() -> None:
+    hands = [mkhand("AcKc"), mkhand("7d8s")]
+    boards = [mkboard("TcJcQc"), mkboard("5h6cJs4d")]
+
+    hand_types, kickers = evaluate_hands_batch(
+        np.array([hand.index() for hand in hands]),
+        np.array([boards[0].card_indices(), boards[1].card_indices()[:3]]),
+    )
+
+    assert list(hand_types) == [HandType.STRAIGHT_FLUSH.value, HandType.HIGH.value]
+    for hand, board, hand_type, kicker in zip(hands, boards, hand_types, kickers):
+        assert evaluate_hand(hand, board.at_street(Street.FLOP)) == EvaluationResult(
+            hand_type=HandType(hand_type), kicker=kicker
+        )
@@ -1,10 +1,24 @@
 # All Amounts are relative to the small blind.
 
+import functools
 import random
-from collections import defaultdict
-from dataclasses import dataclass, field
-from functools import lru_cache
-from typing import Dict, Iterable, List, Optional, Union
+from array import array
+from collections import OrderedDict, defaultdict, namedtuple
+from dataclasses import dataclass, field, replace
+from typing import (
+    Any,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np  # type: ignore
 
 from pokermon.poker.board import Street
 from pokermon.poker.ordered_enum import OrderedEnum
@@ -59,8 +73,285 @@ class Action:
 # A street, as an event, represents the dealing of that street.
 Event = Union[Action, Street]
 
+_MOVES: Dict[int, Move] = {move.value: move for move in Move}
+_STREETS: Dict[int, Street] = {street.value: street for street in Street}
 
-cache = lru_cache(2048)
+
+class EventLog:
+    """
+    A compact, array-backed list of events.
+
+    Events are stored as parallel integer columns (one row per event) instead of
+    as Action objects, and Actions are only created when an event is read.  A
+    street is stored as a row with a player index of -1 and a move of
+    -street.value, and the offsets of all street rows are kept separately.
+
+    An EventLog can be used anywhere a list of events is used (including as the
+    events of a Game), and the columns can be read as NumPy arrays to scan a whole
+    hand at once.
+    """
+
+    def __init__(self, events: Iterable[Event] = ()):
+        self._player_index = array("b")
+        self._move = array("b")
+        self._amount_added = array("i")
+        self._total_bet = array("i")
+        self._street_offsets = array("i")
+
+        for event in events:
+            self.append(event)
+
+    def append(self, event: Event) -> None:
+        if isinstance(event, Street):
+            self._street_offsets.append(len(self._move))
+            self._player_index.append(-1)
+            self._move.append(-event.value)
+            self._amount_added.append(0)
+            self._total_bet.append(0)
+        else:
+            self._player_index.append(event.player_index)
+            self._move.append(event.move.value)
+            self._amount_added.append(event.amount_added)
+            self._total_bet.append(event.total_bet)
+
+    def _event(self, i: int) -> Event:
+        move = self._move[i]
+
+        if move < 0:
+            return _STREETS[-move]
+
+        return Action(
+            player_index=self._player_index[i],
+            move=_MOVES[move],
+            amount_added=self._amount_added[i],
+            total_bet=self._total_bet[i],
+        )
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._event(j) for j in range(*i.indices(len(self)))]
+
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("EventLog index out of range")
+
+        return self._event(i)
+
+    def __len__(self) -> int:
+        return len(self._move)
+
+    def __iter__(self) -> Iterator[Event]:
+        for i in range(len(self)):
+            yield self._event(i)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, EventLog):
+            return (
+                self._player_index == other._player_index
+                and self._move == other._move
+                and self._amount_added == other._amount_added
+                and self._total_bet == other._total_bet
+            )
+        if isinstance(other, Sequence):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"EventLog({list(self)})"
+
+    #
+    # Columns
+    #
+
+    def player_indices(self) -> np.ndarray:
+        """The player index of each event (-1 for streets)"""
+        return np.array(self._player_index, dtype=np.int8)
+
+    def moves(self) -> np.ndarray:
+        """The move value of each event (-street.value for streets)"""
+        return np.array(self._move, dtype=np.int8)
+
+    def amounts_added(self) -> np.ndarray:
+        return np.array(self._amount_added, dtype=np.int32)
+
+    def total_bets(self) -> np.ndarray:
+        return np.array(self._total_bet, dtype=np.int32)
+
+    def street_offsets(self) -> np.ndarray:
+        """The index of each street event"""
+        return np.array(self._street_offsets, dtype=np.int32)
+
+    def action_mask(self) -> np.ndarray:
+        return self.moves() > 0
+
+    def amount_added_per_player(self, num_players: int) -> np.ndarray:
+        """The total amount each player added to the pot over all events"""
+        return np.bincount(
+            self.player_indices()[self.action_mask()],
+            weights=self.amounts_added()[self.action_mask()],
+            minlength=num_players,
+        ).astype(np.int64)
+
+
+# The maximum number of GameView results that are memoized per game
+VIEW_CACHE_SIZE = 2048
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+_MISSING = object()
+
+
+class ViewCache:
+    """
+    A bounded, least-recently-used memo of the GameView results of a single game.
+
+    The cache belongs to its game (so it is dropped along with it) and is cleared
+    whenever an event is added to the game.
+    """
+
+    def __init__(self, maxsize: int = VIEW_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        """Return the memoized result for the key, or _MISSING if there is none."""
+        result = self._results.get(key, _MISSING)
+
+        if result is _MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._results.move_to_end(key)
+
+        return result
+
+    def put(self, key: Hashable, result: Any) -> None:
+        self._results[key] = result
+
+        if len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    def clear(self) -> None:
+        self._results.clear()
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._results))
+
+
+def cache(method):
+    """Memoize a GameView method in the view cache of the underlying game."""
+
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        # Syncing clears the cache if events were appended directly
+        self._game._sync()
+        view_cache = self._game._view_cache
+        key = (name, self.timestamp, args, tuple(sorted(kwargs.items())))
+
+        result = view_cache.get(key)
+        if result is _MISSING:
+            result = method(self, *args, **kwargs)
+            view_cache.put(key, result)
+
+        return result
+
+    return wrapper
+
+
+@dataclass(frozen=True)
+class _PrefixState:
+    """
+    The running state of a game after its first N events.
+
+    A game stores one of these per timestamp, so that any view of the game can be
+    answered without re-scanning the events that came before it.
+    """
+
+    street: Street
+
+    # The number of actions among the first N events
+    num_actions: int
+
+    # The index (into the list of all actions) of the first action on this street
+    street_start: int
+
+    amount_added_in_street: Tuple[int, ...]
+
+    amount_added_total: Tuple[int, ...]
+
+    is_folded: Tuple[bool, ...]
+
+    # The total bet of the most recent action on this street (None if no action
+    # has been made on this street yet)
+    street_total_bet: Optional[int]
+
+    last_raise_amount: int
+
+    @staticmethod
+    def initial(num_players: int) -> "_PrefixState":
+        return _PrefixState(
+            street=Street.PREFLOP,
+            num_actions=0,
+            street_start=0,
+            amount_added_in_street=(0,) * num_players,
+            amount_added_total=(0,) * num_players,
+            is_folded=(False,) * num_players,
+            street_total_bet=None,
+            last_raise_amount=0,
+        )
+
+    def after_street(self, street: Street) -> "_PrefixState":
+        # Re-dealing the current street continues it
+        if street == self.street:
+            return self
+
+        return replace(
+            self,
+            street=street,
+            street_start=self.num_actions,
+            amount_added_in_street=(0,) * len(self.amount_added_in_street),
+            street_total_bet=None,
+            last_raise_amount=0,
+        )
+
+    def after_action(self, action: Action) -> "_PrefixState":
+        player = action.player_index
+
+        amount_added_in_street = list(self.amount_added_in_street)
+        amount_added_in_street[player] += action.amount_added
+
+        amount_added_total = list(self.amount_added_total)
+        amount_added_total[player] += action.amount_added
+
+        is_folded = self.is_folded
+        if action.move == Move.FOLD:
+            folded = list(is_folded)
+            folded[player] = True
+            is_folded = tuple(folded)
+
+        # The last raise is the difference between the current bet and the most
+        # recent different bet on this street (or the bet itself if there is none).
+        if self.street_total_bet is None:
+            last_raise_amount = action.total_bet
+        elif action.total_bet != self.street_total_bet:
+            last_raise_amount = action.total_bet - self.street_total_bet
+        else:
+            last_raise_amount = self.last_raise_amount
+
+        return replace(
+            self,
+            num_actions=self.num_actions + 1,
+            amount_added_in_street=tuple(amount_added_in_street),
+            amount_added_total=tuple(amount_added_total),
+            is_folded=is_folded,
+            street_total_bet=action.total_bet,
+            last_raise_amount=last_raise_amount,
+        )
 
 
 @dataclass
@@ -79,35 +370,105 @@ class Game:
     # A list of starting player stacks
     starting_stacks: List[int]
 
-    events: List[Event] = field(default_factory=list)
+    events: Union[List[Event], EventLog] = field(default_factory=list)
 
     # A unique id for this game
     id: int = field(default_factory=lambda: random.getrandbits(64))
 
+    # The running state after each prefix of the events: _states[i] is the state
+    # of the game at timestamp i.  These are kept up to date as events are added.
+    _states: List[_PrefixState] = field(
+        default_factory=list, init=False, repr=False, compare=False
+    )
+
+    # All actions, in order (the events without the streets)
+    _actions: List[Action] = field(
+        default_factory=list, init=False, repr=False, compare=False
+    )
+
+    # For each street event, the timestamp of the event, the street and the index
+    # of the first action on that street.
+    _street_starts: List[Tuple[int, Street, int]] = field(
+        default_factory=list, init=False, repr=False, compare=False
+    )
+
+    # Memoized results of views of this game
+    _view_cache: ViewCache = field(
+        default_factory=ViewCache, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        self._states.append(_PrefixState.initial(self.num_players()))
+
+    def _sync(self) -> None:
+        """Bring the running state up to date with any events that were appended
+        directly to the list of events.
+        """
+        for i in range(len(self._states) - 1, len(self.events)):
+            self._advance_state(self.events[i])
+
+    def _advance_state(self, event: Event) -> None:
+        # New events may change the results of existing views (eg the next action)
+        self._view_cache.clear()
+
+        state = self._states[-1]
+
+        if isinstance(event, Street):
+            self._street_starts.append(
+                (len(self._states) - 1, event, len(self._actions))
+            )
+            self._states.append(state.after_street(event))
+        else:
+            self._actions.append(event)
+            self._states.append(state.after_action(event))
+
     def num_players(self) -> int:
         return len(self.starting_stacks)
 
+    def compact(self) -> None:
+        """
+        Store the events of this game in a compact EventLog and drop the running
+        state and memoized views.  The state is rebuilt the next time the game, or
+        any view of it (including views that already exist), is read.
+
+        This is useful for keeping a large number of finished hands in memory.
+        """
+        if not isinstance(self.events, EventLog):
+            self.events = EventLog(self.events)
+
+        del self._states[1:]
+        self._actions.clear()
+        self._street_starts.clear()
+        self._view_cache.clear()
+
     def set_street(self, street: Street):
+        self._sync()
         self.events.append(street)
+        self._advance_state(street)
 
     def current_street(self) -> Street:
-        for e in reversed(self.events):
-            if isinstance(e, Street):
-                return e
-        return Street.PREFLOP
+        self._sync()
+        return self._states[-1].street
 
     def end_hand(self):
         self.set_street(Street.HAND_OVER)
 
     def all_action(self) -> List[Action]:
-        return [e for e in self.events if isinstance(e, Action)]
+        self._sync()
+        return list(self._actions)
 
     def add_action(self, action: Action) -> None:
+        self._sync()
         self.events.append(action)
+        self._advance_state(action)
 
     def timestamp(self) -> int:
         return len(self.events)
 
+    def cache_info(self) -> CacheInfo:
+        """Return the hits, misses and size of the memoized views of this game."""
+        return self._view_cache.info()
+
     def view(self, timestamp: int = None):
         """Return a view of the game at the given timestamp.
 
@@ -133,6 +494,7 @@ class Game:
         if timestamp > self.timestamp():
             raise Exception("Timestamp out of range")
         else:
+            self._sync()
             return GameView(self, timestamp)
 
 
@@ -153,6 +515,17 @@ class GameView:
     def __hash__(self):
         return hash((self._game.id, self.timestamp, "364258436582634"))
 
+    def _state(self) -> _PrefixState:
+        """
+        The running state of the game at this view's timestamp.  The game is synced
+        first, so views see events appended directly to the game's events, and
+        views that existed before the game was compacted still have a state.
+        Views read the game's actions and streets only after calling this.
+        """
+        game = self._game
+        game._sync()
+        return game._states[self.timestamp]
+
     @cache
     def num_players(self) -> int:
         return self._game.num_players()
@@ -173,10 +546,10 @@ class GameView:
         self,
     ) -> Optional[Action]:
 
-        for i in range(self.timestamp, len(self._game.events)):
-            e = self._game.events[i]
-            if isinstance(e, Action):
-                return e
+        num_actions = self._state().num_actions
+
+        if num_actions < len(self._game._actions):
+            return self._game._actions[num_actions]
 
         return None
 
@@ -185,73 +558,42 @@ class GameView:
         self,
     ) -> Optional[Action]:
 
-        for i in range(0, self.timestamp):
-            e = self._game.events[i]
-            if isinstance(e, Action):
-                return e
+        num_actions = self._state().num_actions
+        if num_actions > 0:
+            return self._game._actions[0]
 
         return None
 
-    # Nothing below these methods should reference the underlying game
-
-    @cache
-    def _player_list(self, starting_player: int = 0) -> List[int]:
-        all_players_twice = list(range(self.num_players())) + list(
-            range(self.num_players())
-        )
-        return all_players_twice[starting_player : starting_player + self.num_players()]
-
-    @cache
-    def current_player(self) -> int:
-        if len(self.street_action()) == 0:
-            starting_player = 0
-        else:
-            starting_player = (
-                self.street_action()[-1].player_index + 1
-            ) % self.num_players()
-
-        for player in self._player_list(starting_player):
-            if not self.is_folded()[player] and not self.is_all_in()[player]:
-                return player
-
-        return -1
-
     @cache
     def street(self) -> Street:
-
-        current_street = Street.PREFLOP
-
-        for event in self.events():
-
-            if isinstance(event, Street):
-                current_street = event
-
-        return current_street
+        return self._state().street
 
     @cache
     def street_action_dict(self) -> Dict[Street, List[Action]]:
 
         street_actions: Dict[Street, List[Action]] = defaultdict(lambda: [])
 
-        current_street = Street.PREFLOP
-
-        for e in self.events():
+        num_actions = self._state().num_actions
+        street_starts = [
+            (street, start)
+            for timestamp, street, start in self._game._street_starts
+            if timestamp < self.timestamp
+        ]
 
-            if isinstance(e, Action):
-                street_actions[current_street].append(e)
+        # Actions before the first street are preflop actions
+        boundaries = [(Street.PREFLOP, 0)] + street_starts
+        ends = [start for _, start in street_starts] + [num_actions]
 
-            elif isinstance(e, Street):
-                current_street = e
+        for (street, start), end in zip(boundaries, ends):
+            if end > start:
+                street_actions[street].extend(self._game._actions[start:end])
 
         return street_actions
 
     @cache
     def street_action(self) -> List[Action]:
-        return self.street_action_dict()[self.street()]
-
-    @cache
-    def current_street_index(self) -> int:
-        return len(self.street_action())
+        state = self._state()
+        return self._game._actions[state.street_start : state.num_actions]
 
     @cache
     def all_actions(self) -> List[Action]:
@@ -259,7 +601,8 @@ class GameView:
         The list of actions before the given timestamp  on the street containing the given action.
         """
 
-        return [e for e in self.events() if isinstance(e, Action)]
+        num_actions = self._state().num_actions
+        return self._game._actions[:num_actions]
 
     @cache
     def amount_added_in_street(self) -> List[int]:
@@ -267,14 +610,7 @@ class GameView:
         Return a dictionary of the total amount bet per player so far.
         """
 
-        amount = [0 for _ in range(self.num_players())]
-
-        for action in self.street_action():
-            player_id = action.player_index
-
-            amount[player_id] += action.amount_added
-
-        return amount
+        return list(self._state().amount_added_in_street)
 
     @cache
     def amount_added_total(self) -> List[int]:
@@ -282,14 +618,47 @@ class GameView:
         Return a dictionary of the total amount bet per player so far.
         """
 
-        amount = [0 for _ in range(self.num_players())]
+        return list(self._state().amount_added_total)
 
-        for action in self.all_actions():
-            player_id = action.player_index
+    @cache
+    def last_raise_amount(self) -> int:
+        """
+        The size of the last raise over the previous bet
+        """
 
-            amount[player_id] += action.amount_added
+        return self._state().last_raise_amount
 
-        return amount
+    @cache
+    def is_folded(self) -> List[bool]:
+        return list(self._state().is_folded)
+
+    # Nothing below these methods should reference the underlying game
+
+    @cache
+    def _player_list(self, starting_player: int = 0) -> List[int]:
+        all_players_twice = list(range(self.num_players())) + list(
+            range(self.num_players())
+        )
+        return all_players_twice[starting_player : starting_player + self.num_players()]
+
+    @cache
+    def current_player(self) -> int:
+        if len(self.street_action()) == 0:
+            starting_player = 0
+        else:
+            starting_player = (
+                self.street_action()[-1].player_index + 1
+            ) % self.num_players()
+
+        for player in self._player_list(starting_player):
+            if not self.is_folded()[player] and not self.is_all_in()[player]:
+                return player
+
+        return -1
+
+    @cache
+    def current_street_index(self) -> int:
+        return len(self.street_action())
 
     @cache
     def pot_size(self) -> int:
@@ -316,35 +685,6 @@ class GameView:
             for amount_bet in self.amount_added_in_street()
         ]
 
-    @cache
-    def last_raise_amount(self) -> int:
-        """
-        The size of the last raise over the previous bet
-        """
-
-        if len(self.street_action()) == 0:
-            return 0
-
-        current_bet = self.street_action()[-1].total_bet
-
-        for action in reversed(self.street_action()):
-
-            if action.total_bet != current_bet:
-                return current_bet - action.total_bet
-
-        return current_bet
-
-    @cache
-    def is_folded(self) -> List[bool]:
-
-        folded = [False for _ in range(self.num_players())]
-
-        for a in self.all_actions():
-            if a.move == Move.FOLD:
-                folded[a.player_index] = True
-
-        return folded
-
     @cache
     def is_in_hand(self) -> List[bool]:
         return [not f for f in self.is_folded()]
@@ -1,4 +1,4 @@
-from pokermon.poker.game import Action, Game, Move, Street
+from pokermon.poker.game import Action, EventLog, Game, Move, Street
 from pokermon.poker.game_runner import GameRunner
 
 
@@ -270,3 +270,188 @@ def test_all_in_is_call():
     assert game.game_view().go_all_in() == Action(
         player_index=1, move=Move.CHECK_CALL, amount_added=18, total_bet=25
     )
+
+
+def test_past_views_after_more_events():
+    game = Game(starting_stacks=[100, 200, 300])
+
+    game.add_action(Action(0, Move.SMALL_BLIND, total_bet=1, amount_added=1))
+    game.add_action(Action(1, Move.BIG_BLIND, total_bet=2, amount_added=2))
+    game.add_action(Action(2, Move.BET_RAISE, total_bet=10, amount_added=10))
+    game.add_action(Action(0, Move.CHECK_CALL, total_bet=10, amount_added=9))
+    game.add_action(Action(1, Move.FOLD, total_bet=10, amount_added=0))
+    game.set_street(Street.FLOP)
+    game.add_action(Action(0, Move.BET_RAISE, total_bet=20, amount_added=20))
+
+    preflop_view = game.view(3)
+    assert preflop_view.street() == Street.PREFLOP
+    assert preflop_view.amount_added_in_street() == [1, 2, 10]
+    assert preflop_view.last_raise_amount() == 8
+    assert preflop_view.is_folded() == [False, False, False]
+    assert preflop_view.next_action() == Action(
+        0, Move.CHECK_CALL, total_bet=10, amount_added=9
+    )
+
+    flop_view = game.view()
+    assert flop_view.street() == Street.FLOP
+    assert flop_view.amount_added_in_street() == [20, 0, 0]
+    assert flop_view.amount_added_total() == [30, 2, 10]
+    assert flop_view.last_raise_amount() == 20
+    assert flop_view.is_folded() == [False, True, False]
+    assert flop_view.current_player() == 2
+    assert flop_view.next_action() is None
+
+
+def test_events_appended_directly():
+    game = Game(starting_stacks=[100, 200])
+
+    game.events.append(Action(0, Move.SMALL_BLIND, total_bet=1, amount_added=1))
+    game.events.append(Action(1, Move.BIG_BLIND, total_bet=2, amount_added=2))
+
+    assert game.view().amount_added_total() == [1, 2]
+    assert game.view().current_stack_sizes() == [99, 198]
+
+    game.add_action(Action(0, Move.CHECK_CALL, total_bet=2, amount_added=1))
+    assert game.view().amount_added_total() == [2, 2]
+
+
+def test_existing_view_after_events_appended_directly():
+    game = Game(starting_stacks=[100, 200])
+    game.add_action(Action(0, Move.SMALL_BLIND, total_bet=1, amount_added=1))
+
+    view = game.view(len(game.events))
+    big_blind = Action(1, Move.BIG_BLIND, total_bet=2, amount_added=2)
+    game.events.append(big_blind)
+
+    assert view.next_action() == big_blind
+    assert game.view().all_actions() == [
+        Action(0, Move.SMALL_BLIND, total_bet=1, amount_added=1),
+        big_blind,
+    ]
+
+    # Memoized results of existing views are also brought up to date
+    call = Action(0, Move.CHECK_CALL, total_bet=2, amount_added=1)
+    assert game.view(2).next_action() is None
+    game.events.append(call)
+    assert game.view(2).next_action() == call
+
+
+def test_view_cache():
+    game = Game(starting_stacks=[100, 200])
+    game.add_action(Action(0, Move.SMALL_BLIND, total_bet=1, amount_added=1))
+    game.add_action(Action(1, Move.BIG_BLIND, total_bet=2, amount_added=2))
+
+    assert game.view(1).next_action() == Action(
+        1, Move.BIG_BLIND, total_bet=2, amount_added=2
+    )
+    assert game.view(2).next_action() is None
+    assert game.view(2).next_action() is None
+
+    info = game.cache_info()
+    assert info.hits == 1
+    assert info.misses == 2
+    assert info.currsize == 2
+
+    # Adding an event clears the cache, so views see the new action
+    game.add_action(Action(0, Move.CHECK_CALL, total_bet=2, amount_added=1))
+    assert game.cache_info().currsize == 0
+    assert game.view(2).next_action() == Action(
+        0, Move.CHECK_CALL, total_bet=2, amount_added=1
+    )
+
+    # Games do not share their caches
+    other_game = Game(starting_stacks=[100, 200])
+    assert other_game.view().next_action() is None
+    assert other_game.cache_info().misses == 1
+    assert game.cache_info().misses == 3
+
+
+def test_event_log():
+    events = [
+        Street.PREFLOP,
+        Action(0, Move.SMALL_BLIND, total_bet=1, amount_added=1),
+        Action(1, Move.BIG_BLIND, total_bet=2, amount_added=2),
+        Action(0, Move.BET_RAISE, total_bet=10, amount_added=9),
+        Action(1, Move.CHECK_CALL, total_bet=10, amount_added=8),
+        Street.FLOP,
+        Action(0, Move.FOLD, total_bet=0, amount_added=0),
+        Street.HAND_OVER,
+    ]
+
+    event_log = EventLog(events)
+
+    assert len(event_log) == len(events)
+    assert event_log == events
+    assert list(event_log) == events
+    assert event_log[3] == events[3]
+    assert event_log[-1] == Street.HAND_OVER
+    assert event_log[2:6] == events[2:6]
+
+    assert event_log.street_offsets().tolist() == [0, 5, 7]
+    assert event_log.action_mask().tolist() == [
+        False,
+        True,
+        True,
+        True,
+        True,
+        False,
+        True,
+        False,
+    ]
+    assert event_log.amount_added_per_player(2).tolist() == [10, 10]
+
+
+def test_game_with_event_log():
+    game = Game(starting_stacks=[100, 200], events=EventLog())
+    game.set_street(Street.PREFLOP)
+    game.add_action(Action(0, Move.SMALL_BLIND, total_bet=1, amount_added=1))
+    game.add_action(Action(1, Move.BIG_BLIND, total_bet=2, amount_added=2))
+    game.add_action(Action(0, Move.BET_RAISE, total_bet=10, amount_added=9))
+
+    assert game.view().amount_added_total() == [10, 2]
+    assert game.view().street_action() == [
+        Action(0, Move.SMALL_BLIND, total_bet=1, amount_added=1),
+        Action(1, Move.BIG_BLIND, total_bet=2, amount_added=2),
+        Action(0, Move.BET_RAISE, total_bet=10, amount_added=9),
+    ]
+
+
+def test_compact():
+    game = Game(starting_stacks=[100, 200])
+    game.set_street(Street.PREFLOP)
+    game.add_action(Action(0, Move.SMALL_BLIND, total_bet=1, amount_added=1))
+    game.add_action(Action(1, Move.BIG_BLIND, total_bet=2, amount_added=2))
+    game.add_action(Action(0, Move.CHECK_CALL, total_bet=2, amount_added=1))
+    game.add_action(Action(1, Move.CHECK_CALL, total_bet=2, amount_added=0))
+    game.set_street(Street.FLOP)
+    game.add_action(Action(0, Move.BET_RAISE, total_bet=6, amount_added=6))
+
+    events = list(game.events)
+    preflop_view = game.view(4)
+    flop_view = game.view()
+    expected_stacks = flop_view.current_stack_sizes()
+
+    game.compact()
+
+    assert isinstance(game.events, EventLog)
+    assert game.events == events
+    assert preflop_view.amount_to_call() == [0, 0]
+    assert flop_view.current_stack_sizes() == expected_stacks
+    assert game.view().current_player() == 1
+
+
+def test_views_held_across_compact():
+    game = Game(starting_stacks=[100, 200])
+    small_blind = Action(0, Move.SMALL_BLIND, total_bet=1, amount_added=1)
+    game.add_action(small_blind)
+    game.add_action(Action(1, Move.BIG_BLIND, total_bet=2, amount_added=2))
+
+    first_view = game.view(0)
+    last_view = game.view()
+
+    game.compact()
+
+    assert first_view.next_action() == small_blind
+    assert first_view.street_action() == []
+    assert last_view.all_actions()[0] == small_blind
+    assert last_view.amount_added_total() == [1, 2]
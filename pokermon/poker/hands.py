@@ -1,8 +1,8 @@
 import itertools
-from dataclasses import dataclass
-from typing import Dict, Tuple
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
 
-from pokermon.poker.cards import ALL_CARDS, INVERSE_RANK_MAP, Card, mkcards
+from pokermon.poker.cards import ALL_CARDS, INVERSE_RANK_MAP, NUM_CARDS, Card, mkcards
 from pokermon.poker.ordered_enum import OrderedEnum
 
 
@@ -26,11 +26,26 @@ class HoleCards:
 
     encoded: int
 
-    def index(self):
-        c1 = self.cards[1].index()
-        c2 = self.cards[0].index()
-        offset = 52 * c1 - c1 * (c1 + 1) // 2
-        return offset + (c2 - c1 - 1)
+    # The index of this hand in ALL_HANDS, computed once on creation
+    _index: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(
+            self,
+            "_index",
+            hand_index_from_card_indices(self.cards[0].index(), self.cards[1].index()),
+        )
+
+    def index(self) -> int:
+        return self._index
+
+
+def hand_index_from_card_indices(first: int, second: int) -> int:
+    """The index in ALL_HANDS of the hand made of the two (distinct) card indices."""
+    c1 = min(first, second)
+    c2 = max(first, second)
+    offset = 52 * c1 - c1 * (c1 + 1) // 2
+    return offset + (c2 - c1 - 1)
 
 
 def _order_cards(first: Card, second: Card) -> Tuple[Card, Card]:
@@ -82,6 +97,7 @@ def get_hole_cards_as_int(cards: Tuple[Card, Card]):
     return offset + 2 * second_rank + (0 if suited else 1)
 
 
+# Ordered by index, so ALL_HANDS[hand.index()] == hand
 ALL_HANDS: Tuple[HoleCards, ...] = tuple(
     [
         _make_hole_cards(comb[0], comb[1])
@@ -89,17 +105,29 @@ ALL_HANDS: Tuple[HoleCards, ...] = tuple(
     ]
 )
 
-_CARD_MAP: Dict[Card, Dict[Card, HoleCards]] = {}
+# The encoded form and card indices of every hand, by hand index
+ENCODED_HANDS: Tuple[int, ...] = tuple(hand.encoded for hand in ALL_HANDS)
+HAND_CARD_INDICES: Tuple[Tuple[int, int], ...] = tuple(
+    (hand.cards[0].index(), hand.cards[1].index()) for hand in ALL_HANDS
+)
+
+# A 52x52 (flattened) table from a pair of card indices to their hand
+_HANDS_BY_CARD_INDICES: List[Optional[HoleCards]] = [None] * (NUM_CARDS * NUM_CARDS)
 for hand in ALL_HANDS:
-    f, s = hand.cards
-    if f not in _CARD_MAP:
-        _CARD_MAP[f] = {}
-    _CARD_MAP[f][s] = hand
+    f, s = HAND_CARD_INDICES[hand.index()]
+    _HANDS_BY_CARD_INDICES[f * NUM_CARDS + s] = hand
+    _HANDS_BY_CARD_INDICES[s * NUM_CARDS + f] = hand
+
+
+def hole_cards_from_indices(first: int, second: int) -> HoleCards:
+    hand = _HANDS_BY_CARD_INDICES[first * NUM_CARDS + second]
+    if hand is None:
+        raise Exception("Hole cards must be two different cards")
+    return hand
 
 
 def lookup_hole_cards(first: Card, second: Card) -> HoleCards:
-    first, second = _order_cards(first, second)
-    return _CARD_MAP[first][second]
+    return hole_cards_from_indices(first.index(), second.index())
 
 
 def mkhand(s: str) -> HoleCards:
@@ -2,7 +2,7 @@ from dataclasses import dataclass
 from typing import Dict, List, Set
 
 from pokermon.poker.deal import FullDeal
-from pokermon.poker.evaluation import EvaluationResult, evaluate_hand
+from pokermon.poker.evaluation import EvaluationResult, evaluate_hands
 from pokermon.poker.game import GameView
 from pokermon.poker.rules import get_pot_payouts, get_ranked_hand_groups
 
@@ -34,7 +34,9 @@ class Result:
 
 
 def get_result(cards: FullDeal, game: GameView) -> Result:
-    hand_results: List[EvaluationResult] = []
+    hand_results: List[EvaluationResult] = evaluate_hands(
+        cards.hole_cards[: game.num_players()], cards.board
+    )
 
     remained_in_hand: List[bool] = []
 
@@ -42,13 +44,6 @@ def get_result(cards: FullDeal, game: GameView) -> Result:
     went_to_showdown: List[bool] = []
 
     for player_index in range(game.num_players()):
-        hole_cards = cards.hole_cards[player_index]
-        board = cards.board
-
-        eval_result: EvaluationResult = evaluate_hand(hole_cards, board)
-
-        hand_results.append(eval_result)
-
         remained_in_hand.append(not game.is_folded()[player_index])
 
         went_to_showdown.append(
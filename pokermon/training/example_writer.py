@@ -0,0 +1,175 @@
+"""
+Writes examples to shards on a background thread, so that playing hands isn't
+blocked while a shard is opened, compressed and written.
+"""
+
+import logging
+import queue
+import threading
+from typing import Optional, Union
+
+import tensorflow as tf  # type: ignore
+
+from pokermon.features.columnar import ColumnarShardWriter
+
+logger = logging.getLogger(__name__)
+
+# The formats examples can be written in: TFRecord files of serialized
+# SequenceExamples, or columnar shards (see pokermon.features.columnar)
+TFRECORD = "tfrecord"
+COLUMNAR = "columnar"
+FORMATS = [TFRECORD, COLUMNAR]
+
+# The compression types of TFRecord shards, and the suffixes of their files, from
+# which readers can tell how a shard is compressed
+COMPRESSION_SUFFIXES = {"": "", "GZIP": ".gz", "ZLIB": ".zlib"}
+
+
+def compression_type(path: str) -> str:
+    """The compression type of a TFRecord shard, given its path"""
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if suffix and path.endswith(suffix):
+            return compression
+    return ""
+
+
+class ExampleWriter:
+    """
+    Writes examples to a sequence of shards, named {prefix}-{shard_index}, from a
+    background thread fed by a bounded queue.  A new shard is started once the
+    current one holds max_examples_per_shard examples, or max_shard_bytes bytes of
+    serialized examples (before compression).
+
+    Errors in the background thread are raised by the next call to write or
+    close.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        prefix: str = "examples",
+        format: str = TFRECORD,
+        compression: str = "",
+        max_examples_per_shard: Optional[int] = None,
+        max_shard_bytes: Optional[int] = None,
+        max_queue_size: int = 1024,
+    ):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format {format}")
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unknown compression {compression}")
+        if compression and format != TFRECORD:
+            raise ValueError("Only TFRecord shards can be compressed")
+
+        self.directory = directory
+        self.prefix = prefix
+        self.format = format
+        self.compression = compression
+        self.max_examples_per_shard = max_examples_per_shard
+        self.max_shard_bytes = max_shard_bytes
+
+        self.num_shards = 0
+
+        # Items are the serialized example (TFRecord) or the example (columnar),
+        # and the size of the serialized example, or None once closed
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "ExampleWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+            return
+
+        # Don't hide the error that's already being raised
+        try:
+            self.close()
+        except Exception:
+            logger.exception("Error writing examples")
+
+    def write(self, example: tf.train.SequenceExample) -> None:
+        self._raise_error()
+
+        if self.format == TFRECORD:
+            serialized = example.SerializeToString()
+            self._queue.put((serialized, len(serialized)))
+        else:
+            self._queue.put((example, example.ByteSize()))
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _shard_path(self) -> str:
+        if self.format == COLUMNAR:
+            suffix = ".col"
+        else:
+            suffix = COMPRESSION_SUFFIXES[self.compression]
+        return f"{self.directory}/{self.prefix}-{self.num_shards}{suffix}"
+
+    def _open_shard(self) -> Union[tf.io.TFRecordWriter, ColumnarShardWriter]:
+        path = self._shard_path()
+        self.num_shards += 1
+        logger.debug("Writing shard %s", path)
+
+        if self.format == COLUMNAR:
+            return ColumnarShardWriter(path)
+
+        return tf.io.TFRecordWriter(
+            path, options=tf.io.TFRecordOptions(compression_type=self.compression)
+        )
+
+    def _run(self) -> None:
+        shard = None
+        num_examples = 0
+        num_bytes = 0
+        is_closed = False
+
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    is_closed = True
+                    break
+
+                example, size = item
+
+                if shard is None:
+                    shard = self._open_shard()
+
+                shard.write(example)
+                num_examples += 1
+                num_bytes += size
+
+                if (
+                    self.max_examples_per_shard
+                    and num_examples >= self.max_examples_per_shard
+                ) or (self.max_shard_bytes and num_bytes >= self.max_shard_bytes):
+                    shard.close()
+                    shard = None
+                    num_examples = 0
+                    num_bytes = 0
+
+            if shard is not None:
+                shard.close()
+
+        except BaseException as e:
+            self._error = e
+
+            # Keep taking examples until closed, so that writing them doesn't
+            # block forever
+            while not is_closed:
+                is_closed = self._queue.get() is None
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+import tensorflow as tf  # type: ignore
+
+from pokermon.features.columnar import ColumnarShard
+from pokermon.features.examples import make_example
+from pokermon.training.example_writer import COLUMNAR, ExampleWriter, compression_type
+
+
+def make_examples(num_examples):
+    return [make_example(player_name=f"player_{i}") for i in range(num_examples)]
+
+
+def read_examples(paths):
+    return [
+        tf.train.SequenceExample.FromString(record.numpy())
+        for path in paths
+        for record in tf.data.TFRecordDataset(
+            path, compression_type=compression_type(path)
+        )
+    ]
+
+
+def test_rotates_shards_by_number_of_examples(tmp_path) -> None:
+    examples = make_examples(10)
+
+    with ExampleWriter(str(tmp_path), max_examples_per_shard=4) as writer:
+        for example in examples:
+            writer.write(example)
+
+    paths = [f"{tmp_path}/examples-{i}" for i in range(3)]
+    assert sorted(os.listdir(tmp_path)) == ["examples-0", "examples-1", "examples-2"]
+    assert [len(read_examples([path])) for path in paths] == [4, 4, 2]
+    assert read_examples(paths) == examples
+
+
+@pytest.mark.parametrize("compression", ["GZIP", "ZLIB"])
+def test_rotates_compressed_shards_by_size(tmp_path, compression) -> None:
+    examples = make_examples(10)
+    example_size = len(examples[0].SerializeToString())
+
+    with ExampleWriter(
+        str(tmp_path),
+        prefix="foo",
+        compression=compression,
+        max_shard_bytes=3 * example_size,
+    ) as writer:
+        for example in examples:
+            writer.write(example)
+
+    suffix = ".gz" if compression == "GZIP" else ".zlib"
+    paths = [f"{tmp_path}/foo-{i}{suffix}" for i in range(4)]
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(p) for p in paths)
+    assert read_examples(paths) == examples
+
+
+def test_writes_columnar_shards(tmp_path) -> None:
+    with ExampleWriter(
+        str(tmp_path), format=COLUMNAR, max_examples_per_shard=4
+    ) as writer:
+        for example in make_examples(6):
+            writer.write(example)
+
+    with ColumnarShard(f"{tmp_path}/examples-1.col") as shard:
+        assert len(shard) == 2
+        assert shard.context("player_name", 1) == [b"player_5"]
+
+
+def test_raises_errors_of_the_writer_thread(tmp_path) -> None:
+    writer = ExampleWriter(str(tmp_path / "missing"))
+    writer.write(make_examples(1)[0])
+
+    with pytest.raises(tf.errors.NotFoundError):
+        writer.close()
+
+
+def test_keeps_the_error_raised_while_writing(tmp_path) -> None:
+    with pytest.raises(ValueError, match="Failed hand"):
+        with ExampleWriter(str(tmp_path / "missing")) as writer:
+            writer.write(make_examples(1)[0])
+            raise ValueError("Failed hand")
@@ -1,73 +1,161 @@
 import argparse
+import dataclasses
 import logging
+import multiprocessing
+import random
 import sys
 from random import shuffle
-from typing import List
+from typing import List, Optional
 
-import tensorflow as tf
+import numpy as np  # type: ignore
 from tqdm import trange
 
+import pyholdthem
 from pokermon.ai import policies
 from pokermon.ai.policy import Policy
-from pokermon.features.examples import make_forward_backward_example
+from pokermon.features.examples import make_forward_backward_examples
 from pokermon.poker import dealer
 from pokermon.poker.deal import FullDeal
 from pokermon.simulate import simulate
 from pokermon.simulate.simulate import choose_starting_stacks
+from pokermon.training.example_writer import (
+    COMPRESSION_SUFFIXES,
+    FORMATS,
+    TFRECORD,
+    ExampleWriter,
+)
 
 logger = logging.getLogger(__name__)
 
 
-def write_batch(serialized_examples, directory, batch_idx):
-    filename = f"{directory}/examples-{batch_idx}"
-    with tf.io.TFRecordWriter(filename) as writer:
-        for example in serialized_examples:
-            writer.write(example)
-
-
 def simulate_and_write_examples(
     directory: str,
     policies: List[Policy],
     num_hands: int,
     num_examples_per_batch: int,
+    format: str = TFRECORD,
+    prefix: str = "examples",
+    show_progress: bool = True,
+    compression: str = "",
+    max_bytes_per_batch: Optional[int] = None,
 ):
 
-    batch: List[str] = []
-    batch_idx = 0
-
-    for _ in trange(num_hands):
-
-        starting_stacks = choose_starting_stacks()
-
-        shuffle(policies)
+    # Examples are written by a background thread while the next hands are played
+    # (closing the writer finishes the last shard, even if a hand fails)
+    with ExampleWriter(
+        directory,
+        prefix=prefix,
+        format=format,
+        compression=compression,
+        max_examples_per_shard=num_examples_per_batch,
+        max_shard_bytes=max_bytes_per_batch,
+    ) as writer:
+        for _ in trange(num_hands, disable=not show_progress):
 
-        deal: FullDeal = dealer.deal_cards(len(policies))
+            starting_stacks = choose_starting_stacks()
 
-        game, result = simulate.simulate(policies, starting_stacks, deal)
+            shuffle(policies)
 
-        for player_idx, _ in enumerate(policies):
+            deal: FullDeal = dealer.deal_cards(len(policies))
 
-            policy: Policy = policies[player_idx]
+            game, result = simulate.simulate(policies, starting_stacks, deal)
 
-            example = make_forward_backward_example(
-                player_idx,
+            # The public features of the hand are shared by every player's example
+            examples = make_forward_backward_examples(
                 game.view(),
-                deal.hole_cards[player_idx],
+                deal.hole_cards,
                 deal.board,
                 result,
-                player_name=policy.name(),
+                player_names=[policy.name() for policy in policies],
             )
 
-            batch.append(example.SerializeToString())
+            for example in examples:
+                writer.write(example)
+
+
+@dataclasses.dataclass(frozen=True)
+class WorkerConfig:
+    directory: str
+    player_names: List[str]
+    num_hands: int
+    num_examples_per_batch: int
+    format: str
+    compression: str
+    max_bytes_per_batch: Optional[int]
+    worker_index: int
+    seed: int
+
+
+def _init_worker() -> None:
+    # Each worker is one of many processes, so it shouldn't also spread the hand
+    # features it simulates over every core.  Workers are spawned, so this runs
+    # before they simulate anything, while the thread pool can still be sized
+    pyholdthem.set_num_threads(1)
+
 
-            if len(batch) == num_examples_per_batch:
-                write_batch(batch, directory, batch_idx)
-                batch = []
-                batch_idx += 1
+def _simulate_and_write_worker_examples(config: WorkerConfig) -> int:
+    random.seed(config.seed)
+    np.random.seed(config.seed)
 
-    # Write the final batch
-    if len(batch):
-        write_batch(batch, directory, batch_idx)
+    simulate_and_write_examples(
+        config.directory,
+        [policies.POLICIES[name] for name in config.player_names],
+        config.num_hands,
+        config.num_examples_per_batch,
+        config.format,
+        # Every worker writes its own shards
+        prefix=f"examples-{config.worker_index}",
+        show_progress=config.worker_index == 0,
+        compression=config.compression,
+        max_bytes_per_batch=config.max_bytes_per_batch,
+    )
+
+    return config.num_hands
+
+
+def simulate_and_write_examples_in_parallel(
+    directory: str,
+    player_names: List[str],
+    num_hands: int,
+    num_examples_per_batch: int,
+    num_workers: int,
+    format: str = TFRECORD,
+    seed: Optional[int] = None,
+    compression: str = "",
+    max_bytes_per_batch: Optional[int] = None,
+):
+    """
+    Split the hands between worker processes, which each simulate their hands
+    with their own policies and random seed, and write their own shards, named
+    examples-{worker_index}-{batch_idx}.
+    """
+
+    seeds = np.random.SeedSequence(seed).spawn(num_workers)
+
+    configs = [
+        WorkerConfig(
+            directory=directory,
+            player_names=player_names,
+            num_hands=num_hands // num_workers + (i < num_hands % num_workers),
+            num_examples_per_batch=num_examples_per_batch,
+            format=format,
+            compression=compression,
+            max_bytes_per_batch=max_bytes_per_batch,
+            worker_index=i,
+            seed=int(seeds[i].generate_state(1)[0]),
+        )
+        for i in range(num_workers)
+    ]
+
+    # Workers are spawned rather than forked, as forking a process that has
+    # started TensorFlow's or pyholdthem's threads isn't safe
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(num_workers, initializer=_init_worker) as pool:
+        num_hands_played = sum(
+            pool.imap_unordered(_simulate_and_write_worker_examples, configs)
+        )
+
+    logger.info("Played %s hands with %s workers", num_hands_played, num_workers)
 
 
 def main():
@@ -101,6 +189,41 @@ def main():
         type=str,
     )
 
+    parser.add_argument(
+        "--format",
+        help="Format of the files of examples",
+        choices=FORMATS,
+        default=TFRECORD,
+    )
+
+    parser.add_argument(
+        "--max_bytes_per_file",
+        help="Start a new file once a file holds this many bytes of examples",
+        type=int,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--compression",
+        help="Compression of TFRecord files",
+        choices=[c for c in COMPRESSION_SUFFIXES if c],
+        default="",
+    )
+
+    parser.add_argument(
+        "--num_workers",
+        help="Number of processes to play hands in",
+        type=int,
+        default=1,
+    )
+
+    parser.add_argument(
+        "--seed",
+        help="Seed of the random numbers of the worker processes",
+        type=int,
+        default=None,
+    )
+
     parser.add_argument(
         "-log",
         "--log",
@@ -116,11 +239,34 @@ def main():
     log_level = getattr(logging, args.log)
     logging.basicConfig(level=log_level, format=format)
 
-    players: List[Policy] = [policies.POLICIES[player] for player in args.player]
-
-    simulate_and_write_examples(
-        args.output_directory, players, args.num_hands, args.num_examples_per_file
-    )
+    if args.num_workers > 1:
+        simulate_and_write_examples_in_parallel(
+            args.output_directory,
+            args.player,
+            args.num_hands,
+            args.num_examples_per_file,
+            args.num_workers,
+            args.format,
+            args.seed,
+            args.compression,
+            args.max_bytes_per_file,
+        )
+    else:
+        if args.seed is not None:
+            random.seed(args.seed)
+            np.random.seed(args.seed)
+
+        players: List[Policy] = [policies.POLICIES[player] for player in args.player]
+
+        simulate_and_write_examples(
+            args.output_directory,
+            players,
+            args.num_hands,
+            args.num_examples_per_file,
+            args.format,
+            compression=args.compression,
+            max_bytes_per_batch=args.max_bytes_per_file,
+        )
     sys.exit(0)
 
 
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+import tensorflow as tf  # type: ignore
+
+from pokermon.ai.random_policy import RandomPolicy
+from pokermon.simulate import simulate
+from pokermon.training.run_examples import (
+    simulate_and_write_examples,
+    simulate_and_write_examples_in_parallel,
+)
+
+
+def test_workers_write_their_own_shards(tmp_path) -> None:
+    simulate_and_write_examples_in_parallel(
+        str(tmp_path),
+        ["random", "random"],
+        num_hands=7,
+        num_examples_per_batch=4,
+        num_workers=2,
+        seed=5,
+    )
+
+    # Each worker plays half of the hands, and writes their examples in batches
+    # of 4
+    assert sorted(os.listdir(tmp_path)) == [
+        "examples-0-0",
+        "examples-0-1",
+        "examples-1-0",
+        "examples-1-1",
+    ]
+
+    num_examples = sum(
+        1 for _ in tf.data.TFRecordDataset(tf.io.gfile.glob(f"{tmp_path}/*"))
+    )
+    assert num_examples == 14
+
+
+def test_examples_are_written_when_a_hand_fails(tmp_path, monkeypatch) -> None:
+    simulate_hand = simulate.simulate
+    num_hands = 0
+
+    def simulate_until_third_hand(*args):
+        nonlocal num_hands
+        num_hands += 1
+        if num_hands == 3:
+            raise RuntimeError("Failed hand")
+        return simulate_hand(*args)
+
+    monkeypatch.setattr(simulate, "simulate", simulate_until_third_hand)
+
+    with pytest.raises(RuntimeError):
+        simulate_and_write_examples(
+            str(tmp_path),
+            [RandomPolicy(), RandomPolicy()],
+            num_hands=5,
+            num_examples_per_batch=100,
+            show_progress=False,
+        )
+
+    # The examples of the hands before the failure are in the last shard
+    num_examples = sum(
+        1 for _ in tf.data.TFRecordDataset(tf.io.gfile.glob(f"{tmp_path}/*"))
+    )
+    assert num_examples == 4
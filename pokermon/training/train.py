@@ -3,11 +3,13 @@ import dataclasses
 import logging
 import random
 import sys
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
+import tensorflow as tf  # type: ignore
 from tqdm import trange
 
 from pokermon.ai.policy import Policy
+from pokermon.features.examples import make_forward_backward_example
 from pokermon.model import heads_up
 from pokermon.model.heads_up import HeadsUpModel
 from pokermon.poker import dealer
@@ -27,12 +29,26 @@ class Trainer:
 
     checkpointer: Optional[Checkpointer] = None
 
+    # Examples of the hands played since the model's last update
+    examples: List[tf.train.SequenceExample] = dataclasses.field(default_factory=list)
+
+    def update(self, model: HeadsUpModel) -> None:
+        if self.examples:
+            model.train_on_examples(self.examples)
+            self.examples = []
+
 
 def train_heads_up(
     policies: Dict[str, Policy],
     num_hands_to_play: int,
     num_hands_between_checkpoints: Optional[int] = None,
+    num_hands_per_update: int = 1,
 ):
+    """
+    Play hands between randomly chosen pairs of the policies, training each
+    HeadsUpModel on the examples of every num_hands_per_update hands it plays
+    with a single batched update.
+    """
 
     # Initialize the stats per hand
     trainers: Dict[str, Trainer] = {name: Trainer() for name in policies}
@@ -57,8 +73,8 @@ def train_heads_up(
 
         starting_stacks = choose_starting_stacks()
 
-        ((player1_name, player1_model), (player2_name, player2_model)) = random.sample(
-            policies.items(), 2
+        (player1_name, player1_model), (player2_name, player2_model) = random.sample(
+            list(policies.items()), 2
         )
 
         deal: FullDeal = dealer.deal_cards(num_players=2)
@@ -74,13 +90,17 @@ def train_heads_up(
             trainers[player_name].stats.update_stats(game.view(), result, player_idx)
 
             if isinstance(model, HeadsUpModel):
-                model.train_step(
-                    player_idx,
-                    game.view(),
-                    deal.hole_cards[player_idx],
-                    deal.board,
-                    result,
+                trainers[player_name].examples.append(
+                    make_forward_backward_example(
+                        player_idx,
+                        game.view(),
+                        deal.hole_cards[player_idx],
+                        deal.board,
+                        result,
+                    )
                 )
+                if len(trainers[player_name].examples) >= num_hands_per_update:
+                    trainers[player_name].update(model)
 
             if (
                 num_hands_between_checkpoints
@@ -95,8 +115,14 @@ def train_heads_up(
                 trainers[player_name].stats = Stats()
 
                 if isinstance(model, HeadsUpModel):
+                    trainers[player_name].update(model)
                     trainers[player_name].checkpointer.save()
 
+    # Train on the hands played since the last updates
+    for player_name, model in policies.items():
+        if isinstance(model, HeadsUpModel):
+            trainers[player_name].update(model)
+
 
 def main():
     parser = argparse.ArgumentParser(description="Play a hand of poker.")
@@ -115,6 +141,13 @@ def main():
         default=500,
     )
 
+    parser.add_argument(
+        "--hands_per_update",
+        help="Number of hands each model plays between updates of its weights",
+        type=int,
+        default=1,
+    )
+
     parser.add_argument(
         "-log",
         "--log",
@@ -132,7 +165,7 @@ def main():
 
     models = {"foo": heads_up.HeadsUpModel("Foo"), "bar": heads_up.HeadsUpModel("Bar")}
 
-    train_heads_up(models, args.num_hands, args.checkpoint_every)
+    train_heads_up(models, args.num_hands, args.checkpoint_every, args.hands_per_update)
 
     sys.exit(0)
 
@@ -0,0 +1,230 @@
+"""
+Trains a model on the examples in shards written by run_examples, rather than on
+hands as they're played.
+
+Shards are read through a tf.data pipeline, which interleaves reads of several
+shards, shuffles their examples, groups them into batches of examples with
+similar numbers of steps (so little of each batch is padding), parses each batch
+with a single call to parse_sequence_example, and prefetches the next batches
+while the model trains on the current one.
+
+python -m pokermon.training.train_offline --examples "examples/examples-*"
+"""
+
+import argparse
+import logging
+import sys
+from typing import List, Optional, Sequence
+
+import tensorflow as tf  # type: ignore
+
+from pokermon.model.feature_config import FeatureConfig
+from pokermon.model.heads_up import HeadsUpModel
+from pokermon.training.checkpointer import Checkpointer
+from pokermon.training.example_writer import compression_type
+
+logger = logging.getLogger(__name__)
+
+# The numbers of steps that separate the buckets examples are batched in
+DEFAULT_BUCKET_BOUNDARIES = [4, 6, 8, 11, 15]
+
+
+def _num_steps(serialized_example: tf.Tensor) -> tf.Tensor:
+    ctx, _ = tf.io.parse_single_sequence_example(
+        serialized_example,
+        context_features={"num_steps": tf.io.FixedLenFeature([], tf.int64)},
+    )
+    return tf.cast(ctx["num_steps"], tf.int32)
+
+
+def make_dataset(
+    paths: List[str],
+    feature_config: FeatureConfig,
+    batch_size: int,
+    shuffle_buffer_size: int = 10000,
+    bucket_boundaries: Sequence[int] = DEFAULT_BUCKET_BOUNDARIES,
+    cycle_length: int = 4,
+    seed: Optional[int] = None,
+) -> tf.data.Dataset:
+    """
+    A dataset of the features and targets of shuffled batches of the examples in
+    the shards at the given paths, as made by
+    FeatureConfig.make_features_and_target_tensors.
+
+    TFRecord shards are batched by length.  Columnar shards are already stored as
+    columns, so are read by FeatureConfig.make_columnar_dataset instead, which
+    shuffles the order of the shards and of the examples in each shard (given the
+    seed) and batches them in that order.  So shuffle_buffer_size,
+    bucket_boundaries and cycle_length only apply to TFRecord shards.
+    """
+
+    if not paths:
+        raise ValueError("No shards to read")
+
+    num_columnar = sum(1 for path in paths if path.endswith(".col"))
+    if num_columnar == len(paths):
+        return feature_config.make_columnar_dataset(
+            paths, batch_size, shuffle=True, seed=seed
+        ).prefetch(tf.data.experimental.AUTOTUNE)
+    elif num_columnar:
+        raise ValueError("Can't read both columnar and TFRecord shards")
+
+    files = tf.data.Dataset.from_tensor_slices(
+        (paths, [compression_type(path) for path in paths])
+    ).shuffle(len(paths), seed=seed)
+
+    records = files.interleave(
+        lambda path, compression: tf.data.TFRecordDataset(
+            path, compression_type=compression
+        ),
+        cycle_length=cycle_length,
+        num_parallel_calls=tf.data.experimental.AUTOTUNE,
+    )
+
+    return (
+        records.shuffle(shuffle_buffer_size, seed=seed)
+        .apply(
+            tf.data.experimental.bucket_by_sequence_length(
+                _num_steps,
+                bucket_boundaries=list(bucket_boundaries),
+                bucket_batch_sizes=[batch_size] * (len(bucket_boundaries) + 1),
+            )
+        )
+        .map(
+            feature_config.make_features_and_target_tensors,
+            num_parallel_calls=tf.data.experimental.AUTOTUNE,
+        )
+        .prefetch(tf.data.experimental.AUTOTUNE)
+    )
+
+
+def train_offline(
+    model: HeadsUpModel,
+    dataset: tf.data.Dataset,
+    num_epochs: int = 1,
+    checkpointer: Optional[Checkpointer] = None,
+) -> List[float]:
+    """
+    Train the model for a number of passes over the dataset, saving a checkpoint
+    after each.  Returns the mean loss of the batches of each epoch.
+    """
+
+    # Traced once for the dataset's batches, whatever their size and length
+    update_weights = tf.function(
+        model.update_weights, input_signature=dataset.element_spec, autograph=False
+    )
+
+    epoch_losses = []
+
+    for epoch in range(num_epochs):
+        losses = []
+        for feature_tensors, target_tensors in dataset:
+            _, loss = update_weights(feature_tensors, target_tensors)
+            losses.append(loss)
+
+        epoch_loss = float(tf.reduce_mean(tf.stack(losses)))
+        epoch_losses.append(epoch_loss)
+        logger.info(
+            "Epoch %s: %s batches, mean loss %s", epoch + 1, len(losses), epoch_loss
+        )
+
+        if checkpointer:
+            checkpointer.save()
+
+    return epoch_losses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a model on example shards.")
+
+    parser.add_argument(
+        "--examples",
+        help="Glob of the example shards to train on",
+        type=str,
+        required=True,
+    )
+
+    parser.add_argument(
+        "--model_name",
+        help="Name of the model to train",
+        type=str,
+        default="Foo",
+    )
+
+    parser.add_argument(
+        "--checkpoint_directory",
+        help="Directory to restore the model from, and save checkpoints to",
+        type=str,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--batch_size",
+        help="Number of examples in each batch",
+        type=int,
+        default=256,
+    )
+
+    parser.add_argument(
+        "--num_epochs",
+        help="Number of passes over the examples",
+        type=int,
+        default=1,
+    )
+
+    parser.add_argument(
+        "--shuffle_buffer_size",
+        help="Number of examples to shuffle together (TFRecord shards only)",
+        type=int,
+        default=10000,
+    )
+
+    parser.add_argument(
+        "--bucket_boundaries",
+        help="Comma separated numbers of steps that separate the buckets "
+        "examples are batched in (TFRecord shards only)",
+        type=str,
+        default=",".join(str(b) for b in DEFAULT_BUCKET_BOUNDARIES),
+    )
+
+    parser.add_argument(
+        "-log",
+        "--log",
+        help="Provide logging level. Example --log debug'",
+        type=str,
+        default="INFO",
+    )
+
+    args = parser.parse_args()
+
+    # Configure the logger
+    format = "[%(asctime)s] %(pathname)s:%(lineno)d %(levelname)s - %(message)s"
+    log_level = getattr(logging, args.log)
+    logging.basicConfig(level=log_level, format=format)
+
+    model = HeadsUpModel(args.model_name)
+
+    checkpointer = None
+    if args.checkpoint_directory:
+        checkpointer = Checkpointer(
+            model=model.model,
+            optimizer=model.optimizer,
+            directory=args.checkpoint_directory,
+        )
+        checkpointer.restore()
+
+    dataset = make_dataset(
+        sorted(tf.io.gfile.glob(args.examples)),
+        model.feature_config,
+        args.batch_size,
+        shuffle_buffer_size=args.shuffle_buffer_size,
+        bucket_boundaries=[int(b) for b in args.bucket_boundaries.split(",")],
+    )
+
+    train_offline(model, dataset, args.num_epochs, checkpointer)
+
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
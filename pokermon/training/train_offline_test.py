@@ -0,0 +1,67 @@
+import math
+import os
+
+import tensorflow as tf  # type: ignore
+
+from pokermon.ai.random_policy import RandomPolicy
+from pokermon.model.heads_up import HeadsUpModel
+from pokermon.training.example_writer import COLUMNAR
+from pokermon.training.run_examples import simulate_and_write_examples
+from pokermon.training.train_offline import make_dataset, train_offline
+
+
+def test_train_offline(tmp_path) -> None:
+    simulate_and_write_examples(
+        str(tmp_path),
+        [RandomPolicy(), RandomPolicy()],
+        num_hands=20,
+        num_examples_per_batch=8,
+        show_progress=False,
+        compression="GZIP",
+    )
+    paths = sorted(str(tmp_path / path) for path in os.listdir(tmp_path))
+
+    model = HeadsUpModel("Foo")
+    dataset = make_dataset(
+        paths, model.feature_config, batch_size=4, bucket_boundaries=[5, 8], seed=2
+    )
+
+    # Every example is in a batch, and batches are padded to their longest example
+    num_examples = 0
+    for feature_tensors, target_tensors in dataset:
+        num_players = target_tensors["public_state__num_players_remaining"]
+        assert num_players.dense_shape[0] <= 4
+        num_examples += int(num_players.dense_shape[0])
+
+        num_steps = tf.math.bincount(tf.cast(num_players.indices[:, 0], tf.int32))
+        assert int(num_players.dense_shape[1]) == int(tf.reduce_max(num_steps))
+
+    assert num_examples == 40
+
+    losses = train_offline(model, dataset, num_epochs=2)
+    assert len(losses) == 2
+    assert all(math.isfinite(loss) for loss in losses)
+
+
+def test_columnar_shards_are_shuffled_by_seed(tmp_path) -> None:
+    simulate_and_write_examples(
+        str(tmp_path),
+        [RandomPolicy(), RandomPolicy()],
+        num_hands=10,
+        num_examples_per_batch=5,
+        format=COLUMNAR,
+        show_progress=False,
+    )
+    paths = sorted(str(tmp_path / path) for path in os.listdir(tmp_path))
+
+    feature_config = HeadsUpModel("Foo").feature_config
+
+    def starting_stacks(seed):
+        dataset = make_dataset(paths, feature_config, batch_size=3, seed=seed)
+        return [
+            feature_tensors["public_context__starting_stack_sizes"].numpy().tolist()
+            for feature_tensors, _ in dataset
+        ]
+
+    assert starting_stacks(seed=4) == starting_stacks(seed=4)
+    assert sum(len(batch) for batch in starting_stacks(seed=4)) == 20
@@ -5,3 +5,8 @@ from pokermon.training import train
 def test_heads_up():
     models = {"foo": heads_up.HeadsUpModel("Foo"), "bar": heads_up.HeadsUpModel("Bar")}
     train.train_heads_up(models, 2)
+
+
+def test_heads_up_batched_updates():
+    models = {"foo": heads_up.HeadsUpModel("Foo"), "bar": heads_up.HeadsUpModel("Bar")}
+    train.train_heads_up(models, 5, num_hands_per_update=2)